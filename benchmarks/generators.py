@@ -0,0 +1,114 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from typing import Dict
+from zipfile import ZipFile, ZIP_DEFLATED
+import hashlib
+import io
+import json
+import random
+import tarfile
+
+POM_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<project xmlns="http://maven.apache.org/POM/4.0.0">
+  <modelVersion>4.0.0</modelVersion>
+  <groupId>{group}</groupId>
+  <artifactId>{artifact}</artifactId>
+  <version>{version}</version>
+  <packaging>jar</packaging>
+</project>
+"""
+
+
+def generate_maven_zip(
+    path: str,
+    ga_count=10,
+    versions=3,
+    file_size=64 * 1024,
+    group="org.charon.bench",
+    root="maven-repository",
+    seed=0
+) -> Dict[str, int]:
+    """Generate a maven repository zip like the product release zips, with
+    ga_count artifacts of the group in the given count of versions.
+        * Each version has a pom, a jar and a sources jar of file_size random
+          bytes, and the sha1 files of them.
+        * The content is random but reproducible for the same seed, and is not
+          compressible, so the zip has the real size of the files.
+
+        Returns the count of the files in the maven repository and their total
+        size in bytes.
+    """
+    rand = random.Random(seed)
+    top = f"bench-{ga_count}x{versions}/{root}/"
+    files = 0
+    total = 0
+    with ZipFile(path, "w", compression=ZIP_DEFLATED) as zip_:
+        for a in range(ga_count):
+            artifact = f"bench-artifact-{a}"
+            for v in range(versions):
+                version = f"1.{v}.0"
+                folder = f"{top}{group.replace('.', '/')}/{artifact}/{version}/"
+                pom = POM_TEMPLATE.format(
+                    group=group, artifact=artifact, version=version
+                ).encode("utf-8")
+                entries = {
+                    f"{artifact}-{version}.pom": pom,
+                    f"{artifact}-{version}.jar": rand.randbytes(file_size),
+                    f"{artifact}-{version}-sources.jar": rand.randbytes(file_size)
+                }
+                for (name, content) in list(entries.items()):
+                    entries[f"{name}.sha1"] = hashlib.sha1(content).hexdigest().encode()
+                for (name, content) in entries.items():
+                    zip_.writestr(folder + name, content)
+                    files += 1
+                    total += len(content)
+    return {"files": files, "bytes": total}
+
+
+def generate_npm_tarball(
+    path: str,
+    name="@charon-bench/pkg",
+    version="1.0.0",
+    file_count=20,
+    file_size=16 * 1024,
+    seed=0
+) -> Dict[str, int]:
+    """Generate an npm package tarball with its package.json and file_count
+    files of file_size random bytes under the package folder.
+
+        Returns the count of the files in the tarball and their total size in
+        bytes.
+    """
+    rand = random.Random(seed)
+    package_json = json.dumps({
+        "name": name,
+        "version": version,
+        "description": "Generated package for charon benchmarks",
+        "license": "Apache-2.0",
+        "main": "./lib/index.js"
+    }, indent=2).encode("utf-8")
+    entries = {"package/package.json": package_json}
+    for i in range(file_count):
+        entries[f"package/lib/file-{i}.js"] = rand.randbytes(file_size)
+    total = 0
+    with tarfile.open(path, "w:gz") as tar:
+        for (entry, content) in entries.items():
+            info = tarfile.TarInfo(entry)
+            info.size = len(content)
+            info.mode = 0o644
+            tar.addfile(info, io.BytesIO(content))
+            total += len(content)
+    return {"files": len(entries), "bytes": total}
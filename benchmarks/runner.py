@@ -0,0 +1,317 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from typing import Any, Callable, Dict, List, Optional
+from benchmarks.generators import generate_maven_zip, generate_npm_tarball
+from charon.config import CONFIG_FILE
+from charon.metrics import get_request_metrics
+from charon.pkgs.maven import handle_maven_uploading, handle_maven_del
+from charon.pkgs.npm import handle_npm_uploading
+from charon.storage import ENDPOINT_ENV
+from charon.utils.logs import set_logging
+from charon.utils.trace import get_tracer
+from tempfile import mkdtemp
+from tests.s3_proxy import FaultConfig, LocalS3Server
+import boto3
+import click
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import time
+
+logger = logging.getLogger("charon.benchmarks")
+
+MAVEN_BUCKET = "charon-bench"
+NPM_BUCKET = "charon-bench-npm"
+MANIFEST_BUCKET = "charon-bench-manifest"
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "template")
+CONFIG_CONTENT = f"""
+targets:
+  bench:
+  - bucket: "{MAVEN_BUCKET}"
+  npm:
+  - bucket: "{NPM_BUCKET}"
+    registry: "npm.registry.bench"
+manifest_bucket: "{MANIFEST_BUCKET}"
+"""
+# The throughput of a scenario is a regression if it is lower than the
+# baseline by more than this ratio
+DEFAULT_TOLERANCE = 0.2
+
+
+class LocalS3(object):
+    """LocalS3 runs a moto server on a free local port as the S3 endpoint of
+    charon, behind an S3Proxy if faults are given, with the buckets of the
+    benchmarks created. The environment variables it changes are restored when
+    it is stopped.
+    """
+
+    def __init__(self, buckets: List[str], faults: Optional[FaultConfig] = None):
+        self.__buckets = buckets
+        self.__server = LocalS3Server(faults)
+        self.__environ: Dict[str, str] = {}
+
+    def __enter__(self) -> "LocalS3":
+        self.__server.start()
+        self.__environ = os.environ.copy()
+        os.environ.update({
+            ENDPOINT_ENV: self.__server.endpoint,
+            "AWS_ACCESS_KEY_ID": "benchmark",
+            "AWS_SECRET_ACCESS_KEY": "benchmark",
+            "AWS_DEFAULT_REGION": "us-east-1"
+        })
+        os.environ.pop("AWS_PROFILE", None)
+        s3 = boto3.client("s3", endpoint_url=self.__server.upstream)
+        for bucket in self.__buckets:
+            s3.create_bucket(Bucket=bucket)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.__server.stop()
+        os.environ.clear()
+        os.environ.update(self.__environ)
+
+    def proxy_stats(self) -> Optional[Dict[str, int]]:
+        return self.__server.proxy.stats() if self.__server.proxy else None
+
+
+def prepare_home(home: str) -> str:
+    """Prepare the charon config and templates in home, which is used as the
+    HOME of the benchmarks, and return the config file path.
+    """
+    config_base = os.path.join(home, ".charon")
+    os.makedirs(config_base, exist_ok=True)
+    shutil.copytree(TEMPLATE_DIR, os.path.join(config_base, "template"), dirs_exist_ok=True)
+    config = os.path.join(config_base, CONFIG_FILE)
+    with open(config, "w", encoding="utf-8") as f:
+        f.write(CONFIG_CONTENT)
+    return config
+
+
+def measure(files: int, size: int, run: Callable[[], bool]) -> Dict[str, Any]:
+    """Run one scenario and collect its throughput, the S3 requests it sent
+    and the durations of its stages.
+    """
+    metrics = get_request_metrics()
+    tracer = get_tracer()
+    metrics.reset()
+    tracer.reset()
+    start = time.perf_counter()
+    succeeded = run()
+    seconds = time.perf_counter() - start
+    total = metrics.summary()["total"]
+    requests = total["count"] - total["skipped"]
+    stages: Dict[str, float] = {}
+    for span in tracer.spans():
+        stages[span.name] = stages.get(span.name, 0.0) + span.wall
+    return {
+        "succeeded": succeeded,
+        "files": files,
+        "bytes": size,
+        "seconds": round(seconds, 3),
+        "files_per_sec": round(files / seconds, 2),
+        "mb_per_sec": round(size / 1024 / 1024 / seconds, 2),
+        "requests": requests,
+        "requests_per_sec": round(requests / seconds, 2),
+        "request_errors": total["errors"],
+        "bytes_sent": total["bytes_sent"],
+        "latency_ms": total["latency_ms"],
+        "stages": {name: round(wall, 3) for (name, wall) in stages.items()}
+    }
+
+
+def run_benchmarks(
+    ga_count=20,
+    versions=3,
+    file_size=64 * 1024,
+    npm_files=50,
+    npm_file_size=16 * 1024,
+    workers=1,
+    concurrent_targets=False,
+    faults: Optional[FaultConfig] = None
+) -> Dict[str, Any]:
+    """Run the maven upload, maven delete and npm upload end to end against a
+    local moto server, with the generated archives of the given sizes. If
+    faults are given, the requests go through an S3Proxy which injects them.
+    """
+    work_dir = mkdtemp(prefix="charon-bench-")
+    old_home = os.environ.get("HOME")
+    try:
+        os.environ["HOME"] = work_dir
+        config = prepare_home(work_dir)
+        maven_zip = os.path.join(work_dir, "bench-maven.zip")
+        maven = generate_maven_zip(
+            maven_zip, ga_count=ga_count, versions=versions, file_size=file_size
+        )
+        npm_tgz = os.path.join(work_dir, "bench-npm.tgz")
+        npm = generate_npm_tarball(npm_tgz, file_count=npm_files, file_size=npm_file_size)
+        npm_size = os.path.getsize(npm_tgz)
+
+        maven_targets = [("bench", MAVEN_BUCKET, "", "", None)]
+        npm_targets = [("npm", NPM_BUCKET, "", "npm.registry.bench", None)]
+        scenarios: Dict[str, Dict[str, Any]] = {}
+        with LocalS3([MAVEN_BUCKET, NPM_BUCKET, MANIFEST_BUCKET], faults) as local_s3:
+            def maven_upload() -> bool:
+                return handle_maven_uploading(
+                    maven_zip, "bench-maven", targets=maven_targets, dir_=work_dir,
+                    manifest_bucket_name=MANIFEST_BUCKET, config=config,
+                    workers=workers, concurrent_targets=concurrent_targets
+                )[1]
+
+            def maven_delete() -> bool:
+                return handle_maven_del(
+                    maven_zip, "bench-maven", targets=maven_targets, dir_=work_dir,
+                    manifest_bucket_name=MANIFEST_BUCKET,
+                    workers=workers, concurrent_targets=concurrent_targets
+                )[1]
+
+            def npm_upload() -> bool:
+                return handle_npm_uploading(
+                    npm_tgz, "bench-npm", targets=npm_targets, dir_=work_dir,
+                    manifest_bucket_name=MANIFEST_BUCKET, config=config,
+                    concurrent_targets=concurrent_targets
+                )[1]
+
+            scenarios["maven_upload"] = measure(maven["files"], maven["bytes"], maven_upload)
+            scenarios["maven_delete"] = measure(maven["files"], maven["bytes"], maven_delete)
+            # Only the tarball and its version metadata are uploaded for npm
+            scenarios["npm_upload"] = measure(1, npm_size, npm_upload)
+            proxy_stats = local_s3.proxy_stats()
+        return {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {
+                "ga_count": ga_count, "versions": versions, "file_size": file_size,
+                "npm_files": npm["files"], "npm_file_size": npm_file_size,
+                "workers": workers, "concurrent_targets": concurrent_targets,
+                "faults": faults.to_dict() if faults else None
+            },
+            "scenarios": scenarios,
+            "proxy": proxy_stats
+        }
+    finally:
+        if old_home is None:
+            os.environ.pop("HOME", None)
+        else:
+            os.environ["HOME"] = old_home
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def compare(
+    result: Dict[str, Any], baseline: Dict[str, Any], tolerance=DEFAULT_TOLERANCE
+) -> List[str]:
+    """Compare the result with the baseline, and return the regressions.
+        * The files per second of a scenario is a regression if it is lower
+          than the baseline by more than tolerance.
+        * The S3 requests of a scenario do not depend on the timing, so any
+          increase of them is a regression.
+        * The scenarios are only compared if they are run with the same params.
+    """
+    if result.get("params") != baseline.get("params"):
+        return [
+            "The params %s are not the same as the baseline %s"
+            % (result.get("params"), baseline.get("params"))
+        ]
+    regressions = []
+    for (name, current) in result["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        if not current["succeeded"]:
+            regressions.append(f"{name}: failed")
+        if current["files_per_sec"] < base["files_per_sec"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {current['files_per_sec']} files/s, "
+                f"baseline {base['files_per_sec']} files/s"
+            )
+        if current["requests"] > base["requests"]:
+            regressions.append(
+                f"{name}: {current['requests']} requests, baseline {base['requests']}"
+            )
+    return regressions
+
+
+@click.command()
+@click.option("--ga-count", type=int, default=20, help="The count of GAs in the maven zip.")
+@click.option("--versions", type=int, default=3, help="The count of versions per GA.")
+@click.option(
+    "--file-size", type=int, default=64 * 1024, help="The size of each jar in bytes."
+)
+@click.option("--npm-files", type=int, default=50, help="The count of files in the npm tarball.")
+@click.option(
+    "--npm-file-size", type=int, default=16 * 1024,
+    help="The size of each file in the npm tarball in bytes."
+)
+@click.option("--workers", type=int, default=1, help="The worker processes of maven.")
+@click.option(
+    "--output", "-o", help="The JSON file to write the result, which can be used as baseline."
+)
+@click.option("--baseline", "-b", help="The JSON result of a previous run to compare with.")
+@click.option(
+    "--tolerance", type=float, default=DEFAULT_TOLERANCE,
+    help="The allowed ratio of throughput drop against the baseline."
+)
+@click.option("--latency", type=float, default=0.0, help="The seconds added to every request.")
+@click.option("--jitter", type=float, default=0.0, help="The max random seconds added to latency.")
+@click.option(
+    "--bandwidth", type=int, default=0, help="The bytes per second of every connection."
+)
+@click.option(
+    "--slow-down-rate", type=float, default=0.0,
+    help="The probability of a request to get a 503 SlowDown error."
+)
+@click.option(
+    "--reset-rate", type=float, default=0.0,
+    help="The probability of a request to get its connection reset."
+)
+@click.option("--seed", type=int, default=0, help="The seed of the injected faults.")
+@click.option("--debug", "-D", is_flag=True, default=False, help="Log the charon progress.")
+def cli(
+    ga_count: int, versions: int, file_size: int, npm_files: int, npm_file_size: int,
+    workers: int, output: str, baseline: str, tolerance: float,
+    latency: float, jitter: float, bandwidth: int, slow_down_rate: float,
+    reset_rate: float, seed: int, debug: bool
+):
+    """Run the charon benchmarks against a local moto server. The latency,
+    bandwidth, SlowDown and reset options inject the faults with a proxy in
+    front of the server.
+    """
+    set_logging("", "", level=logging.INFO if debug else logging.WARNING, use_log_file=False)
+    faults = None
+    if latency or jitter or bandwidth or slow_down_rate or reset_rate:
+        faults = FaultConfig(
+            latency=latency, jitter=jitter, bandwidth=bandwidth,
+            slow_down_rate=slow_down_rate, reset_rate=reset_rate, seed=seed
+        )
+    result = run_benchmarks(
+        ga_count=ga_count, versions=versions, file_size=file_size,
+        npm_files=npm_files, npm_file_size=npm_file_size, workers=workers,
+        faults=faults
+    )
+    content = json.dumps(result, indent=2)
+    print(content)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(content)
+    if baseline:
+        with open(baseline, encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), tolerance)
+        if regressions:
+            print("Regressions against %s:\n%s" % (baseline, "\n".join(regressions)))
+            sys.exit(1)
+        print("No regression against %s" % baseline)
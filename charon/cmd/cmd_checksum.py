@@ -16,6 +16,7 @@ limitations under the License.
 from typing import List, Tuple
 
 from charon.config import get_config
+from charon.metrics import report_request_metrics
 from charon.pkgs.checksum_http import (
     handle_checksum_validation_http, refresh_checksum
 )
@@ -144,6 +145,8 @@ def validate(
     except Exception:
         print(traceback.format_exc())
         sys.exit(2)
+    finally:
+        report_request_metrics()
 
 
 @option(
@@ -253,6 +256,8 @@ def refresh(
     except Exception:
         print(traceback.format_exc())
         sys.exit(2)
+    finally:
+        report_request_metrics()
 
 
 def _init_cmd(target: str) -> Tuple[str, str]:
@@ -16,12 +16,14 @@ limitations under the License.
 from typing import List
 
 from charon.config import get_config
+from charon.metrics import report_request_metrics
+from charon.utils.trace import report_trace
 from charon.utils.archive import detect_npm_archive, NpmArchiveType
 from charon.pkgs.maven import handle_maven_del
 from charon.pkgs.npm import handle_npm_del
 from charon.cmd.internal import (
     _decide_mode, _validate_prod_key,
-    _get_local_repo, _get_targets,
+    _get_local_repo, _get_remote_zip, _get_targets,
     _get_ignore_patterns, _safe_delete
 )
 from click import command, option, argument
@@ -119,6 +121,45 @@ logger = logging.getLogger(__name__)
     default=False
 )
 @option("--dryrun", "-n", is_flag=True, default=False)
+@option(
+    "--concurrent_targets",
+    "-C",
+    is_flag=True,
+    default=False,
+    help="""
+    Process the targets at the same time instead of one by one. The targets
+    share the S3 connections and concurrency limit, and a failure of one
+    target will not stop the others.
+    """,
+)
+@option(
+    "--workers",
+    "-W",
+    type=int,
+    default=1,
+    help="""
+    The number of processes to delete the files of a maven archive. The
+    metadata, index and CloudFront work is still done once after the
+    worker processes are all done.
+    """,
+)
+@option(
+    "--stream",
+    is_flag=True,
+    default=False,
+    help="""
+    Read a maven zip at a REPO url with Range requests instead of downloading
+    it, if the server supports them. Only the file names of the archive are
+    needed by the deletion.
+    """,
+)
+@option(
+    "--checksum",
+    help="""
+    The checksum of the REPO url as <algorithm>:<hex digest>, like
+    sha256:..., which the downloaded archive is verified against.
+    """,
+)
 @command()
 def delete(
     repo: str,
@@ -131,7 +172,11 @@ def delete(
     config: str = None,
     debug=False,
     quiet=False,
-    dryrun=False
+    dryrun=False,
+    concurrent_targets=False,
+    workers=1,
+    stream=False,
+    checksum: str = None
 ):
     """Roll back all files in a released product REPO from
     Ronda Service. The REPO points to a product released
@@ -154,8 +199,12 @@ def delete(
             logger.error("No AWS profile specified!")
             sys.exit(1)
 
-        archive_path = _get_local_repo(repo)
-        npm_archive_type = detect_npm_archive(archive_path)
+        archive_path = _get_remote_zip(repo, checksum=checksum) if stream else None
+        if archive_path:
+            npm_archive_type = NpmArchiveType.NOT_NPM
+        else:
+            archive_path = _get_local_repo(repo, checksum=checksum)
+            npm_archive_type = detect_npm_archive(archive_path)
         product_key = f"{product}-{version}"
         manifest_bucket_name = conf.get_manifest_bucket()
         targets_ = _get_targets(targets, conf)
@@ -175,7 +224,8 @@ def delete(
                 dir_=work_dir,
                 cf_enable=conf.is_aws_cf_enable(),
                 dry_run=dryrun,
-                manifest_bucket_name=manifest_bucket_name
+                manifest_bucket_name=manifest_bucket_name,
+                concurrent_targets=concurrent_targets
             )
             if not succeeded:
                 sys.exit(1)
@@ -196,7 +246,9 @@ def delete(
                 dir_=work_dir,
                 cf_enable=conf.is_aws_cf_enable(),
                 dry_run=dryrun,
-                manifest_bucket_name=manifest_bucket_name
+                manifest_bucket_name=manifest_bucket_name,
+                concurrent_targets=concurrent_targets,
+                workers=workers
             )
             if not succeeded:
                 sys.exit(1)
@@ -204,5 +256,7 @@ def delete(
         print(traceback.format_exc())
         sys.exit(2)  # distinguish between exception and bad config or bad state
     finally:
+        report_request_metrics()
+        report_trace()
         if not debug and tmp_dir:
             _safe_delete(tmp_dir)
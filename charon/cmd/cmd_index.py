@@ -15,6 +15,7 @@ limitations under the License.
 """
 
 from charon.config import get_config
+from charon.metrics import report_request_metrics
 from charon.cmd.internal import _decide_mode
 from charon.pkgs.indexing import re_index
 from charon.constants import PACKAGE_TYPE_MAVEN, PACKAGE_TYPE_NPM
@@ -125,3 +126,5 @@ def index(
     except Exception:
         print(traceback.format_exc())
         sys.exit(2)  # distinguish between exception and bad config or bad state
+    finally:
+        report_request_metrics()
@@ -16,12 +16,14 @@ limitations under the License.
 from typing import List
 
 from charon.config import get_config
+from charon.metrics import report_request_metrics
+from charon.utils.trace import report_trace
 from charon.utils.archive import detect_npm_archive, NpmArchiveType
 from charon.pkgs.maven import handle_maven_uploading
 from charon.pkgs.npm import handle_npm_uploading
 from charon.cmd.internal import (
     _decide_mode, _validate_prod_key,
-    _get_local_repo, _get_targets,
+    _get_local_repo, _get_remote_zip, _get_targets,
     _get_ignore_patterns, _safe_delete
 )
 from click import command, option, argument
@@ -136,6 +138,58 @@ logger = logging.getLogger(__name__)
     default=False
 )
 @option("--dryrun", "-n", is_flag=True, default=False)
+@option(
+    "--resume",
+    "-R",
+    is_flag=True,
+    default=False,
+    help="""
+    Resume the interrupted uploading of the same product. The files
+    recorded in the upload journal by the previous run will be skipped,
+    and only the remaining files, metadata and indexes will be uploaded.
+    """,
+)
+@option(
+    "--concurrent_targets",
+    "-C",
+    is_flag=True,
+    default=False,
+    help="""
+    Process the targets at the same time instead of one by one. The targets
+    share the S3 connections and concurrency limit, and a failure of one
+    target will not stop the others.
+    """,
+)
+@option(
+    "--workers",
+    "-W",
+    type=int,
+    default=1,
+    help="""
+    The number of processes to upload the files of a maven archive. The
+    metadata, index and CloudFront work is still done once after the
+    worker processes are all done.
+    """,
+)
+@option(
+    "--stream",
+    is_flag=True,
+    default=False,
+    help="""
+    Upload the files of a maven zip archive straight from the archive
+    instead of extracting it to the work directory first. This falls back
+    to the extraction when the signature generation is enabled. A maven zip
+    at a REPO url is read with Range requests instead of being downloaded
+    if the server supports them.
+    """,
+)
+@option(
+    "--checksum",
+    help="""
+    The checksum of the REPO url as <algorithm>:<hex digest>, like
+    sha256:..., which the downloaded archive is verified against.
+    """,
+)
 @option(
     "--sign_result_loc",
     "-l",
@@ -161,6 +215,11 @@ def upload(
     debug=False,
     quiet=False,
     dryrun=False,
+    resume=False,
+    concurrent_targets=False,
+    workers=1,
+    stream=False,
+    checksum: str = None,
     sign_result_loc="/tmp/sign"
 ):
     """Upload all files from a released product REPO to Ronda
@@ -184,8 +243,12 @@ def upload(
             logger.error("No AWS profile specified!")
             sys.exit(1)
 
-        archive_path = _get_local_repo(repo)
-        npm_archive_type = detect_npm_archive(archive_path)
+        archive_path = _get_remote_zip(repo, checksum=checksum) if stream else None
+        if archive_path:
+            npm_archive_type = NpmArchiveType.NOT_NPM
+        else:
+            archive_path = _get_local_repo(repo, checksum=checksum)
+            npm_archive_type = detect_npm_archive(archive_path)
         product_key = f"{product}-{version}"
         manifest_bucket_name = conf.get_manifest_bucket()
         targets_ = _get_targets(targets, conf)
@@ -208,7 +271,9 @@ def upload(
                 cf_enable=conf.is_aws_cf_enable(),
                 key=sign_key,
                 dry_run=dryrun,
-                manifest_bucket_name=manifest_bucket_name
+                manifest_bucket_name=manifest_bucket_name,
+                resume=resume,
+                concurrent_targets=concurrent_targets
             )
             if not succeeded:
                 sys.exit(1)
@@ -233,7 +298,11 @@ def upload(
                 dry_run=dryrun,
                 manifest_bucket_name=manifest_bucket_name,
                 config=config,
-                sign_result_loc=sign_result_loc
+                sign_result_loc=sign_result_loc,
+                resume=resume,
+                concurrent_targets=concurrent_targets,
+                workers=workers,
+                stream=stream
             )
             if not succeeded:
                 sys.exit(1)
@@ -241,5 +310,7 @@ def upload(
         print(traceback.format_exc())
         sys.exit(2)  # distinguish between exception and bad config or bad state
     finally:
+        report_request_metrics()
+        report_trace()
         if not debug and tmp_dir:
             _safe_delete(tmp_dir)
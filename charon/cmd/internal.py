@@ -20,7 +20,9 @@ from charon.constants import DEFAULT_REGISTRY
 from charon.types import TARGET_TYPE
 from charon.utils.logs import set_logging
 from charon.utils.archive import download_archive
+from charon.utils.remote_zip import HttpRangeFile, is_remote
 from json import loads
+from zipfile import BadZipFile, ZipFile
 from shutil import rmtree
 
 import logging
@@ -66,15 +68,37 @@ def _get_ignore_patterns(conf: CharonConfig) -> Optional[List[str]]:
     return None
 
 
-def _get_local_repo(url: str) -> str:
+def _get_local_repo(url: str, checksum: Optional[str] = None) -> str:
     archive_path = url
     if url.startswith("http://") or url.startswith("https://"):
         logger.info("Start downloading tarball %s", url)
-        archive_path = download_archive(url)
+        archive_path = download_archive(url, checksum=checksum)
         logger.info("Tarball downloaded at: %s", archive_path)
     return archive_path
 
 
+def _get_remote_zip(url: str, checksum: Optional[str] = None) -> Optional[str]:
+    """The url if it is a remote maven zip which can be read with Range
+    requests, or None if the archive should be downloaded, like when it is
+    an npm archive, it needs a checksum verification or the server does not
+    support Range requests.
+    """
+    if not is_remote(url):
+        return None
+    if checksum:
+        logger.info("Tarball %s will be downloaded to verify its checksum", url)
+        return None
+    try:
+        with HttpRangeFile(url) as fp, ZipFile(fp) as zip_file:
+            if "package.json" in zip_file.NameToInfo:
+                return None
+    except (BadZipFile, OSError) as e:
+        logger.info("Tarball %s can not be read remotely, will download it: %s", url, e)
+        return None
+    logger.info("Tarball %s will be read remotely", url)
+    return url
+
+
 def _validate_prod_key(product: str, version: str) -> bool:
     if not product or product.strip() == "":
         logger.error("Error: product can not be empty!")
@@ -0,0 +1,125 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import json
+import logging
+import os
+import threading
+from typing import Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_DIR = "journals"
+JOURNAL_SUFFIX = ".journal"
+# The journal is flushed for every entry, and synced to disk after every
+# JOURNAL_SYNC_INTERVAL entries
+JOURNAL_SYNC_INTERVAL = 100
+
+
+def get_journal_path(product_key: str) -> str:
+    """The journal of a product is stored in $HOME/.charon/journals/"""
+    return os.path.join(
+        os.getenv("HOME", ""), ".charon", JOURNAL_DIR, product_key + JOURNAL_SUFFIX
+    )
+
+
+class UploadJournal(object):
+    """The UploadJournal records the (bucket, key, sha1) of files which are
+    completely uploaded to S3, including their product info, so that an
+    interrupted uploading can be resumed without redoing the finished work.
+        * The journal is an append-only file with one JSON entry per line, so an
+          entry torn by the interruption will just be ignored when loading.
+        * If resume is False, the existing journal will be discarded.
+        * The journal is removed after the uploading is closed successfully, and
+          kept for the next resuming if not.
+    """
+
+    def __init__(self, path: str, resume=False):
+        self.__path = path
+        self.__entries: Set[Tuple[str, str, str]] = set()
+        self.__lock = threading.Lock()
+        self.__unsynced = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if resume:
+            self.__load()
+        elif os.path.isfile(path):
+            logger.debug("Discarding the previous upload journal %s", path)
+            os.remove(path)
+        self.__file = open(path, "a", encoding="utf-8")
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def __load(self):
+        if not os.path.isfile(self.__path):
+            logger.info("No upload journal %s found, will upload from the start", self.__path)
+            return
+        with open(self.__path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    (bucket, key, sha1) = json.loads(line)
+                    self.__entries.add((bucket, key, sha1))
+                except ValueError:
+                    logger.warning("Ignored broken entry in upload journal: %s", line.strip())
+        logger.info(
+            "Resuming with upload journal %s, %d files were already uploaded",
+            self.__path, len(self.__entries)
+        )
+
+    def is_done(self, bucket: str, key: str, sha1: str) -> bool:
+        return (bucket, key, sha1) in self.__entries
+
+    def record(self, bucket: str, key: str, sha1: str):
+        entry = (bucket, key, sha1)
+        with self.__lock:
+            if entry in self.__entries:
+                return
+            self.__entries.add(entry)
+            self.__file.write(json.dumps(entry) + "\n")
+            self.__file.flush()
+            self.__unsynced += 1
+            if self.__unsynced >= JOURNAL_SYNC_INTERVAL:
+                os.fsync(self.__file.fileno())
+                self.__unsynced = 0
+
+    def release(self):
+        """Close the journal file but keep the journal, which is used by the
+        worker processes sharing the journal of their parent process.
+        """
+        with self.__lock:
+            if self.__file.closed:
+                return
+            self.__file.flush()
+            os.fsync(self.__file.fileno())
+            self.__file.close()
+
+    def close(self, succeeded: bool):
+        with self.__lock:
+            if self.__file.closed:
+                return
+            self.__file.flush()
+            os.fsync(self.__file.fileno())
+            self.__file.close()
+        if succeeded:
+            os.remove(self.__path)
+        else:
+            logger.info(
+                "Upload journal is kept in %s, rerun the uploading with --resume "
+                "to skip the uploaded files", self.__path
+            )
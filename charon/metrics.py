@@ -0,0 +1,204 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import bisect
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# The path of the file to write the JSON summary of the S3 requests when a
+# command is done
+METRICS_FILE_ENV = "charon_request_metrics"
+# The upper bounds in seconds of the latency histogram buckets, growing by 25%
+# from 1ms to about 2 minutes. The latencies above the last bound are counted
+# in an extra bucket.
+LATENCY_BOUNDS: List[float] = [0.001 * 1.25 ** i for i in range(53)]
+PERCENTILES = [50, 95, 99]
+
+
+class _OperationStats(object):
+    def __init__(self):
+        self.count = 0
+        self.skipped = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.histogram = [0] * (len(LATENCY_BOUNDS) + 1)
+
+    def merge(self, other: Dict[str, Any]):
+        self.count += other["count"]
+        self.skipped += other["skipped"]
+        self.errors += other["errors"]
+        self.bytes_sent += other["bytes_sent"]
+        self.bytes_received += other["bytes_received"]
+        self.latency_total += other["latency_total"]
+        self.latency_max = max(self.latency_max, other["latency_max"])
+        for (i, n) in enumerate(other["histogram"]):
+            self.histogram[i] += n
+
+    def percentile(self, p: int) -> float:
+        """The upper bound of the histogram bucket holding the percentile,
+        which is never more than the max latency.
+        """
+        timed = self.count - self.skipped
+        if timed <= 0:
+            return 0.0
+        rank = max(int(timed * p / 100.0 + 0.5), 1)
+        seen = 0
+        for (i, n) in enumerate(self.histogram):
+            seen += n
+            if seen >= rank:
+                if i < len(LATENCY_BOUNDS):
+                    return min(LATENCY_BOUNDS[i], self.latency_max)
+                break
+        return self.latency_max
+
+
+class RequestMetrics(object):
+    """RequestMetrics counts and times the S3 requests by operation and
+    bucket, with the bytes sent and received by them.
+        * The latencies are kept in a histogram, so the memory used does not
+          grow with the number of requests, and the percentiles are accurate to
+          the 25% wide buckets.
+        * The requests which are not sent in dry run mode are recorded as
+          skipped, which are counted but not timed, so a dry run gives the
+          same counts as the real run.
+        * The metrics are thread safe.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__stats: Dict[Tuple[str, str], _OperationStats] = {}
+
+    def record(
+        self, operation: str, bucket: str, latency: float,
+        sent=0, received=0, error=False
+    ):
+        index = bisect.bisect_left(LATENCY_BOUNDS, latency)
+        with self.__lock:
+            stats = self.__get(operation, bucket)
+            stats.count += 1
+            if error:
+                stats.errors += 1
+            stats.bytes_sent += sent
+            stats.bytes_received += received
+            stats.latency_total += latency
+            stats.latency_max = max(stats.latency_max, latency)
+            stats.histogram[index] += 1
+
+    def record_skipped(self, operation: str, bucket: str, sent=0):
+        """Record the request which is not sent because of the dry run mode"""
+        with self.__lock:
+            stats = self.__get(operation, bucket)
+            stats.count += 1
+            stats.skipped += 1
+            stats.bytes_sent += sent
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Get the raw metrics, which can be sent to another process and
+        merged into its metrics.
+        """
+        with self.__lock:
+            return [
+                dict(
+                    vars(stats), histogram=list(stats.histogram),
+                    operation=operation, bucket=bucket
+                )
+                for ((operation, bucket), stats) in self.__stats.items()
+            ]
+
+    def merge(self, snapshot: List[Dict[str, Any]]):
+        with self.__lock:
+            for entry in snapshot:
+                self.__get(entry["operation"], entry["bucket"]).merge(entry)
+
+    def summary(self) -> Dict[str, Any]:
+        """Get the summary of the requests per operation and bucket, and the
+        totals. The latencies are in milliseconds.
+        """
+        with self.__lock:
+            operations = [
+                _summarize(stats, operation=operation, bucket=bucket)
+                for ((operation, bucket), stats) in sorted(self.__stats.items())
+            ]
+            total = _OperationStats()
+            for stats in self.__stats.values():
+                total.merge(vars(stats))
+        return {"operations": operations, "total": _summarize(total)}
+
+    def reset(self):
+        with self.__lock:
+            self.__stats = {}
+
+    def __get(self, operation: str, bucket: str) -> _OperationStats:
+        key = (operation, bucket)
+        stats = self.__stats.get(key)
+        if stats is None:
+            stats = _OperationStats()
+            self.__stats[key] = stats
+        return stats
+
+
+def _summarize(stats: _OperationStats, **keys) -> Dict[str, Any]:
+    timed = stats.count - stats.skipped
+    summary: Dict[str, Any] = dict(keys)
+    summary.update({
+        "count": stats.count,
+        "skipped": stats.skipped,
+        "errors": stats.errors,
+        "bytes_sent": stats.bytes_sent,
+        "bytes_received": stats.bytes_received,
+        "latency_ms": {
+            "mean": round(stats.latency_total * 1000 / timed, 3) if timed else 0.0,
+            "max": round(stats.latency_max * 1000, 3),
+            **{
+                f"p{p}": round(stats.percentile(p) * 1000, 3) for p in PERCENTILES
+            }
+        }
+    })
+    return summary
+
+
+_request_metrics = RequestMetrics()
+
+
+def get_request_metrics() -> RequestMetrics:
+    """The metrics of the S3 requests sent by all S3Clients of the process"""
+    return _request_metrics
+
+
+def report_request_metrics(path: Optional[str] = None):
+    """Log the JSON summary of the S3 requests, and write it to the file of
+    path, or of the charon_request_metrics environment variable if path is
+    not set.
+    """
+    summary = get_request_metrics().summary()
+    if not summary["operations"]:
+        return
+    content = json.dumps(summary)
+    logger.info("[S3] Request summary: %s", content)
+    path = path or os.getenv(METRICS_FILE_ENV)
+    if path:
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content)
+        except OSError as e:
+            logger.warning("Can not write S3 request summary to %s: %s", path, e)
@@ -274,53 +274,53 @@ def re_index(
     """
     bucket_name = target.get("bucket", "")
     prefix = target.get("prefix", "")
-    s3_client = S3Client(aws_profile=aws_profile, dry_run=dry_run)
-    real_prefix = prefix if prefix.strip() != "/" else ""
-    s3_folder = os.path.join(real_prefix, path)
-    if path.strip() == "" or path.strip() == "/":
-        s3_folder = prefix
-    items: List[str] = s3_client.list_folder_content(bucket_name, s3_folder)
-    contents = [i for i in items if not i.endswith(PROD_INFO_SUFFIX)]
-    if PACKAGE_TYPE_NPM == package_type:
-        if any([True if "package.json" in c else False for c in contents]):
-            logger.warning(
-                "The path %s contains NPM package.json which will work as "
-                "package metadata for indexing. This indexing is ignored.",
-                path
-            )
-            return
-
-    if len(contents) >= 1:
-        real_contents = []
-        if real_prefix and real_prefix.strip() != "":
-            for c in contents:
-                if c.strip() != "":
-                    if c.startswith(real_prefix):
-                        real_c = remove_prefix(c, real_prefix)
-                        real_c = remove_prefix(real_c, "/")
-                        real_contents.append(real_c)
-                    else:
-                        real_contents.append(c)
+    with S3Client(aws_profile=aws_profile, dry_run=dry_run) as s3_client:
+        real_prefix = prefix if prefix.strip() != "/" else ""
+        s3_folder = os.path.join(real_prefix, path)
+        if path.strip() == "" or path.strip() == "/":
+            s3_folder = prefix
+        items: List[str] = s3_client.list_folder_content(bucket_name, s3_folder)
+        contents = [i for i in items if not i.endswith(PROD_INFO_SUFFIX)]
+        if PACKAGE_TYPE_NPM == package_type:
+            if any([True if "package.json" in c else False for c in contents]):
+                logger.warning(
+                    "The path %s contains NPM package.json which will work as "
+                    "package metadata for indexing. This indexing is ignored.",
+                    path
+                )
+                return
+
+        if len(contents) >= 1:
+            real_contents = []
+            if real_prefix and real_prefix.strip() != "":
+                for c in contents:
+                    if c.strip() != "":
+                        if c.startswith(real_prefix):
+                            real_c = remove_prefix(c, real_prefix)
+                            real_c = remove_prefix(real_c, "/")
+                            real_contents.append(real_c)
+                        else:
+                            real_contents.append(c)
+            else:
+                real_contents = contents
+            index_content = __to_html_content(package_type, real_contents, path)
+            logger.debug("The re-indexed page content: %s", index_content)
+            if not dry_run:
+                index_path = os.path.join(path, "index.html")
+                if path == "/":
+                    index_path = "index.html"
+                s3_client.simple_delete_file(index_path, (bucket_name, real_prefix))
+                s3_client.simple_upload_file(
+                    index_path, index_content, (bucket_name, real_prefix),
+                    "text/html", digest_content(index_content)
+                )
+                # We will not invalidate index.html per cost consideration
+                # if cf_enable:
+                #     cf_client = CFClient(aws_profile=aws_profile)
+                #     invalidate_cf_paths(cf_client, bucket, [index_path])
         else:
-            real_contents = contents
-        index_content = __to_html_content(package_type, real_contents, path)
-        logger.debug("The re-indexed page content: %s", index_content)
-        if not dry_run:
-            index_path = os.path.join(path, "index.html")
-            if path == "/":
-                index_path = "index.html"
-            s3_client.simple_delete_file(index_path, (bucket_name, real_prefix))
-            s3_client.simple_upload_file(
-                index_path, index_content, (bucket_name, real_prefix),
-                "text/html", digest_content(index_content)
+            logger.warning(
+                "The path %s does not contain any contents in bucket %s. "
+                "Will not do any re-indexing",
+                path, bucket_name
             )
-            # We will not invalidate index.html per cost consideration
-            # if cf_enable:
-            #     cf_client = CFClient(aws_profile=aws_profile)
-            #     invalidate_cf_paths(cf_client, bucket, [index_path])
-    else:
-        logger.warning(
-            "The path %s does not contain any contents in bucket %s. "
-            "Will not do any re-indexing",
-            path, bucket_name
-        )
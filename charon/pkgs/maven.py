@@ -17,16 +17,22 @@ from charon.utils.files import HashType
 import charon.pkgs.indexing as indexing
 import charon.pkgs.signature as signature
 import charon.pkgs.radas_sign as radas_signature
-from charon.utils.files import overwrite_file, digest, write_manifest
-from charon.utils.archive import extract_zip_all
+from charon.utils.files import overwrite_file, digests, write_manifest, LocalFiles
+from charon.utils.archive import extract_zip_members, ExtractedZipFiles, ZipSource
+from charon.utils.remote_zip import is_remote
 from charon.utils.strings import remove_prefix
+from charon.utils.trace import span
 from charon.storage import S3Client
+from charon.journal import UploadJournal, get_journal_path
 from charon.cache import CFClient
 from charon.types import TARGET_TYPE
 from charon.pkgs.pkg_utils import (
     upload_post_process,
     rollback_post_process,
-    invalidate_cf_paths
+    invalidate_cf_paths,
+    rebase_paths,
+    run_file_workers,
+    run_targets
 )
 from charon.config import CharonConfig, get_template, get_config
 from charon.constants import (META_FILE_GEN_KEY, META_FILE_DEL_KEY,
@@ -36,7 +42,7 @@ from charon.constants import (META_FILE_GEN_KEY, META_FILE_DEL_KEY,
 from typing import Dict, List, Tuple
 from jinja2 import Template
 from datetime import datetime
-from zipfile import ZipFile, BadZipFile
+from zipfile import BadZipFile
 from tempfile import mkdtemp
 from defusedxml import ElementTree
 
@@ -44,6 +50,7 @@ import os
 import sys
 import logging
 import re
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -235,22 +242,30 @@ def gen_meta_file(group_id, artifact_id: str, versions: list, root="/", digest=T
 
 
 def __gen_all_digest_files(meta_file_path: str) -> List[str]:
-    md5_path = meta_file_path + ".md5"
-    sha1_path = meta_file_path + ".sha1"
-    sha256_path = meta_file_path + ".sha256"
+    hash_types = {
+        ".md5": HashType.MD5,
+        ".sha1": HashType.SHA1,
+        ".sha256": HashType.SHA256
+    }
+    try:
+        checksums = digests(meta_file_path, hash_types.values())
+    except FileNotFoundError:
+        logger.warning(
+            "Error: Can not create digest files for %s because it does not exist",
+            meta_file_path
+        )
+        return []
     digest_files = []
-    if __gen_digest_file(md5_path, meta_file_path, HashType.MD5):
-        digest_files.append(md5_path)
-    if __gen_digest_file(sha1_path, meta_file_path, HashType.SHA1):
-        digest_files.append(sha1_path)
-    if __gen_digest_file(sha256_path, meta_file_path, HashType.SHA256):
-        digest_files.append(sha256_path)
+    for (suffix, hash_type) in hash_types.items():
+        hash_file_path = meta_file_path + suffix
+        if __gen_digest_file(hash_file_path, meta_file_path, checksums[hash_type]):
+            digest_files.append(hash_file_path)
     return digest_files
 
 
-def __gen_digest_file(hash_file_path, meta_file_path: str, hashtype: HashType) -> bool:
+def __gen_digest_file(hash_file_path, meta_file_path: str, checksum: str) -> bool:
     try:
-        overwrite_file(hash_file_path, digest(meta_file_path, hashtype))
+        overwrite_file(hash_file_path, checksum)
     except FileNotFoundError:
         logger.warning(
             "Error: Can not create digest file %s for %s "
@@ -276,7 +291,11 @@ def handle_maven_uploading(
     dry_run=False,
     manifest_bucket_name=None,
     config=None,
-    sign_result_loc="/tmp/sign"
+    sign_result_loc="/tmp/sign",
+    resume=False,
+    concurrent_targets=False,
+    workers=1,
+    stream=False
 ) -> Tuple[str, bool]:
     """ Handle the maven product release tarball uploading process.
         * repo is the location of the tarball in filesystem
@@ -291,20 +310,56 @@ def handle_maven_uploading(
           prefix. See target definition in Charon configuration for details
         * dir_ is base dir for extracting the tarball, will use system
           tmp dir if None.
+        * resume is used to skip the files already uploaded by the previous
+          interrupted uploading of the same product, which are recorded in
+          the upload journal.
+        * concurrent_targets is used to process the targets at the same time
+          after the files uploading, instead of one by one.
+        * workers is the number of processes to upload the files. If it is more
+          than 1, the files are partitioned to the worker processes, and the
+          metadata, index and CloudFront work is still done once in this process.
+        * stream is used to upload the files from the zip stream without
+          extracting the zip to disk. Only the folders and the
+          archetype-catalog.xml are written to disk for the metadata and index
+          generation. As the signing needs the artifacts on disk, the zip is
+          still extracted if the signature generation is enabled.
 
         Returns the directory used for archive processing and if the uploading is successful
     """
     if targets is None:
         targets = []
-    # 1. extract tarball
-    tmp_root = _extract_tarball(repo, prod_key, dir__=dir_)
-
-    # 2. scan for paths and filter out the ignored paths,
-    # and also collect poms for later metadata generation
-    (top_level,
-     valid_mvn_paths,
-     valid_poms,
-     valid_dirs) = _scan_paths(tmp_root, ignore_patterns, root)
+    if stream and __needs_artifacts(gen_sign, config):
+        logger.warning(
+            "Warning: Signing needs the artifacts on disk, the zip will be extracted"
+        )
+        stream = False
+    # 1. scan the members of the tarball for paths and filter out the ignored
+    # paths, and also collect poms for later metadata generation
+    with span("scan") as stage:
+        (tmp_root, source) = _open_zip_source(repo, prod_key, dir__=dir_)
+        (top_level,
+         valid_mvn_paths,
+         valid_poms,
+         valid_dirs) = _scan_paths(tmp_root, ignore_patterns, root, walk=source.walk)
+        stage.set(files=len(valid_mvn_paths), poms=len(valid_poms))
+
+    # 2. extract the valid paths only, or only the files needed by the
+    # metadata generation if the files are uploaded from the zip stream
+    with span(
+        "extract", archive=os.path.basename(repo), stream=stream, workers=workers
+    ):
+        files: LocalFiles = source
+        if stream:
+            source.materialize(
+                [os.path.join(top_level, MAVEN_ARCH_FILE)], [top_level] + valid_dirs
+            )
+        else:
+            _extract_members(
+                source, top_level, valid_mvn_paths, [top_level] + valid_dirs, workers
+            )
+            # The extracted files are digested with the digest cache keyed by
+            # their zip members, so it is reused when the zip is pushed again
+            files = ExtractedZipFiles(source)
 
     # This prefix is a subdir under top-level directory in tarball
     # or root before real GAV dir structure
@@ -313,194 +368,247 @@ def handle_maven_uploading(
         sys.exit(1)
 
     # 3. do validation for the files, like product version checking
-    logger.info("Validating paths with rules.")
-    (err_msgs, passed) = _validate_maven(valid_mvn_paths)
-    if not passed:
-        _handle_error(err_msgs)
-        # Question: should we exit here?
+    with span("validate", files=len(valid_mvn_paths)):
+        logger.info("Validating paths with rules.")
+        (err_msgs, passed) = _validate_maven(valid_mvn_paths)
+        if not passed:
+            _handle_error(err_msgs)
+            # Question: should we exit here?
 
     # 4. Do uploading
-    s3_client = S3Client(aws_profile=aws_profile, dry_run=dry_run)
+    journal = None
+    if not dry_run:
+        journal = UploadJournal(get_journal_path(prod_key), resume=resume)
+    s3_client = S3Client(
+        aws_profile=aws_profile, dry_run=dry_run, journal=journal, listing_cache=True
+    )
     targets_ = [(target[1], remove_prefix(target[2], "/")) for target in targets]
     logger.info(
         "Start uploading files to s3 buckets: %s",
         [target[1] for target in targets]
     )
-    failed_files = s3_client.upload_files(
-        file_paths=valid_mvn_paths,
-        targets=targets_,
-        product=prod_key,
-        root=top_level
-    )
+    with span("upload", files=len(valid_mvn_paths), workers=workers) as stage:
+        if workers > 1:
+            failed_files = run_file_workers(
+                "upload_files", valid_mvn_paths, workers,
+                client_args={"aws_profile": aws_profile, "dry_run": dry_run, "listing_cache": True},
+                journal_path=journal.path if journal else None,
+                targets=targets_,
+                product=prod_key,
+                root=top_level,
+                source=files
+            )
+        else:
+            failed_files = s3_client.upload_files(
+                file_paths=valid_mvn_paths,
+                targets=targets_,
+                product=prod_key,
+                root=top_level,
+                source=files
+            )
+        stage.set(failed=len(failed_files))
+    files.close()
     logger.info("Files uploading done\n")
-    succeeded = True
-    generated_signs = []
-    for bucket in targets:
+    if manifest_bucket_name:
+        manifest_name, manifest_full_path = write_manifest(valid_mvn_paths, top_level, prod_key)
+    generated_signs: List[str] = []
+    sign_lock = threading.Lock()
+
+    def upload_target(bucket: TARGET_TYPE, meta_root: str) -> bool:
         # prepare cf invalidate files
         cf_invalidate_paths = []
 
         # 5. Do manifest uploading
-        if not manifest_bucket_name:
-            logger.warning(
-                'Warning: No manifest bucket is provided, will ignore the process of manifest '
-                'uploading\n')
-        else:
-            logger.info("Start uploading manifest to s3 bucket %s", manifest_bucket_name)
-            manifest_folder = bucket[1]
-            manifest_name, manifest_full_path = write_manifest(valid_mvn_paths, top_level, prod_key)
-            s3_client.upload_manifest(
-                manifest_name, manifest_full_path,
-                manifest_folder, manifest_bucket_name
-            )
-            logger.info("Manifest uploading is done\n")
+        with span("manifest", bucket=bucket[1]):
+            if not manifest_bucket_name:
+                logger.warning(
+                    'Warning: No manifest bucket is provided, will ignore the process of manifest '
+                    'uploading\n')
+            else:
+                logger.info("Start uploading manifest to s3 bucket %s", manifest_bucket_name)
+                manifest_folder = bucket[1]
+                s3_client.upload_manifest(
+                    manifest_name, manifest_full_path,
+                    manifest_folder, manifest_bucket_name
+                )
+                logger.info("Manifest uploading is done\n")
 
         # 6. Use uploaded poms to scan s3 for metadata refreshment
         bucket_name = bucket[1]
         prefix = remove_prefix(bucket[2], "/")
-        logger.info("Start generating maven-metadata.xml files for bucket %s", bucket_name)
-        meta_files = _generate_metadatas(
-            s3=s3_client, bucket=bucket_name,
-            poms=valid_poms, root=top_level,
-            prefix=prefix
-        )
-        logger.info("maven-metadata.xml files generation done\n")
-        failed_metas = meta_files.get(META_FILE_FAILED, [])
-
-        # 7. Upload all maven-metadata.xml
-        if META_FILE_GEN_KEY in meta_files:
-            logger.info("Start updating maven-metadata.xml to s3 bucket %s", bucket_name)
-            _failed_metas = s3_client.upload_metadatas(
-                meta_file_paths=meta_files[META_FILE_GEN_KEY],
-                target=(bucket_name, prefix),
-                product=None,
-                root=top_level
-            )
-            failed_metas.extend(_failed_metas)
-            logger.info("maven-metadata.xml updating done in bucket %s\n", bucket_name)
-            # Add maven-metadata.xml to CF invalidate paths
-            if cf_enable:
-                cf_invalidate_paths.extend(meta_files.get(META_FILE_GEN_KEY, []))
-
-        # 8. Determine refreshment of archetype-catalog.xml
-        if os.path.exists(os.path.join(top_level, MAVEN_ARCH_FILE)):
-            logger.info("Start generating archetype-catalog.xml for bucket %s", bucket_name)
-            upload_archetype_file = _generate_upload_archetype_catalog(
+        with span("metadata", bucket=bucket_name, poms=len(valid_poms)) as stage:
+            logger.info("Start generating maven-metadata.xml files for bucket %s", bucket_name)
+            meta_files = _generate_metadatas(
                 s3=s3_client, bucket=bucket_name,
-                root=top_level,
+                poms=rebase_paths(valid_poms, top_level, meta_root), root=meta_root,
                 prefix=prefix
             )
-            logger.info("archetype-catalog.xml files generation done in bucket %s\n", bucket_name)
+            logger.info("maven-metadata.xml files generation done\n")
+            failed_metas = meta_files.get(META_FILE_FAILED, [])
 
-            # 9. Upload archetype-catalog.xml if it has changed
-            if upload_archetype_file:
-                archetype_files = [os.path.join(top_level, ARCHETYPE_CATALOG_FILENAME)]
-                archetype_files.extend(
-                    __hash_decorate_metadata(top_level, ARCHETYPE_CATALOG_FILENAME)
-                )
-                logger.info("Start updating archetype-catalog.xml to s3 bucket %s", bucket_name)
+            # 7. Upload all maven-metadata.xml
+            if META_FILE_GEN_KEY in meta_files:
+                logger.info("Start updating maven-metadata.xml to s3 bucket %s", bucket_name)
                 _failed_metas = s3_client.upload_metadatas(
-                    meta_file_paths=archetype_files,
+                    meta_file_paths=meta_files[META_FILE_GEN_KEY],
                     target=(bucket_name, prefix),
                     product=None,
-                    root=top_level
+                    root=meta_root
                 )
                 failed_metas.extend(_failed_metas)
-                logger.info("archetype-catalog.xml updating done in bucket %s\n", bucket_name)
-                # Add archtype-catalog to invalidate paths
+                logger.info("maven-metadata.xml updating done in bucket %s\n", bucket_name)
+                # Add maven-metadata.xml to CF invalidate paths
                 if cf_enable:
-                    cf_invalidate_paths.extend(archetype_files)
+                    cf_invalidate_paths.extend(meta_files.get(META_FILE_GEN_KEY, []))
+            stage.set(files=len(meta_files.get(META_FILE_GEN_KEY, [])), failed=len(failed_metas))
+
+        # 8. Determine refreshment of archetype-catalog.xml
+        if os.path.exists(os.path.join(top_level, MAVEN_ARCH_FILE)):
+            with span("archetype", bucket=bucket_name):
+                logger.info("Start generating archetype-catalog.xml for bucket %s", bucket_name)
+                upload_archetype_file = _generate_upload_archetype_catalog(
+                    s3=s3_client, bucket=bucket_name,
+                    root=meta_root,
+                    prefix=prefix
+                )
+                logger.info(
+                    "archetype-catalog.xml files generation done in bucket %s\n", bucket_name
+                )
+
+                # 9. Upload archetype-catalog.xml if it has changed
+                if upload_archetype_file:
+                    archetype_files = [os.path.join(meta_root, ARCHETYPE_CATALOG_FILENAME)]
+                    archetype_files.extend(
+                        __hash_decorate_metadata(meta_root, ARCHETYPE_CATALOG_FILENAME)
+                    )
+                    logger.info("Start updating archetype-catalog.xml to s3 bucket %s", bucket_name)
+                    _failed_metas = s3_client.upload_metadatas(
+                        meta_file_paths=archetype_files,
+                        target=(bucket_name, prefix),
+                        product=None,
+                        root=meta_root
+                    )
+                    failed_metas.extend(_failed_metas)
+                    logger.info("archetype-catalog.xml updating done in bucket %s\n", bucket_name)
+                    # Add archtype-catalog to invalidate paths
+                    if cf_enable:
+                        cf_invalidate_paths.extend(archetype_files)
 
         # 10. Generate signature file if radas sign is enabled,
         # or do detached sign if contain_signature is set to True
-        conf = get_config(config)
-        if not conf:
-            sys.exit(1)
+        with span("sign", bucket=bucket_name):
+            conf = get_config(config)
+            if not conf:
+                sys.exit(1)
+
+            if conf.is_radas_enabled():
+                logger.info(
+                    "Start generating radas signature files for s3 bucket %s\n", bucket_name
+                )
+                with sign_lock:
+                    (_failed_metas, _generated_signs) = radas_signature.generate_radas_sign(
+                        top_level=top_level, sign_result_loc=sign_result_loc
+                    )
+                    generated_signs.extend(_generated_signs)
+                    signs = list(generated_signs)
+                if not _generated_signs:
+                    logger.error(
+                        "No sign result files were generated, "
+                        "please make sure the sign process is already done and without timeout")
+                    return False
 
-        if conf.is_radas_enabled():
-            logger.info("Start generating radas signature files for s3 bucket %s\n", bucket_name)
-            (_failed_metas, _generated_signs) = radas_signature.generate_radas_sign(
-                top_level=top_level, sign_result_loc=sign_result_loc
-            )
-            if not _generated_signs:
-                logger.error(
-                    "No sign result files were generated, "
-                    "please make sure the sign process is already done and without timeout")
-                return (tmp_root, False)
-
-            failed_metas.extend(_failed_metas)
-            generated_signs.extend(_generated_signs)
-            logger.info("Radas signature files generation done.\n")
-
-            logger.info("Start upload radas signature files to s3 bucket %s\n", bucket_name)
-            _failed_metas = s3_client.upload_signatures(
-                meta_file_paths=generated_signs,
-                target=(bucket_name, prefix),
-                product=None,
-                root=top_level
-            )
-            failed_metas.extend(_failed_metas)
-            logger.info("Radas signature files uploading done.\n")
-
-        elif gen_sign:
-            suffix_list = __get_suffix(PACKAGE_TYPE_MAVEN, conf)
-            command = conf.get_detach_signature_command()
-            artifacts = [s for s in valid_mvn_paths if not s.endswith(tuple(suffix_list))]
-            logger.info("Start generating signature for s3 bucket %s\n", bucket_name)
-            (_failed_metas, _generated_signs) = signature.generate_sign(
-                PACKAGE_TYPE_MAVEN, artifacts,
-                top_level, prefix,
-                s3_client, bucket_name,
-                key, command
-            )
-            failed_metas.extend(_failed_metas)
-            generated_signs.extend(_generated_signs)
-            logger.info("Singature generation done.\n")
+                failed_metas.extend(_failed_metas)
+                logger.info("Radas signature files generation done.\n")
 
-            logger.info("Start upload singature files to s3 bucket %s\n", bucket_name)
-            _failed_metas = s3_client.upload_signatures(
-                meta_file_paths=generated_signs,
-                target=(bucket_name, prefix),
-                product=None,
-                root=top_level
-            )
-            failed_metas.extend(_failed_metas)
-            logger.info("Signature uploading done.\n")
+                logger.info("Start upload radas signature files to s3 bucket %s\n", bucket_name)
+                _failed_metas = s3_client.upload_signatures(
+                    meta_file_paths=signs,
+                    target=(bucket_name, prefix),
+                    product=None,
+                    root=top_level
+                )
+                failed_metas.extend(_failed_metas)
+                logger.info("Radas signature files uploading done.\n")
+
+            elif gen_sign:
+                suffix_list = __get_suffix(PACKAGE_TYPE_MAVEN, conf)
+                command = conf.get_detach_signature_command()
+                artifacts = [s for s in valid_mvn_paths if not s.endswith(tuple(suffix_list))]
+                logger.info("Start generating signature for s3 bucket %s\n", bucket_name)
+                # The signature files are generated in the shared top level folder,
+                # so they are only generated by one target at a time
+                with sign_lock:
+                    (_failed_metas, _generated_signs) = signature.generate_sign(
+                        PACKAGE_TYPE_MAVEN, artifacts,
+                        top_level, prefix,
+                        s3_client, bucket_name,
+                        key, command
+                    )
+                    generated_signs.extend(_generated_signs)
+                    signs = list(generated_signs)
+                failed_metas.extend(_failed_metas)
+                logger.info("Singature generation done.\n")
+
+                logger.info("Start upload singature files to s3 bucket %s\n", bucket_name)
+                _failed_metas = s3_client.upload_signatures(
+                    meta_file_paths=signs,
+                    target=(bucket_name, prefix),
+                    product=None,
+                    root=top_level
+                )
+                failed_metas.extend(_failed_metas)
+                logger.info("Signature uploading done.\n")
 
         # this step generates index.html for each dir and add them to file list
         # index is similar to metadata, it will be overwritten everytime
         if do_index:
-            logger.info("Start generating index files to s3 bucket %s", bucket_name)
-            created_indexes = indexing.generate_indexes(
-                PACKAGE_TYPE_MAVEN,
-                top_level, valid_dirs,
-                s3_client, bucket_name, prefix
-            )
-            logger.info("Index files generation done.\n")
+            with span("index", bucket=bucket_name, dirs=len(valid_dirs)) as stage:
+                logger.info("Start generating index files to s3 bucket %s", bucket_name)
+                created_indexes = indexing.generate_indexes(
+                    PACKAGE_TYPE_MAVEN,
+                    meta_root, rebase_paths(valid_dirs, top_level, meta_root),
+                    s3_client, bucket_name, prefix
+                )
+                logger.info("Index files generation done.\n")
 
-            logger.info("Start updating index files to s3 bucket %s", bucket_name)
-            _failed_metas = s3_client.upload_metadatas(
-                meta_file_paths=created_indexes,
-                target=(bucket_name, prefix),
-                product=None,
-                root=top_level
-            )
-            failed_metas.extend(_failed_metas)
-            logger.info("Index files updating done\n")
-            # We will not invalidate the index files per cost consideration
-            # if cf_enable:
-            #     cf_invalidate_paths.extend(created_indexes)
+                logger.info("Start updating index files to s3 bucket %s", bucket_name)
+                _failed_metas = s3_client.upload_metadatas(
+                    meta_file_paths=created_indexes,
+                    target=(bucket_name, prefix),
+                    product=None,
+                    root=meta_root
+                )
+                failed_metas.extend(_failed_metas)
+                logger.info("Index files updating done\n")
+                # We will not invalidate the index files per cost consideration
+                # if cf_enable:
+                #     cf_invalidate_paths.extend(created_indexes)
+                stage.set(files=len(created_indexes))
         else:
             logger.info("Bypass indexing")
 
         # 11. Finally do the CF invalidating for metadata files
         if cf_enable and len(cf_invalidate_paths) > 0:
-            cf_client = CFClient(aws_profile=aws_profile)
-            cf_invalidate_paths = __wildcard_metadata_paths(cf_invalidate_paths)
-            invalidate_cf_paths(cf_client, bucket, cf_invalidate_paths, top_level)
-
-        upload_post_process(failed_files, failed_metas, prod_key, bucket_name)
-        succeeded = succeeded and len(failed_files) <= 0 and len(failed_metas) <= 0
+            with span("cf", bucket=bucket_name, paths=len(cf_invalidate_paths)):
+                cf_client = CFClient(aws_profile=aws_profile)
+                cf_invalidate_paths = __wildcard_metadata_paths(cf_invalidate_paths)
+                invalidate_cf_paths(cf_client, bucket, cf_invalidate_paths, meta_root)
+
+        upload_post_process(
+            failed_files, failed_metas, prod_key, bucket_name,
+            s3_client.get_concurrency_summary(), s3_client.get_content_cache_summary()
+        )
+        return len(failed_files) <= 0 and len(failed_metas) <= 0
 
+    try:
+        succeeded = run_targets(
+            targets, upload_target, top_level,
+            concurrent=concurrent_targets, workspace_files=[ARCHETYPE_CATALOG_FILENAME]
+        )
+    finally:
+        s3_client.close()
+    if journal:
+        journal.close(succeeded)
     return (tmp_root, succeeded)
 
 
@@ -515,7 +623,9 @@ def handle_maven_del(
     do_index=True,
     cf_enable=False,
     dry_run=False,
-    manifest_bucket_name=None
+    manifest_bucket_name=None,
+    concurrent_targets=False,
+    workers=1
 ) -> Tuple[str, bool]:
     """ Handle the maven product release tarball deletion process.
         * repo is the location of the tarball in filesystem
@@ -530,188 +640,269 @@ def handle_maven_del(
           prefix. See target definition in Charon configuration for details
         * dir is base dir for extracting the tarball, will use system
           tmp dir if None.
+        * concurrent_targets is used to process the targets at the same time,
+          instead of one by one.
+        * workers is the number of processes to delete the files. If it is more
+          than 1, the files are partitioned to the worker processes, and the
+          metadata, index and CloudFront work is still done once in this process.
 
         Returns the directory used for archive processing and if the rollback is successful
     """
     if targets is None:
         targets = []
 
-    # 1. extract tarball
-    tmp_root = _extract_tarball(repo, prod_key, dir__=dir_)
-
-    # 2. scan for paths and filter out the ignored paths,
-    # and also collect poms for later metadata generation
-    (top_level,
-     valid_mvn_paths,
-     valid_poms,
-     valid_dirs) = _scan_paths(tmp_root, ignore_patterns, root)
+    # 1. scan the members of the tarball for paths and filter out the ignored
+    # paths, and also collect poms for later metadata generation
+    with span("scan") as stage:
+        (tmp_root, source) = _open_zip_source(repo, prod_key, dir__=dir_)
+        (top_level,
+         valid_mvn_paths,
+         valid_poms,
+         valid_dirs) = _scan_paths(tmp_root, ignore_patterns, root, walk=source.walk)
+        stage.set(files=len(valid_mvn_paths), poms=len(valid_poms))
+
+    # 2. The deletion works on the paths only, so only the files needed by the
+    # metadata generation are extracted
+    with span("extract", archive=os.path.basename(repo)):
+        try:
+            source.materialize(
+                [os.path.join(top_level, MAVEN_ARCH_FILE)], [top_level] + valid_dirs
+            )
+        except (BadZipFile, OSError) as e:
+            logger.error("Tarball extraction error: %s", e)
+            sys.exit(1)
+        finally:
+            source.close()
 
     # 3. Delete all valid_paths from s3
     logger.debug("Valid poms: %s", valid_poms)
-    succeeded = True
-    for target in targets:
+    # The listings cached by this client would not see the deletions done by
+    # the worker processes
+    s3_client = S3Client(
+        aws_profile=aws_profile, dry_run=dry_run, listing_cache=workers <= 1
+    )
+
+    def delete_target(target: TARGET_TYPE, meta_root: str) -> bool:
         # prepare cf invalidation paths
         cf_invalidate_paths = []
 
         prefix = remove_prefix(target[2], "/")
-        s3_client = S3Client(aws_profile=aws_profile, dry_run=dry_run)
         bucket_name = target[1]
-        logger.info("Start deleting files from s3 bucket %s", bucket_name)
-        failed_files = s3_client.delete_files(
-            valid_mvn_paths,
-            target=(bucket_name, prefix),
-            product=prod_key,
-            root=top_level
-        )
-        logger.info("Files deletion done\n")
+        with span(
+            "delete", bucket=bucket_name, files=len(valid_mvn_paths), workers=workers
+        ) as stage:
+            logger.info("Start deleting files from s3 bucket %s", bucket_name)
+            if workers > 1:
+                failed_files = run_file_workers(
+                    "delete_files", valid_mvn_paths, workers,
+                    client_args={"aws_profile": aws_profile, "dry_run": dry_run},
+                    target=(bucket_name, prefix),
+                    product=prod_key,
+                    root=top_level
+                )
+            else:
+                failed_files = s3_client.delete_files(
+                    valid_mvn_paths,
+                    target=(bucket_name, prefix),
+                    product=prod_key,
+                    root=top_level
+                )
+            logger.info("Files deletion done\n")
+            stage.set(failed=len(failed_files))
 
         # 4. Delete related manifest from s3
-        manifest_folder = target[1]
-        logger.info(
-            "Start deleting manifest from s3 bucket %s in folder %s",
-            manifest_bucket_name, manifest_folder
-        )
-        s3_client.delete_manifest(prod_key, manifest_folder, manifest_bucket_name)
-        logger.info("Manifest deletion is done\n")
+        with span("manifest", bucket=bucket_name):
+            manifest_folder = target[1]
+            logger.info(
+                "Start deleting manifest from s3 bucket %s in folder %s",
+                manifest_bucket_name, manifest_folder
+            )
+            s3_client.delete_manifest(prod_key, manifest_folder, manifest_bucket_name)
+            logger.info("Manifest deletion is done\n")
 
         # 5. Use changed GA to scan s3 for metadata refreshment
-        logger.info(
-            "Start generating maven-metadata.xml files for all changed GAs in s3 bucket %s",
-            bucket_name
-        )
-        meta_files = _generate_metadatas(
-            s3=s3_client, bucket=bucket_name,
-            poms=valid_poms, root=top_level,
-            prefix=prefix
-        )
-
-        logger.info("maven-metadata.xml files generation done\n")
-
-        # 6. Upload all maven-metadata.xml. We need to delete metadata files
-        # firstly for all affected GA, and then replace the theirs content.
-        logger.info("Start updating maven-metadata.xml to s3 bucket %s", bucket_name)
-        all_meta_files = []
-        for _, files in meta_files.items():
-            all_meta_files.extend(files)
-        s3_client.delete_files(
-            file_paths=all_meta_files,
-            target=(bucket_name, prefix),
-            product=None,
-            root=top_level
-        )
-        failed_metas = meta_files.get(META_FILE_FAILED, [])
-        if META_FILE_GEN_KEY in meta_files:
-            _failed_metas = s3_client.upload_metadatas(
-                meta_file_paths=meta_files[META_FILE_GEN_KEY],
-                target=(bucket_name, prefix),
-                product=None,
-                root=top_level
+        with span("metadata", bucket=bucket_name, poms=len(valid_poms)) as stage:
+            logger.info(
+                "Start generating maven-metadata.xml files for all changed GAs in s3 bucket %s",
+                bucket_name
             )
-            if len(_failed_metas) > 0:
-                failed_metas.extend(_failed_metas)
-        logger.info("maven-metadata.xml updating done\n")
-        if cf_enable:
-            logger.debug(
-                "Extending invalidate_paths with %s:", all_meta_files
-            )
-            cf_invalidate_paths.extend(all_meta_files)
-
-        # 7. Determine refreshment of archetype-catalog.xml
-        if os.path.exists(os.path.join(top_level, MAVEN_ARCH_FILE)):
-            logger.info("Start generating archetype-catalog.xml")
-            archetype_action = _generate_rollback_archetype_catalog(
+            meta_files = _generate_metadatas(
                 s3=s3_client, bucket=bucket_name,
-                root=top_level,
+                poms=rebase_paths(valid_poms, top_level, meta_root), root=meta_root,
                 prefix=prefix
             )
-            logger.info("archetype-catalog.xml files generation done\n")
-
-            # 8. Upload or Delete archetype-catalog.xml if it has changed
-            archetype_files = [os.path.join(top_level, ARCHETYPE_CATALOG_FILENAME)]
-            archetype_files.extend(__hash_decorate_metadata(top_level, ARCHETYPE_CATALOG_FILENAME))
-            if archetype_action < 0:
-                logger.info("Start updating archetype-catalog.xml to s3 bucket %s", bucket_name)
-                _failed_metas = s3_client.delete_files(
-                    file_paths=archetype_files,
-                    target=(bucket_name, prefix),
-                    product=None,
-                    root=top_level
-                )
-                if len(_failed_metas) > 0:
-                    failed_metas.extend(_failed_metas)
-            elif archetype_action > 0:
+
+            logger.info("maven-metadata.xml files generation done\n")
+
+            # 6. Upload all maven-metadata.xml. We need to delete metadata files
+            # firstly for all affected GA, and then replace the theirs content.
+            logger.info("Start updating maven-metadata.xml to s3 bucket %s", bucket_name)
+            all_meta_files = []
+            for _, files in meta_files.items():
+                all_meta_files.extend(files)
+            s3_client.delete_files(
+                file_paths=all_meta_files,
+                target=(bucket_name, prefix),
+                product=None,
+                root=meta_root
+            )
+            failed_metas = meta_files.get(META_FILE_FAILED, [])
+            if META_FILE_GEN_KEY in meta_files:
                 _failed_metas = s3_client.upload_metadatas(
-                    meta_file_paths=archetype_files,
+                    meta_file_paths=meta_files[META_FILE_GEN_KEY],
                     target=(bucket_name, prefix),
                     product=None,
-                    root=top_level
+                    root=meta_root
                 )
                 if len(_failed_metas) > 0:
                     failed_metas.extend(_failed_metas)
-            logger.info("archetype-catalog.xml updating done\n")
+            logger.info("maven-metadata.xml updating done\n")
             if cf_enable:
-                cf_invalidate_paths.extend(archetype_files)
+                logger.debug(
+                    "Extending invalidate_paths with %s:", all_meta_files
+                )
+                cf_invalidate_paths.extend(all_meta_files)
+            stage.set(files=len(all_meta_files), failed=len(failed_metas))
+
+        # 7. Determine refreshment of archetype-catalog.xml
+        if os.path.exists(os.path.join(top_level, MAVEN_ARCH_FILE)):
+            with span("archetype", bucket=bucket_name):
+                logger.info("Start generating archetype-catalog.xml")
+                archetype_action = _generate_rollback_archetype_catalog(
+                    s3=s3_client, bucket=bucket_name,
+                    root=meta_root,
+                    prefix=prefix
+                )
+                logger.info("archetype-catalog.xml files generation done\n")
+
+                # 8. Upload or Delete archetype-catalog.xml if it has changed
+                archetype_files = [os.path.join(meta_root, ARCHETYPE_CATALOG_FILENAME)]
+                archetype_files.extend(
+                    __hash_decorate_metadata(meta_root, ARCHETYPE_CATALOG_FILENAME)
+                )
+                if archetype_action < 0:
+                    logger.info("Start updating archetype-catalog.xml to s3 bucket %s", bucket_name)
+                    _failed_metas = s3_client.delete_files(
+                        file_paths=archetype_files,
+                        target=(bucket_name, prefix),
+                        product=None,
+                        root=meta_root
+                    )
+                    if len(_failed_metas) > 0:
+                        failed_metas.extend(_failed_metas)
+                elif archetype_action > 0:
+                    _failed_metas = s3_client.upload_metadatas(
+                        meta_file_paths=archetype_files,
+                        target=(bucket_name, prefix),
+                        product=None,
+                        root=meta_root
+                    )
+                    if len(_failed_metas) > 0:
+                        failed_metas.extend(_failed_metas)
+                logger.info("archetype-catalog.xml updating done\n")
+                if cf_enable:
+                    cf_invalidate_paths.extend(archetype_files)
 
         if do_index:
-            logger.info("Start generating index files for all changed entries")
-            created_indexes = indexing.generate_indexes(
-                PACKAGE_TYPE_MAVEN, top_level, valid_dirs, s3_client, bucket_name, prefix
-            )
-            logger.info("Index files generation done.\n")
+            with span("index", bucket=bucket_name, dirs=len(valid_dirs)) as stage:
+                logger.info("Start generating index files for all changed entries")
+                created_indexes = indexing.generate_indexes(
+                    PACKAGE_TYPE_MAVEN, meta_root, rebase_paths(valid_dirs, top_level, meta_root),
+                    s3_client, bucket_name, prefix
+                )
+                logger.info("Index files generation done.\n")
 
-            logger.info("Start updating index to s3 bucket %s", bucket_name)
-            _failed_index_files = s3_client.upload_metadatas(
-                meta_file_paths=created_indexes,
-                target=(bucket_name, prefix),
-                product=None,
-                root=top_level
-            )
-            if len(_failed_index_files) > 0:
-                failed_metas.extend(_failed_index_files)
-            logger.info("Index files updating done.\n")
-            # We will not invalidate the index files per cost consideration
-            # if cf_enable:
-            #     cf_invalidate_paths.extend(created_indexes)
+                logger.info("Start updating index to s3 bucket %s", bucket_name)
+                _failed_index_files = s3_client.upload_metadatas(
+                    meta_file_paths=created_indexes,
+                    target=(bucket_name, prefix),
+                    product=None,
+                    root=meta_root
+                )
+                if len(_failed_index_files) > 0:
+                    failed_metas.extend(_failed_index_files)
+                logger.info("Index files updating done.\n")
+                # We will not invalidate the index files per cost consideration
+                # if cf_enable:
+                #     cf_invalidate_paths.extend(created_indexes)
+                stage.set(files=len(created_indexes))
         else:
             logger.info("Bypassing indexing")
 
         # 9. Finally do the CF invalidating for metadata files
         if cf_enable and len(cf_invalidate_paths):
-            cf_client = CFClient(aws_profile=aws_profile)
-            cf_invalidate_paths = __wildcard_metadata_paths(cf_invalidate_paths)
-            invalidate_cf_paths(cf_client, target, cf_invalidate_paths, top_level)
-
-        rollback_post_process(failed_files, failed_metas, prod_key, bucket_name)
-        succeeded = succeeded and len(failed_files) == 0 and len(failed_metas) == 0
+            with span("cf", bucket=bucket_name, paths=len(cf_invalidate_paths)):
+                cf_client = CFClient(aws_profile=aws_profile)
+                cf_invalidate_paths = __wildcard_metadata_paths(cf_invalidate_paths)
+                invalidate_cf_paths(cf_client, target, cf_invalidate_paths, meta_root)
+
+        rollback_post_process(
+            failed_files, failed_metas, prod_key, bucket_name,
+            s3_client.get_concurrency_summary(), s3_client.get_content_cache_summary()
+        )
+        return len(failed_files) == 0 and len(failed_metas) == 0
 
+    try:
+        succeeded = run_targets(
+            targets, delete_target, top_level,
+            concurrent=concurrent_targets, workspace_files=[ARCHETYPE_CATALOG_FILENAME]
+        )
+    finally:
+        s3_client.close()
     return (tmp_root, succeeded)
 
 
-def _extract_tarball(repo: str, prefix="", dir__=None) -> str:
-    if os.path.exists(repo):
+def _open_zip_source(repo: str, prefix="", dir__=None) -> Tuple[str, ZipSource]:
+    """Open the zip of repo as a ZipSource rooted at a new temp folder, where
+    only the members which are needed will be extracted after the scanning.
+    The repo can be the url of a remote zip which supports Range requests.
+    """
+    if os.path.exists(repo) or is_remote(repo):
         try:
-            logger.info("Extracting tarball %s", repo)
-            repo_zip = ZipFile(repo)
+            logger.info("Reading tarball %s", repo)
             tmp_root = mkdtemp(prefix=f"charon-{prefix}-", dir=dir__)
-            extract_zip_all(repo_zip, tmp_root)
-            return tmp_root
-        except BadZipFile as e:
+            source = ZipSource(repo, tmp_root)
+            # Read the central directory of the zip now, so a bad zip is found early
+            source.members()
+            return (tmp_root, source)
+        except (BadZipFile, OSError) as e:
             logger.error("Tarball extraction error: %s", e)
             sys.exit(1)
     logger.error("Error: archive %s does not exist", repo)
     sys.exit(1)
 
 
+def _extract_members(
+    source: ZipSource, top_level: str, paths: List[str], dirs: List[str], workers=1
+):
+    """Extract the members of paths from the zip of source in workers
+    processes, and create the folders of dirs. The archetype-catalog.xml under
+    top_level is extracted too, as it is ignored by the scanning but is
+    merged from the disk by the archetype catalog generation.
+    """
+    paths = paths + [os.path.join(top_level, MAVEN_ARCH_FILE)]
+    try:
+        logger.info("Extracting %d files from tarball %s", len(paths), source.zip_path)
+        extract_zip_members(source, paths, dirs, workers=workers)
+    except BadZipFile as e:
+        logger.error("Tarball extraction error: %s", e)
+        sys.exit(1)
+    finally:
+        source.close()
+
+
 def _scan_paths(files_root: str, ignore_patterns: List[str],
-                root: str) -> Tuple[str, List[str], List[str], List[str]]:
+                root: str, walk=os.walk) -> Tuple[str, List[str], List[str], List[str]]:
     # 2. scan for paths and filter out the ignored paths,
-    # and also collect poms for later metadata generation
+    # and also collect poms for later metadata generation.
+    # The folders are walked by walk, which can be ZipSource.walk to scan the
+    # members of a zip without extracting it
     logger.info("Scan %s to collect files", files_root)
     top_level = root
     valid_mvn_paths, non_mvn_paths, ignored_paths, valid_poms, valid_dirs = [], [], [], [], []
     changed_dirs = set()
     top_found = False
-    for root_dir, dirs, names in os.walk(files_root):
+    for root_dir, dirs, names in walk(files_root):
         for directory in dirs:
             changed_dirs.add(os.path.join(root_dir, directory))
             if not top_found:
@@ -1127,6 +1318,14 @@ def _handle_error(err_msgs: List[str]):
     pass
 
 
+def __needs_artifacts(gen_sign: bool, config: str) -> bool:
+    """If the signing of the uploading needs the artifacts on disk"""
+    if gen_sign:
+        return True
+    conf = get_config(config)
+    return bool(conf and conf.is_radas_enabled())
+
+
 def __get_suffix(package_type: str, conf: CharonConfig) -> List[str]:
     if package_type:
         suffix = conf.get_ignore_signature_suffix(package_type)
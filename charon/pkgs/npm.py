@@ -28,15 +28,19 @@ import charon.pkgs.signature as signature
 from charon.config import CharonConfig, get_config
 from charon.constants import META_FILE_GEN_KEY, META_FILE_DEL_KEY, PACKAGE_TYPE_NPM
 from charon.storage import S3Client
+from charon.journal import UploadJournal, get_journal_path
 from charon.cache import CFClient
 from charon.types import TARGET_TYPE
-from charon.utils.archive import extract_npm_tarball
+from charon.utils.archive import extract_npm_tarball, link_or_copy, npm_tarball_url
 from charon.pkgs.pkg_utils import (
     upload_post_process,
     rollback_post_process,
-    invalidate_cf_paths
+    invalidate_cf_paths,
+    rebase_paths,
+    run_targets
 )
 from charon.utils.strings import remove_prefix
+from charon.utils.trace import span
 from charon.utils.files import write_manifest
 from charon.utils.map import del_none, replace_field
 
@@ -89,7 +93,9 @@ def handle_npm_uploading(
         key=None,
         dry_run=False,
         manifest_bucket_name=None,
-        config=None
+        config=None,
+        resume=False,
+        concurrent_targets=False
 ) -> Tuple[str, bool]:
     """ Handle the npm product release tarball uploading process.
         For NPM uploading, tgz file and version metadata will be relocated based
@@ -102,37 +108,67 @@ def handle_npm_uploading(
           prefix. See target definition in Charon configuration for details
         * dir_ is base dir for extracting the tarball, will use system
           tmp dir if None.
+        * resume is used to skip the files already uploaded by the previous
+          interrupted uploading of the same product, which are recorded in
+          the upload journal.
+        * concurrent_targets is used to process the targets at the same time,
+          instead of one by one.
 
         Returns the directory used for archive processing and if uploading is successful
     """
 
-    client = S3Client(aws_profile=aws_profile, dry_run=dry_run)
-    generated_signs = []
-    succeeded = True
-    root_dir = mkdtemp(prefix=f"npm-charon-{product}-", dir=dir_)
-    for target in targets:
+    journal = None
+    if not dry_run:
+        journal = UploadJournal(get_journal_path(product), resume=resume)
+    client = S3Client(
+        aws_profile=aws_profile, dry_run=dry_run, journal=journal, listing_cache=True
+    )
+    # The tarball is ingested once for all the targets, and only the version
+    # metadata is rendered for the registry of every target
+    with span("extract", archive=os.path.basename(tarball_path)):
+        target_dir, valid_paths, scanned_version = _scan_metadata_paths_from_archive(
+            tarball_path, prod=product, dir__=dir_, pkg_root=root_path
+        )
+    if not os.path.isdir(target_dir):
+        logger.error("Error: the extracted target_dir path %s does not exist.", target_dir)
+        sys.exit(1)
+    if not scanned_version:
+        logger.error("Error: no version package.json is found in tarball %s", tarball_path)
+        sys.exit(1)
+    version: dict = scanned_version
+    valid_dirs = __get_path_tree(valid_paths, target_dir)
+
+    def upload_target(target: TARGET_TYPE, _: Optional[str]) -> bool:
         # prepare cf invalidate files
         cf_invalidate_paths = []
 
         bucket_name = target[1]
         prefix = remove_prefix(target[2], "/")
         registry = target[3]
-        target_dir, valid_paths, package_metadata = _scan_metadata_paths_from_archive(
-            tarball_path, registry, prod=product, dir__=dir_, pkg_root=root_path
+        # Every target gets its own folder with the tarball linked, as the
+        # version metadata and its signature differ by the registry
+        meta_root = mkdtemp(prefix=f"{target[0]}-", dir=target_dir)
+        target_paths = rebase_paths(valid_paths, target_dir, meta_root)
+        for path in target_paths:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        link_or_copy(valid_paths[0], target_paths[0])
+        version_data = _render_version_metadata(
+            version, registry, os.path.relpath(valid_paths[0], target_dir)
         )
-        if not os.path.isdir(target_dir):
-            logger.error("Error: the extracted target_dir path %s does not exist.", target_dir)
-            sys.exit(1)
-        valid_dirs = __get_path_tree(valid_paths, target_dir)
-
-        logger.info("Start uploading files to s3 buckets: %s", bucket_name)
-        failed_files = client.upload_files(
-            file_paths=[valid_paths[0]],
-            targets=[(bucket_name, prefix)],
-            product=product,
-            root=target_dir
-        )
-        logger.info("Files uploading done\n")
+        with open(target_paths[1], mode="w", encoding="utf-8") as f:
+            dump(del_none(version_data), f)
+        package_metadata = NPMPackageMetadata(version_data, True)
+
+        with span("upload", bucket=bucket_name, files=1) as stage:
+            logger.info("Start uploading files to s3 buckets: %s", bucket_name)
+            failed_files = client.upload_files(
+                file_paths=[target_paths[0]],
+                targets=[(bucket_name, prefix)],
+                product=product,
+                root=meta_root
+            )
+            logger.info("Files uploading done\n")
+            stage.set(failed=len(failed_files))
 
         if not manifest_bucket_name:
             logger.warning(
@@ -141,7 +177,7 @@ def handle_npm_uploading(
         else:
             logger.info("Start uploading manifest to s3 bucket %s", manifest_bucket_name)
             manifest_folder = bucket_name
-            manifest_name, manifest_full_path = write_manifest(valid_paths, target_dir, product)
+            manifest_name, manifest_full_path = write_manifest(target_paths, meta_root, product)
 
             client.upload_manifest(
                 manifest_name, manifest_full_path,
@@ -149,48 +185,49 @@ def handle_npm_uploading(
             )
             logger.info("Manifest uploading is done\n")
 
-        if package_metadata:
-            logger.info(
-                "Start generating version-level package.json for package: %s in s3 bucket %s",
-                package_metadata.name, bucket_name
-            )
-        failed_metas = []
-        _version_metadata_path = valid_paths[1]
-        _failed_metas = client.upload_metadatas(
-            meta_file_paths=[_version_metadata_path],
-            target=(bucket_name, prefix),
-            product=product,
-            root=target_dir
-        )
-        failed_metas.extend(_failed_metas)
-        logger.info("version-level package.json uploading done")
-
-        if package_metadata:
-            logger.info(
-                "Start generating package.json for package: %s in s3 bucket %s",
-                package_metadata.name, bucket_name
-            )
-        meta_files = _gen_npm_package_metadata_for_upload(
-            client, bucket_name, target_dir, package_metadata, prefix
-        )
-        logger.info("package.json generation done\n")
-        if cf_enable:
-            meta_f = meta_files.get(META_FILE_GEN_KEY, [])
-            logger.debug("Add invalidating metafiles: %s", meta_f)
-            if isinstance(meta_f, str):
-                cf_invalidate_paths.append(meta_f)
-            elif isinstance(meta_f, list):
-                cf_invalidate_paths.extend(meta_f)
-
-        if META_FILE_GEN_KEY in meta_files:
+        with span("metadata", bucket=bucket_name):
+            if package_metadata:
+                logger.info(
+                    "Start generating version-level package.json for package: %s in s3 bucket %s",
+                    package_metadata.name, bucket_name
+                )
+            failed_metas = []
+            _version_metadata_path = target_paths[1]
             _failed_metas = client.upload_metadatas(
-                meta_file_paths=[meta_files[META_FILE_GEN_KEY]],
+                meta_file_paths=[_version_metadata_path],
                 target=(bucket_name, prefix),
-                product=None,
-                root=target_dir
+                product=product,
+                root=meta_root
             )
             failed_metas.extend(_failed_metas)
-            logger.info("package.json uploading done")
+            logger.info("version-level package.json uploading done")
+
+            if package_metadata:
+                logger.info(
+                    "Start generating package.json for package: %s in s3 bucket %s",
+                    package_metadata.name, bucket_name
+                )
+            meta_files = _gen_npm_package_metadata_for_upload(
+                client, bucket_name, meta_root, package_metadata, prefix
+            )
+            logger.info("package.json generation done\n")
+            if cf_enable:
+                meta_f = meta_files.get(META_FILE_GEN_KEY, [])
+                logger.debug("Add invalidating metafiles: %s", meta_f)
+                if isinstance(meta_f, str):
+                    cf_invalidate_paths.append(meta_f)
+                elif isinstance(meta_f, list):
+                    cf_invalidate_paths.extend(meta_f)
+
+            if META_FILE_GEN_KEY in meta_files:
+                _failed_metas = client.upload_metadatas(
+                    meta_file_paths=[meta_files[META_FILE_GEN_KEY]],
+                    target=(bucket_name, prefix),
+                    product=None,
+                    root=meta_root
+                )
+                failed_metas.extend(_failed_metas)
+                logger.info("package.json uploading done")
 
         if gen_sign:
             conf = get_config(config)
@@ -198,26 +235,25 @@ def handle_npm_uploading(
                 sys.exit(1)
             suffix_list = __get_suffix(PACKAGE_TYPE_NPM, conf)
             command = conf.get_detach_signature_command()
-            artifacts = [s for s in valid_paths if not s.endswith(tuple(suffix_list))]
+            artifacts = [s for s in target_paths if not s.endswith(tuple(suffix_list))]
             if META_FILE_GEN_KEY in meta_files:
                 artifacts.extend(meta_files[META_FILE_GEN_KEY])
             logger.info("Start generating signature for s3 bucket %s\n", bucket_name)
             (_failed_metas, _generated_signs) = signature.generate_sign(
                 PACKAGE_TYPE_NPM, artifacts,
-                target_dir, prefix,
+                meta_root, prefix,
                 client, bucket_name,
                 key, command
             )
             failed_metas.extend(_failed_metas)
-            generated_signs.extend(_generated_signs)
             logger.info("Singature generation done.\n")
 
             logger.info("Start upload singature files to s3 bucket %s\n", bucket_name)
             _failed_metas = client.upload_signatures(
-                meta_file_paths=generated_signs,
+                meta_file_paths=_generated_signs,
                 target=(bucket_name, prefix),
                 product=None,
-                root=target_dir
+                root=meta_root
             )
             failed_metas.extend(_failed_metas)
             logger.info("Signature uploading done.\n")
@@ -225,36 +261,47 @@ def handle_npm_uploading(
         # this step generates index.html for each dir and add them to file list
         # index is similar to metadata, it will be overwritten everytime
         if do_index:
-            logger.info("Start generating index files to s3 bucket %s", bucket_name)
-            created_indexes = indexing.generate_indexes(
-                PACKAGE_TYPE_NPM, target_dir, list(valid_dirs), client, bucket_name, prefix
-            )
-            logger.info("Index files generation done.\n")
-
-            logger.info("Start updating index files to s3 bucket %s", bucket_name)
-            _failed_metas = client.upload_metadatas(
-                meta_file_paths=created_indexes,
-                target=(bucket_name, prefix),
-                product=None,
-                root=target_dir
-            )
-            failed_metas.extend(_failed_metas)
-            logger.info("Index files updating done\n")
-            # We will not invalidate the index files per cost consideration
-            # if cf_enable:
-            #     cf_invalidate_paths.extend(created_indexes)
+            with span("index", bucket=bucket_name, dirs=len(valid_dirs)) as stage:
+                logger.info("Start generating index files to s3 bucket %s", bucket_name)
+                created_indexes = indexing.generate_indexes(
+                    PACKAGE_TYPE_NPM, meta_root, list(valid_dirs), client, bucket_name, prefix
+                )
+                logger.info("Index files generation done.\n")
+
+                logger.info("Start updating index files to s3 bucket %s", bucket_name)
+                _failed_metas = client.upload_metadatas(
+                    meta_file_paths=created_indexes,
+                    target=(bucket_name, prefix),
+                    product=None,
+                    root=meta_root
+                )
+                failed_metas.extend(_failed_metas)
+                logger.info("Index files updating done\n")
+                # We will not invalidate the index files per cost consideration
+                # if cf_enable:
+                #     cf_invalidate_paths.extend(created_indexes)
+                stage.set(files=len(created_indexes))
         else:
             logger.info("Bypass indexing\n")
 
         # Do CloudFront invalidating for generated metadata
         if cf_enable and len(cf_invalidate_paths):
             cf_client = CFClient(aws_profile=aws_profile)
-            invalidate_cf_paths(cf_client, target, cf_invalidate_paths, target_dir)
+            invalidate_cf_paths(cf_client, target, cf_invalidate_paths, meta_root)
 
-        upload_post_process(failed_files, failed_metas, product, bucket_name)
-        succeeded = succeeded and len(failed_files) == 0 and len(failed_metas) == 0
+        upload_post_process(
+            failed_files, failed_metas, product, bucket_name,
+            client.get_concurrency_summary(), client.get_content_cache_summary()
+        )
+        return len(failed_files) == 0 and len(failed_metas) == 0
 
-    return (root_dir, succeeded)
+    try:
+        succeeded = run_targets(targets, upload_target, None, concurrent=concurrent_targets)
+    finally:
+        client.close()
+    if journal:
+        journal.close(succeeded)
+    return (target_dir, succeeded)
 
 
 def handle_npm_del(
@@ -267,7 +314,8 @@ def handle_npm_del(
         do_index=True,
         cf_enable=False,
         dry_run=False,
-        manifest_bucket_name=None
+        manifest_bucket_name=None,
+        concurrent_targets=False
 ) -> Tuple[str, bool]:
     """ Handle the npm product release tarball deletion process.
         * tarball_path is the location of the tarball in filesystem
@@ -278,6 +326,8 @@ def handle_npm_del(
           prefix. See target definition in Charon configuration for details
         * dir is base dir for extracting the tarball, will use system
           tmp dir if None.
+        * concurrent_targets is used to process the targets at the same time,
+          instead of one by one.
 
         Returns the directory used for archive processing and if the rollback is successful
     """
@@ -287,9 +337,9 @@ def handle_npm_del(
 
     valid_dirs = __get_path_tree(valid_paths, target_dir)
 
-    client = S3Client(aws_profile=aws_profile, dry_run=dry_run)
-    succeeded = True
-    for target in targets:
+    client = S3Client(aws_profile=aws_profile, dry_run=dry_run, listing_cache=True)
+
+    def delete_target(target: TARGET_TYPE, meta_root: str) -> bool:
         # prepare cf invalidate files
         cf_invalidate_paths = []
 
@@ -321,7 +371,7 @@ def handle_npm_del(
             package_name_path, bucket_name
         )
         meta_files = _gen_npm_package_metadata_for_del(
-            client, bucket_name, target_dir, package_name_path, prefix
+            client, bucket_name, meta_root, package_name_path, prefix
         )
         logger.info("package.json generation done\n")
 
@@ -332,7 +382,7 @@ def handle_npm_del(
         client.delete_files(
             file_paths=all_meta_files,
             target=(bucket_name, prefix),
-            product=None, root=target_dir
+            product=None, root=meta_root
         )
         failed_metas = []
         if META_FILE_GEN_KEY in meta_files:
@@ -340,7 +390,7 @@ def handle_npm_del(
                 meta_file_paths=[meta_files[META_FILE_GEN_KEY]],
                 target=(bucket_name, prefix),
                 product=None,
-                root=target_dir
+                root=meta_root
             )
             failed_metas.extend(_failed_metas)
         logger.info("package.json uploading done")
@@ -354,7 +404,7 @@ def handle_npm_del(
                 bucket_name
             )
             created_indexes = indexing.generate_indexes(
-                PACKAGE_TYPE_NPM, target_dir, list(valid_dirs), client, bucket_name, prefix
+                PACKAGE_TYPE_NPM, meta_root, list(valid_dirs), client, bucket_name, prefix
             )
             logger.info("Index files generation done.\n")
 
@@ -363,7 +413,7 @@ def handle_npm_del(
                 meta_file_paths=created_indexes,
                 target=(bucket_name, prefix),
                 product=None,
-                root=target_dir
+                root=meta_root
             )
             failed_metas.extend(_failed_index_files)
             logger.info("Index files updating done.\n")
@@ -377,11 +427,18 @@ def handle_npm_del(
         # Do CloudFront invalidating for generated metadata
         if cf_enable and len(cf_invalidate_paths):
             cf_client = CFClient(aws_profile=aws_profile)
-            invalidate_cf_paths(cf_client, target, cf_invalidate_paths, target_dir)
+            invalidate_cf_paths(cf_client, target, cf_invalidate_paths, meta_root)
 
-        rollback_post_process(failed_files, failed_metas, product, bucket_name)
-        succeeded = succeeded and len(failed_files) <= 0 and len(failed_metas) <= 0
+        rollback_post_process(
+            failed_files, failed_metas, product, bucket_name,
+            client.get_concurrency_summary(), client.get_content_cache_summary()
+        )
+        return len(failed_files) <= 0 and len(failed_metas) <= 0
 
+    try:
+        succeeded = run_targets(targets, delete_target, target_dir, concurrent=concurrent_targets)
+    finally:
+        client.close()
     return (target_dir, succeeded)
 
 
@@ -488,24 +545,33 @@ def _gen_npm_package_metadata_for_del(
 
 
 def _scan_metadata_paths_from_archive(
-    path: str, registry: str, prod="", dir__=None, pkg_root="pakage"
-) -> Tuple[str, list, Optional[NPMPackageMetadata]]:
+    path: str, prod="", dir__=None, pkg_root="pakage"
+) -> Tuple[str, list, Optional[dict]]:
     tmp_root = mkdtemp(prefix=f"npm-charon-{prod}-", dir=dir__)
     try:
         _, valid_paths = extract_npm_tarball(
-            path=path, target_dir=tmp_root, is_for_upload=True,
-            pkg_root=pkg_root, registry=registry
+            path=path, target_dir=tmp_root, is_for_upload=True, pkg_root=pkg_root
         )
-        package = None
+        version = None
         if len(valid_paths) > 1:
             version = _scan_for_version(valid_paths[1])
-            package = NPMPackageMetadata(version, True)
-        return tmp_root, valid_paths, package
+        return tmp_root, valid_paths, version
     except tarfile.TarError as e:
         logger.error("Tarball extraction error: %s", e)
         sys.exit(1)
 
 
+def _render_version_metadata(version: dict, registry: str, tgz_relative_path: str) -> dict:
+    """Render the version metadata for the registry of a target, which only
+    differs in the tarball url of the dist.
+    """
+    version_data = dict(version)
+    dist = dict(version_data.get("dist", {}))
+    dist["tarball"] = npm_tarball_url(registry, tgz_relative_path)
+    version_data["dist"] = dist
+    return version_data
+
+
 def _scan_paths_from_archive(
     path: str, prod="", dir__=None, pkg_root="package"
 ) -> Tuple[str, str, list]:
@@ -1,16 +1,31 @@
-from typing import List, Optional, Dict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from tempfile import mkdtemp
+from typing import Any, Callable, List, Optional, Dict, Tuple
 from charon.cache import (
     CFClient,
     INVALIDATION_BATCH_DEFAULT,
     INVALIDATION_BATCH_WILDCARD,
     INVALIDATION_STATUS_COMPLETED
 )
+from charon.journal import UploadJournal
+from charon.metrics import get_request_metrics
+from charon.storage import S3Client, preflight_groups
 from charon.types import TARGET_TYPE
+from charon.utils.files import flush_digest_cache, log_digest_cache_stats
+from charon.utils.logs import set_logging
+from charon.utils.scheduler import file_size, partition_files
+from charon.utils.trace import span
 import logging
+import multiprocessing
 import os
+import shutil
 
 logger = logging.getLogger(__name__)
 
+# The workspaces of the concurrent target pipelines are created in this
+# folder under the root of the extracted archive
+TARGET_WORKSPACE_DIR = ".charon-targets"
+
 
 def is_metadata(file: str) -> bool:
     return is_mvn_metadata(file) or \
@@ -27,16 +42,203 @@ def is_npm_metadata(file: str) -> bool:
     return "package.json" in file
 
 
+def run_targets(
+    targets: List[TARGET_TYPE],
+    pipeline: Callable[[TARGET_TYPE, Optional[str]], bool],
+    root: Optional[str],
+    concurrent=False,
+    workspace_files: Optional[List[str]] = None
+) -> bool:
+    """Run the pipeline for every target, and return if all of them succeeded.
+       The pipeline is called with the target and the root folder where it
+       should generate its local files, like metadata and index files.
+        * If concurrent is False, the targets are handled one by one in the
+          root folder.
+        * If concurrent is True, the pipelines run at the same time in their
+          own threads. Each pipeline gets a workspace folder mirroring the
+          folders of root, with the files in workspace_files (relative to root)
+          copied, so that the generated files of different targets will not
+          overwrite each other. If root is None, the pipelines prepare their
+          own folders and no workspace is created. An error in the pipeline of
+          one target is reported as the failure of that target only.
+        * Each pipeline is traced as a target span, with the thread which runs
+          it.
+    """
+    def traced(target: TARGET_TYPE, folder: Optional[str]) -> bool:
+        with span("target", target=target[0], bucket=target[1]) as stage:
+            succeeded = pipeline(target, folder)
+            stage.set(succeeded=succeeded)
+            return succeeded
+
+    if not concurrent or len(targets) <= 1:
+        succeeded = True
+        for target in targets:
+            succeeded = traced(target, root) and succeeded
+        return succeeded
+
+    workspaces: List[Optional[str]] = [
+        __prepare_target_workspace(root, target[0], workspace_files or []) if root else None
+        for target in targets
+    ]
+
+    def run(target: TARGET_TYPE, workspace: Optional[str]) -> bool:
+        try:
+            return traced(target, workspace)
+        except Exception as e:
+            logger.exception(
+                "Error: Failed to process target %s due to error: %s", target[0], e
+            )
+            return False
+
+    logger.info("Start processing %d targets concurrently", len(targets))
+    with ThreadPoolExecutor(len(targets), thread_name_prefix="charon-target") as executor:
+        results = list(executor.map(run, targets, workspaces))
+    for (target, result) in zip(targets, results):
+        logger.info(
+            "Target %s is %s", target[0], "done" if result else "done with failures"
+        )
+    return all(results)
+
+
+def __prepare_target_workspace(root: str, target_name: str, files: List[str]) -> str:
+    parent = os.path.join(root, TARGET_WORKSPACE_DIR)
+    os.makedirs(parent, exist_ok=True)
+    workspace = mkdtemp(prefix=f"{target_name}-", dir=parent)
+    for (directory, dirs, _) in os.walk(root):
+        if directory == root and TARGET_WORKSPACE_DIR in dirs:
+            dirs.remove(TARGET_WORKSPACE_DIR)
+        for d in dirs:
+            path = os.path.join(directory, d)
+            os.makedirs(os.path.join(workspace, os.path.relpath(path, root)), exist_ok=True)
+    for f in files:
+        if os.path.isfile(os.path.join(root, f)):
+            shutil.copyfile(os.path.join(root, f), os.path.join(workspace, f))
+    return workspace
+
+
+def run_file_workers(
+    operation: str,
+    file_paths: List[str],
+    workers: int,
+    client_args: Dict[str, Any],
+    journal_path: Optional[str] = None,
+    **kwargs
+) -> List[str]:
+    """Run the files operation of S3Client, like "upload_files" or
+    "delete_files", in worker processes and return the merged failed files.
+        * The files are partitioned to the workers by the preflight prefixes of
+          their keys under root, then by their sizes, so the workers do not
+          list the same prefixes. Each worker calls the operation for its
+          partition with kwargs, using its own S3Client created with
+          client_args.
+        * If journal_path is set, the workers record their uploaded files in the
+          journal, which should be created by the caller before.
+        * The files of a worker which fails as a whole are all reported as
+          failed.
+        * The request metrics of the workers are merged into the metrics of
+          this process.
+        * If a source like ZipSource is in kwargs, the files are partitioned
+          by their sizes in it, and it is sent to the workers to read them.
+    """
+    source = kwargs.get("source")
+    partitions = partition_files(
+        file_paths, workers, source.size if source else file_size,
+        group_of=_preflight_group_of(file_paths, kwargs.get("root", "/"))
+    )
+    level = logging.getLogger("charon").getEffectiveLevel()
+    logger.info(
+        "Start %s for %d files in %d worker processes",
+        operation, len(file_paths), len(partitions)
+    )
+    failed_files: List[str] = []
+    # Spawn the workers, as forking a process with running threads is not safe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(len(partitions), mp_context=context) as executor:
+        futures = [
+            executor.submit(
+                _run_file_worker, operation, partition, client_args, journal_path, level,
+                kwargs
+            )
+            for partition in partitions
+        ]
+        for (future, partition) in zip(futures, partitions):
+            try:
+                (failed, metrics) = future.result()
+                failed_files.extend(failed)
+                get_request_metrics().merge(metrics)
+            except Exception as e:
+                logger.error(
+                    "Error: worker process of %s failed for %d files: %s",
+                    operation, len(partition), e
+                )
+                failed_files.extend(partition)
+    return failed_files
+
+
+def _preflight_group_of(file_paths: List[str], root: str) -> Callable[[str], str]:
+    """Get the preflight prefix of the key of a file under root. The prefix of
+    the target is left out, so that a file in the root folder does not put
+    all the files into one group.
+    """
+    slash_root = root if root.endswith("/") else root + "/"
+    keys = {
+        p: p[len(slash_root):] if p.startswith(slash_root) else p for p in file_paths
+    }
+    groups = preflight_groups(list(keys.values()))
+    return lambda p: groups[keys[p]]
+
+
+def _run_file_worker(
+    operation: str,
+    file_paths: List[str],
+    client_args: Dict[str, Any],
+    journal_path: Optional[str],
+    level: int,
+    kwargs: Dict[str, Any]
+) -> Tuple[List[str], List[Dict[str, Any]]]:
+    set_logging("", "", level=level, use_log_file=False)
+    journal = UploadJournal(journal_path, resume=True) if journal_path else None
+    try:
+        with S3Client(journal=journal, **client_args) as client:
+            failed = getattr(client, operation)(file_paths=file_paths, **kwargs)
+        return (failed, get_request_metrics().snapshot())
+    finally:
+        flush_digest_cache()
+        if journal:
+            journal.release()
+
+
+def rebase_paths(paths, root: str, new_root: str) -> List[str]:
+    """Move the paths under root to the same places under new_root"""
+    if root == new_root:
+        return list(paths)
+    slash_root = root if root.endswith("/") else root + "/"
+    return [
+        os.path.join(new_root, p[len(slash_root):]) if p.startswith(slash_root) else p
+        for p in paths
+    ]
+
+
 def upload_post_process(
-    failed_files: List[str], failed_metas: List[str], product_key, bucket=None
+    failed_files: List[str], failed_metas: List[str], product_key, bucket=None,
+    concurrency: Optional[Dict[str, Any]] = None,
+    content_cache: Optional[Dict[str, Any]] = None
 ):
-    __post_process(failed_files, failed_metas, product_key, "uploaded to", bucket)
+    __post_process(
+        failed_files, failed_metas, product_key, "uploaded to", bucket, concurrency,
+        content_cache
+    )
 
 
 def rollback_post_process(
-    failed_files: List[str], failed_metas: List[str], product_key, bucket=None
+    failed_files: List[str], failed_metas: List[str], product_key, bucket=None,
+    concurrency: Optional[Dict[str, Any]] = None,
+    content_cache: Optional[Dict[str, Any]] = None
 ):
-    __post_process(failed_files, failed_metas, product_key, "rolled back from", bucket)
+    __post_process(
+        failed_files, failed_metas, product_key, "rolled back from", bucket, concurrency,
+        content_cache
+    )
 
 
 def __post_process(
@@ -44,8 +246,27 @@ def __post_process(
     failed_metas: List[str],
     product_key: str,
     operation: str,
-    bucket: str = None
+    bucket: str = None,
+    concurrency: Optional[Dict[str, Any]] = None,
+    content_cache: Optional[Dict[str, Any]] = None
 ):
+    if concurrency:
+        logger.info(
+            "S3 concurrency: initial %s, final %s, lowest %s, highest %s, "
+            "throttled requests %s",
+            concurrency.get("initial"), concurrency.get("final"),
+            concurrency.get("lowest"), concurrency.get("highest"),
+            concurrency.get("throttled")
+        )
+    if content_cache:
+        logger.info(
+            "S3 content cache: %s revalidated, %s not modified, %s downloaded, "
+            "%s entries of %s bytes",
+            content_cache.get("revalidations"), content_cache.get("hits"),
+            content_cache.get("misses"), content_cache.get("entries"),
+            content_cache.get("bytes")
+        )
+    log_digest_cache_stats()
     if len(failed_files) == 0 and len(failed_metas) == 0:
         logger.info("Product release %s is successfully %s "
                     "Ronda service in bucket %s\n",
@@ -18,18 +18,20 @@ import logging
 import json
 import os
 import sys
-import asyncio
 import uuid
 import time
 from typing import List, Any, Tuple, Callable, Dict, Optional
 from charon.config import RadasConfig
 from charon.pkgs.oras_client import OrasClient
+from charon.utils.scheduler import run_scheduled
 from proton import SSLDomain, Message, Event, Sender, Connection
 from proton.handlers import MessagingHandler
 from proton.reactor import Container
 
 logger = logging.getLogger(__name__)
 
+SIGN_CONCURRENCY = 10
+
 
 class RadasReceiver(MessagingHandler):
     """
@@ -310,32 +312,30 @@ def generate_radas_sign(top_level: str, sign_result_loc: str) -> Tuple[List[str]
         file_path: str,
         signature: str,
         failed_paths: List[str],
-        generated_signs: List[str],
-        sem: asyncio.BoundedSemaphore,
+        generated_signs: List[str]
     ):
-        async with sem:
-            if not file_path or not signature:
-                logger.error("Invalid JSON entry")
-                return
-            # remove the root path maven-repository
-            filename = file_path.split("/", 1)[1]
+        if not file_path or not signature:
+            logger.error("Invalid JSON entry")
+            return
+        # remove the root path maven-repository
+        filename = file_path.split("/", 1)[1]
 
-            artifact_path = os.path.join(top_level, filename)
-            asc_filename = f"{filename}.asc"
-            signature_path = os.path.join(top_level, asc_filename)
+        artifact_path = os.path.join(top_level, filename)
+        asc_filename = f"{filename}.asc"
+        signature_path = os.path.join(top_level, asc_filename)
 
-            if not os.path.isfile(artifact_path):
-                logger.warning("Artifact missing, skip signature file generation")
-                return
+        if not os.path.isfile(artifact_path):
+            logger.warning("Artifact missing, skip signature file generation")
+            return
 
-            try:
-                with open(signature_path, "w") as asc_file:
-                    asc_file.write(signature)
-                generated_signs.append(signature_path)
-                logger.info("Generated .asc file: %s", signature_path)
-            except Exception as e:
-                failed_paths.append(signature_path)
-                logger.error("Failed to write .asc file for %s: %s", artifact_path, e)
+        try:
+            with open(signature_path, "w") as asc_file:
+                asc_file.write(signature)
+            generated_signs.append(signature_path)
+            logger.info("Generated .asc file: %s", signature_path)
+        except Exception as e:
+            failed_paths.append(signature_path)
+            logger.error("Failed to write .asc file for %s: %s", artifact_path, e)
 
     result = data.get("results", [])
     return __do_path_cut_and(path_handler=generate_single_sign_file, data=result)
@@ -347,19 +347,13 @@ def __do_path_cut_and(
 
     failed_paths: List[str] = []
     generated_signs: List[str] = []
-    tasks = []
-    sem = asyncio.BoundedSemaphore(10)
-    for item in data:
+
+    async def handle(item: Dict[str, str]):
         file_path = item.get("file")
         signature = item.get("signature")
-        tasks.append(
-            asyncio.ensure_future(
-                path_handler(file_path, signature, failed_paths, generated_signs, sem)
-            )
-        )
+        await path_handler(file_path, signature, failed_paths, generated_signs)
 
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(asyncio.gather(*tasks))
+    run_scheduled(data, handle, SIGN_CONCURRENCY)
     return (failed_paths, generated_signs)
 
 
@@ -22,9 +22,12 @@ import shlex
 from jinja2 import Template
 from typing import Callable, List, Tuple
 from charon.storage import S3Client
+from charon.utils.scheduler import run_scheduled
 
 logger = logging.getLogger(__name__)
 
+SIGN_CONCURRENCY = 10
+
 
 def generate_sign(
     package_type: str,
@@ -50,46 +53,44 @@ def generate_sign(
     """
 
     async def sign_file(
-        filename: str, failed_paths: List[str], generated_signs: List[str],
-        sem: asyncio.BoundedSemaphore
+        filename: str, failed_paths: List[str], generated_signs: List[str]
     ):
-        async with sem:
-            signature_file = filename + ".asc"
-            if prefix:
-                remote = os.path.join(prefix, signature_file)
-            else:
-                remote = signature_file
-            local = os.path.join(top_level, signature_file)
-            artifact = os.path.join(top_level, filename)
-
-            if not os.path.isfile(os.path.join(prefix, artifact)):
-                logger.warning("Artifact needs signature is missing, please check again")
-                return
-
-            # skip sign if file already exist locally
-            if os.path.isfile(local):
-                logger.debug(".asc file %s existed, skipping", local)
-                return
-            # skip sign if file already exist in bucket
-            try:
-                existed = s3_client.file_exists_in_bucket(bucket, remote)
-            except ValueError as e:
-                logger.error(
-                    "Error: Can not check signature file status due to: %s", e
-                )
-                return
-            if existed:
-                logger.debug(".asc file %s existed, skipping", remote)
-                return
-
-            run_command = Template(command).render(key=key, file=artifact)
-            result = await __run_cmd_async(shlex.split(run_command))
-
-            if result.returncode == 0:
-                generated_signs.append(local)
-                logger.debug("Generated signature file: %s", local)
-            else:
-                failed_paths.append(local)
+        signature_file = filename + ".asc"
+        if prefix:
+            remote = os.path.join(prefix, signature_file)
+        else:
+            remote = signature_file
+        local = os.path.join(top_level, signature_file)
+        artifact = os.path.join(top_level, filename)
+
+        if not os.path.isfile(os.path.join(prefix, artifact)):
+            logger.warning("Artifact needs signature is missing, please check again")
+            return
+
+        # skip sign if file already exist locally
+        if os.path.isfile(local):
+            logger.debug(".asc file %s existed, skipping", local)
+            return
+        # skip sign if file already exist in bucket
+        try:
+            existed = s3_client.file_exists_in_bucket(bucket, remote)
+        except ValueError as e:
+            logger.error(
+                "Error: Can not check signature file status due to: %s", e
+            )
+            return
+        if existed:
+            logger.debug(".asc file %s existed, skipping", remote)
+            return
+
+        run_command = Template(command).render(key=key, file=artifact)
+        result = await __run_cmd_async(shlex.split(run_command))
+
+        if result.returncode == 0:
+            generated_signs.append(local)
+            logger.debug("Generated signature file: %s", local)
+        else:
+            failed_paths.append(local)
 
     return __do_path_cut_and(
             file_paths=artifact_path,
@@ -108,20 +109,14 @@ def __do_path_cut_and(
         slash_root = slash_root + "/"
     failed_paths: List[str] = []
     generated_signs: List[str] = []
-    tasks = []
-    sem = asyncio.BoundedSemaphore(10)
-    for full_path in file_paths:
+
+    async def handle(full_path: str):
         path = full_path
         if path.startswith(slash_root):
             path = path[len(slash_root):]
-        tasks.append(
-            asyncio.ensure_future(
-                path_handler(path, failed_paths, generated_signs, sem)
-            )
-        )
+        await path_handler(path, failed_paths, generated_signs)
 
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(asyncio.gather(*tasks))
+    run_scheduled(file_paths, handle, SIGN_CONCURRENCY)
     return (failed_paths, generated_signs)
 
 
@@ -14,23 +14,30 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 import asyncio
-import threading
-from charon.utils.files import read_sha1
+import bisect
+from charon.utils.files import LOCAL_FILES, LocalFiles, read_sha1
 from charon.constants import PROD_INFO_SUFFIX, MANIFEST_SUFFIX
+from charon.journal import UploadJournal
+from charon.metrics import get_request_metrics
+from charon.transport import S3Transport, TRANSPORT_ENV, new_transport
+from charon.utils.concurrency import AdaptiveLimiter, backoff_delay
+from charon.utils.content_cache import ContentCache
+from charon.utils.listing_cache import ListingCache
+from charon.utils.scheduler import (
+    BoundedQueue, file_size, get_or_create_event_loop, run_scheduled
+)
 
-from boto3 import session
 from botocore.errorfactory import ClientError
 from botocore.exceptions import HTTPClientError
-from boto3.exceptions import S3UploadFailedError
 from botocore.config import Config
-from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+import functools
 import os
 import logging
 import mimetypes
-import functools
-from concurrent.futures import ThreadPoolExecutor
-
-_executor = ThreadPoolExecutor(10)
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -39,11 +46,48 @@ CHECKSUM_META_KEY = "checksum"
 
 ENDPOINT_ENV = "aws_endpoint_url"
 ACCELERATION_ENABLE_ENV = "aws_enable_acceleration"
+CONTENT_CACHE_DIR_ENV = "charon_content_cache_dir"
 
 DEFAULT_MIME_TYPE = "application/octet-stream"
 
 FILE_REPORT_LIMIT = 1000
 
+# DeleteObjects accepts at most 1000 keys in one request
+DELETE_BATCH_SIZE = 1000
+
+# ListObjectsV2 returns at most 1000 keys in one page. Listings bigger than
+# one page are split into shards by the subfolders, and a prefix with only
+# one subfolder is descended at most LISTING_MAX_DEPTH levels to find shards
+LISTING_PAGE_SIZE = 1000
+LISTING_MAX_DEPTH = 3
+
+# S3 does not accept multipart parts smaller than 5MB, except the last one
+MIN_MULTIPART_CHUNKSIZE = 5 * 1024 * 1024
+DEFAULT_MULTIPART_THRESHOLD = 16 * 1024 * 1024
+DEFAULT_MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+DEFAULT_MULTIPART_CONCURRENCY = 4
+DEFAULT_MAX_OPEN_FILES = 10
+# S3 does not accept more than 10000 parts for one multipart uploading, and
+# CopyObject can only copy objects smaller than 5GB
+MAX_MULTIPART_PARTS = 10000
+MAX_COPY_SIZE = 5 * 1024 * 1024 * 1024
+
+# Throttled requests are retried with jittered exponential backoff
+THROTTLE_ERROR_CODES = {
+    "SlowDown", "Throttling", "ThrottlingException", "RequestLimitExceeded",
+    "TooManyRequests", "ServiceUnavailable", "503"
+}
+THROTTLE_RETRY_LIMIT = 5
+THROTTLE_BACKOFF_BASE = 0.1
+THROTTLE_BACKOFF_CAP = 10.0
+
+# The S3 operations which write the object keys, the cached contents and
+# listings of these keys are patched after the operations succeed
+WRITE_OPERATIONS = {
+    "put_object", "copy_object", "delete_object",
+    "delete_objects", "complete_multipart_upload"
+}
+
 PATH_HANDLER_TYPE = Callable[[str, str, int, int, List[str]], Awaitable[bool]]
 
 
@@ -55,32 +99,73 @@ class S3Client(object):
     def __init__(
         self,
         aws_profile=None, extra_conf=None,
-        con_limit=25, dry_run=False
+        con_limit=25, dry_run=False,
+        max_con_limit=None,
+        multipart_threshold=DEFAULT_MULTIPART_THRESHOLD,
+        multipart_chunksize=DEFAULT_MULTIPART_CHUNKSIZE,
+        multipart_concurrency=DEFAULT_MULTIPART_CONCURRENCY,
+        max_open_files=DEFAULT_MAX_OPEN_FILES,
+        journal: Optional[UploadJournal] = None,
+        content_cache: Optional[ContentCache] = None,
+        listing_cache=False
     ) -> None:
-        self.__client = self.__init_aws_client(aws_profile, extra_conf)
-        self.__buckets: Dict[str, Any] = {}
+        """ * con_limit is the initial number of files handled at the same time. It
+              is adapted at runtime: increased while S3 is healthy, until
+              max_con_limit (2 * con_limit by default), and halved when S3
+              throttles the requests. max_con_limit is also the max number of
+              S3 requests in flight.
+            * Files bigger than multipart_threshold will be uploaded with multipart
+              uploading, each part is multipart_chunksize large and at most
+              multipart_concurrency parts of one file are uploaded at the same time
+            * max_open_files is the max number of local files held open for
+              uploading at the same time across all concurrent handlers
+            * If journal is set, the uploaded files will be recorded in it, and
+              the files already recorded will be skipped
+            * The contents read from S3 are cached in content_cache, and
+              revalidated with their ETags when read again. If not set, a memory
+              cache is used, which is also stored in the charon_content_cache_dir
+              directory if configured.
+            * If listing_cache is True, the listings and existence checks are
+              cached for the life of the client, and patched by the writes and
+              deletes of the client. It should only be used when no one else
+              changes the same paths during the run.
+        """
+        if not max_con_limit:
+            max_con_limit = con_limit * 2
+        self.__transport = self.__init_transport(aws_profile, extra_conf, max_con_limit)
         self.__dry_run = dry_run
-        self.__con_sem = asyncio.BoundedSemaphore(con_limit)
-        self.__lock = threading.Lock()
-
-    def __init_aws_client(
-        self, aws_profile=None, extra_conf=None
-    ):
+        self.__metrics = get_request_metrics()
+        self.__limiter = AdaptiveLimiter(con_limit, maximum=max_con_limit)
+        self.__max_con_limit = max_con_limit
+        # A fixed limiter instead of an asyncio semaphore, as the client can be
+        # shared by the event loops of concurrent target pipelines
+        self.__file_sem = AdaptiveLimiter(max_open_files)
+        self.__multipart_threshold = multipart_threshold
+        self.__multipart_chunksize = max(multipart_chunksize, MIN_MULTIPART_CHUNKSIZE)
+        self.__multipart_concurrency = max(multipart_concurrency, 1)
+        self.__journal = journal
+        if not content_cache:
+            content_cache = ContentCache(disk_dir=self.__get_content_cache_dir(extra_conf))
+        self.__content_cache = content_cache
+        self.__listing_cache = ListingCache() if listing_cache else None
+
+    def __init_transport(
+        self, aws_profile=None, extra_conf=None, con_limit=25
+    ) -> S3Transport:
         if aws_profile:
             logger.debug("[S3] Using aws profile: %s", aws_profile)
-            s3_session = session.Session(profile_name=aws_profile)
-        else:
-            s3_session = session.Session()
         endpoint_url = self.__get_endpoint(extra_conf)
         config = None
         if self.__enable_acceleration(extra_conf):
             logger.info("[S3] S3 acceleration config enabled, "
                         "will enable s3 use_accelerate_endpoint config")
             config = Config(s3={"use_accelerate_endpoint": True})
-        return s3_session.resource(
-            's3',
+        return new_transport(
+            aws_profile=aws_profile,
             endpoint_url=endpoint_url,
-            config=config
+            config=config,
+            con_limit=con_limit,
+            kind=self.__get_transport_kind(extra_conf)
         )
 
     def __get_endpoint(self, extra_conf) -> Optional[str]:
@@ -106,10 +191,25 @@ class S3Client(object):
             return True
         return False
 
+    def __get_transport_kind(self, extra_conf) -> Optional[str]:
+        kind = os.getenv(TRANSPORT_ENV)
+        if not kind or kind.strip() == "":
+            if isinstance(extra_conf, Dict):
+                kind = extra_conf.get(TRANSPORT_ENV, None)
+        return kind
+
+    def __get_content_cache_dir(self, extra_conf) -> Optional[str]:
+        cache_dir = os.getenv(CONTENT_CACHE_DIR_ENV)
+        if not cache_dir or cache_dir.strip() == "":
+            if isinstance(extra_conf, Dict):
+                cache_dir = extra_conf.get(CONTENT_CACHE_DIR_ENV, None)
+        return cache_dir
+
     def upload_files(
         self, file_paths: List[str],
         targets: List[Tuple[str, str]],
-        product: str, root="/"
+        product: str, root="/",
+        source: Optional[LocalFiles] = None
     ) -> List[str]:
         """ Upload a list of files to s3 bucket. * Use the cut down file path as s3 key. The cut
         down way is move root from the file path if it starts with root. Example: if file_path is
@@ -126,24 +226,37 @@ class S3Client(object):
             * Every file has sha1 checksum in "checksum" metadata. When uploading existed files,
             if the checksum does not match the existed one, will not upload it and report error.
             Note that if file name match
+            * The files are read from source, which is the local file system by
+            default. A ZipSource uploads the members of a zip archive by their
+            paths under its root without extracting them.
             * Return all failed to upload files due to any exceptions.
         """
+        if not source:
+            source = LOCAL_FILES
         main_target = targets[0]
         main_bucket_name = main_target[0]
-        main_bucket = self.__get_bucket(main_bucket_name)
         key_prefix = main_target[1]
         extra_targets = targets[1:] if len(targets) > 1 else []
-        extra_prefixed_buckets: List[Tuple[Any, str]] = []
-        if len(extra_targets) > 0:
-            for target in extra_targets:
-                extra_prefixed_buckets.append((self.__get_bucket(target[0]), target[1]))
+
+        # Preflight: list the affected prefixes once for every target bucket,
+        # so that we don't need to send a HEAD request for each file to check
+        # its existence.
+        existed_keys: Dict[str, Optional[Dict[str, Tuple[str, int]]]] = {}
+        for target in targets:
+            existed_keys[target[0]] = self.__preflight_keys(
+                target[0], self.__cut_keys(file_paths, target[1], root)
+            )
+        replica_done: List[str] = []
+        replica_total = 0
+        replica_failed: Dict[str, List[str]] = {t[0]: [] for t in extra_targets}
 
         async def path_upload_handler(
             full_file_path: str, path: str, index: int,
             total: int, failed: List[str]
         ):
-            async with self.__con_sem:
-                if not os.path.isfile(full_file_path):
+            nonlocal replica_total
+            async with self.__limiter:
+                if not source.is_file(full_file_path):
                     logger.warning(
                         '[S3] Warning: file %s does not exist during uploading. Product: %s',
                         full_file_path, product
@@ -156,104 +269,166 @@ class S3Client(object):
                     index, total, full_file_path, main_bucket_name
                 )
                 main_path_key = os.path.join(key_prefix, path) if key_prefix else path
-                main_file_object = main_bucket.Object(main_path_key)
-                existed = False
-                try:
-                    existed = await self.__run_async(self.__file_exists, main_file_object)
-                except (ClientError, HTTPClientError) as e:
-                    logger.error(
-                        "[S3] Error: file existence check failed due to error: %s", e
+                sha1 = source.sha1(full_file_path)
+                if self.__is_journaled(main_bucket_name, main_path_key, sha1):
+                    logger.debug(
+                        '[S3] %s was already uploaded to bucket %s, skip', path, main_bucket_name
                     )
-                    failed.append(full_file_path)
-                    return
-                sha1 = read_sha1(full_file_path)
-                (content_type, _) = mimetypes.guess_type(full_file_path)
-                if not content_type:
-                    content_type = DEFAULT_MIME_TYPE
-                if not existed:
-                    f_meta = {}
-                    if sha1.strip() != "":
-                        f_meta[CHECKSUM_META_KEY] = sha1
-                    try:
-                        if not self.__dry_run:
-                            if len(f_meta) > 0:
-                                await self.__run_async(
-                                    functools.partial(
-                                        main_file_object.put,
-                                        Body=open(full_file_path, "rb"),
-                                        Metadata=f_meta,
-                                        ContentType=content_type
-                                    )
-                                )
-                            else:
-                                await self.__run_async(
-                                    functools.partial(
-                                        main_file_object.upload_file,
-                                        Filename=full_file_path,
-                                        ExtraArgs={'ContentType': content_type}
-                                    )
-                                )
-                            if product:
-                                await self.__update_prod_info(
-                                    main_path_key, main_bucket_name, [product]
-                                )
-
-                        logger.debug('[S3] Uploaded %s to bucket %s', path, main_bucket_name)
-                    except (ClientError, HTTPClientError) as e:
-                        logger.error("[S3] ERROR: file %s not uploaded to bucket"
-                                     " %s due to error: %s ", full_file_path,
-                                     main_bucket_name, e)
+                else:
+                    uploaded = await upload_to_main(full_file_path, path, main_path_key, sha1)
+                    if uploaded is None:
                         failed.append(full_file_path)
                         return
-                else:
-                    await handle_existed(
-                        full_file_path, sha1, main_path_key,
-                        main_bucket_name, main_file_object
-                    )
+                    if uploaded:
+                        self.__record(main_bucket_name, main_path_key, sha1)
+
+            # Replication to the extra targets is a separate stage, which runs
+            # concurrently across targets once the main upload is done. It is
+            # queued out of the limiter, as the queue waits for the replications
+            # which need the limiter too.
+            for target_ in extra_targets:
+                replica_total += 1
+                await replications.put((full_file_path, path, main_path_key, sha1, target_))
+
+        async def replicate(
+            replication: Tuple[str, str, str, str, Tuple[str, str]]
+        ):
+            (full_file_path, path, main_path_key, sha1, target_) = replication
+            extra_bucket_name = target_[0]
+            async with self.__limiter:
+                try:
+                    if not await replicate_to(
+                        full_file_path, path, main_path_key, sha1, target_
+                    ):
+                        replica_failed[extra_bucket_name].append(full_file_path)
+                finally:
+                    replica_done.append(full_file_path)
+                    if len(replica_done) % FILE_REPORT_LIMIT == 0:
+                        logger.info(
+                            "[S3] ######### %d/%d replications finished",
+                            len(replica_done), replica_total
+                        )
 
-                # do copy:
-                for target_ in extra_prefixed_buckets:
-                    extra_bucket = target_[0]
-                    extra_bucket_name = extra_bucket.name
-                    extra_prefix = target_[1]
-                    extra_path_key = os.path.join(extra_prefix, path) if extra_prefix else path
-                    logger.debug(
-                        'Copyinging %s from bucket %s to bucket %s',
-                        full_file_path, main_bucket_name, extra_bucket
-                    )
-                    file_object = extra_bucket.Object(extra_path_key)
-                    existed = await self.__run_async(self.__file_exists, file_object)
-                    if not existed:
-                        if not self.__dry_run:
-                            try:
-                                await self.__copy_between_bucket(
-                                    main_bucket_name, main_path_key,
-                                    extra_bucket, extra_path_key
-                                )
-                                if product:
-                                    await self.__update_prod_info(
-                                        extra_path_key, extra_bucket_name, [product]
-                                    )
-                            except (ClientError, HTTPClientError) as e:
-                                logger.error("[S3] ERROR: copying failure happend for file %s"
-                                             " to bucket %s due to error: %s ",
-                                             full_file_path, extra_bucket_name, e)
-                                failed.append(full_file_path)
-                    else:
-                        await handle_existed(
-                            full_file_path, sha1, extra_path_key,
-                            extra_bucket_name, file_object
+        async def replicate_to(
+            full_file_path: str, path: str, main_path_key: str,
+            sha1: str, target_: Tuple[str, str]
+        ) -> bool:
+            """Copy the file from the main bucket to the extra target. Returns
+            False if failed.
+            """
+            extra_bucket_name = target_[0]
+            extra_prefix = target_[1]
+            extra_path_key = os.path.join(extra_prefix, path) if extra_prefix else path
+            if self.__is_journaled(extra_bucket_name, extra_path_key, sha1):
+                logger.debug(
+                    '[S3] %s was already uploaded to bucket %s, skip',
+                    path, extra_bucket_name
+                )
+                return True
+            logger.debug(
+                'Copyinging %s from bucket %s to bucket %s',
+                full_file_path, main_bucket_name, extra_bucket_name
+            )
+            try:
+                existed = await self.__exists_with_preflight(
+                    extra_bucket_name, extra_path_key, existed_keys.get(extra_bucket_name)
+                )
+                if existed:
+                    if await handle_existed(
+                        full_file_path, sha1, extra_path_key, extra_bucket_name
+                    ):
+                        self.__record(extra_bucket_name, extra_path_key, sha1)
+                    return True
+                if self.__dry_run:
+                    self.__skip("copy_object", extra_bucket_name)
+                    if product:
+                        self.__skip("put_object", extra_bucket_name)
+                    return True
+                copied = await self.__copy_between_bucket(
+                    main_bucket_name, main_path_key,
+                    extra_bucket_name, extra_path_key,
+                    source.size(full_file_path)
+                )
+                if not copied:
+                    return False
+                if product and not await self.__update_prod_info(
+                    extra_path_key, extra_bucket_name, [product]
+                ):
+                    return False
+                self.__record(extra_bucket_name, extra_path_key, sha1)
+                return True
+            except (ClientError, HTTPClientError) as e:
+                logger.error("[S3] ERROR: copying failure happend for file %s"
+                             " to bucket %s due to error: %s ",
+                             full_file_path, extra_bucket_name, e)
+                return False
+
+        async def upload_to_main(
+            full_file_path: str, path: str, main_path_key: str, sha1: str
+        ) -> Optional[bool]:
+            """Upload the file to the main target. Returns None if failed, or
+            whether the uploading is completely done for the journal.
+            """
+            existed = False
+            try:
+                existed = await self.__exists_with_preflight(
+                    main_bucket_name, main_path_key, existed_keys.get(main_bucket_name)
+                )
+            except (ClientError, HTTPClientError) as e:
+                logger.error(
+                    "[S3] Error: file existence check failed due to error: %s", e
+                )
+                return None
+            (content_type, _) = mimetypes.guess_type(full_file_path)
+            if not content_type:
+                content_type = DEFAULT_MIME_TYPE
+            if not existed:
+                f_meta = {}
+                if sha1.strip() != "":
+                    f_meta[CHECKSUM_META_KEY] = sha1
+                try:
+                    done = True
+                    if not self.__dry_run:
+                        await self.__put_file(
+                            main_bucket_name, main_path_key,
+                            full_file_path, f_meta, content_type, source
                         )
+                        if product:
+                            done = await self.__update_prod_info(
+                                main_path_key, main_bucket_name, [product]
+                            )
+                    else:
+                        self.__skip_put_file(main_bucket_name, full_file_path, source)
+                        if product:
+                            self.__skip("put_object", main_bucket_name)
+
+                    logger.debug('[S3] Uploaded %s to bucket %s', path, main_bucket_name)
+                    return done
+                except (ClientError, HTTPClientError) as e:
+                    logger.error("[S3] ERROR: file %s not uploaded to bucket"
+                                 " %s due to error: %s ", full_file_path,
+                                 main_bucket_name, e)
+                    return None
+            else:
+                return await handle_existed(
+                    full_file_path, sha1, main_path_key, main_bucket_name
+                )
 
         async def handle_existed(
-            file_path, file_sha1, path_key,
-            bucket_name, file_object
+            file_path, file_sha1, path_key, bucket_name
         ) -> bool:
             logger.debug(
                 "File %s already exists in bucket %s, check if need to update product.",
                 path_key, bucket_name
             )
-            f_meta = file_object.metadata
+            try:
+                f_meta = await self.__get_metadata(bucket_name, path_key)
+            except (ClientError, HTTPClientError) as e:
+                logger.error(
+                    "[S3] Error: Can not get metadata of file %s in bucket %s due to error: %s",
+                    path_key, bucket_name, e
+                )
+                return False
             checksum = (
                 f_meta[CHECKSUM_META_KEY] if CHECKSUM_META_KEY in f_meta else ""
             )
@@ -262,11 +437,10 @@ class S3Client(object):
                                'different from the one in S3 bucket %s. Product: %s',
                                path_key, bucket_name, product)
                 return False
-            (prods, no_error) = await self.__run_async(
-                self.__get_prod_info,
-                path_key, bucket_name
-            )
-            if not self.__dry_run and no_error and product not in prods:
+            (prods, no_error) = await self.__get_prod_info(path_key, bucket_name)
+            if self.__dry_run and no_error and product not in prods:
+                self.__skip("put_object", bucket_name)
+            elif no_error and product not in prods:
                 logger.debug(
                     "File %s has new product, updating the product %s",
                     file_path,
@@ -280,37 +454,216 @@ class S3Client(object):
                     return False
             return True
 
-        return self.__do_path_cut_and(
+        # The replications are bounded like the main uploads, so the pending
+        # ones do not grow with the number of files
+        replications = BoundedQueue(replicate, self.__max_con_limit)
+        failed_files = self.__do_path_cut_and(
             file_paths=file_paths,
             path_handler=self.__path_handler_count_wrapper(path_upload_handler),
-            root=root
+            root=root,
+            largest_first=True,
+            size=source.size
         )
+        if replica_total > 0:
+            loop = get_or_create_event_loop()
+            loop.run_until_complete(replications.join())
+            for (extra_bucket_name, failed) in replica_failed.items():
+                logger.info(
+                    "[S3] Replication to bucket %s done, %d files failed",
+                    extra_bucket_name, len(failed)
+                )
+                for failed_file in failed:
+                    if failed_file not in failed_files:
+                        failed_files.append(failed_file)
+        return failed_files
+
+    async def __put_file(
+        self, bucket_name: str, key: str, full_file_path: str,
+        metadata: Dict[str, str], content_type: str,
+        source: LocalFiles = LOCAL_FILES
+    ):
+        """Put the file of source to the s3 object with the metadata. The file will
+        be uploaded in multiple parts if it is bigger than the multipart threshold.
+        The number of files held open is limited by the open files semaphore.
+        """
+        async with self.__file_sem:
+            size = source.size(full_file_path)
+            with source.open(full_file_path) as f:
+                if size < self.__multipart_threshold:
+                    # The length is given, so the body of a stream which can not
+                    # tell its size, like a zip member, is not read to measure it
+                    await self.__call(
+                        "put_object",
+                        Bucket=bucket_name,
+                        Key=key,
+                        Body=f,
+                        ContentLength=size,
+                        Metadata=metadata,
+                        ContentType=content_type
+                    )
+                else:
+                    await self.__multipart_put(
+                        bucket_name, key, f, size, metadata, content_type
+                    )
+
+    async def __multipart_put(
+        self, bucket_name: str, key: str, f, size: int,
+        metadata: Dict[str, str], content_type: str
+    ):
+        chunksize = self.__multipart_chunksize
+        logger.debug(
+            "[S3] Uploading %s to bucket %s in %d parts",
+            key, bucket_name, (size + chunksize - 1) // chunksize
+        )
+        mpu = await self.__call(
+            "create_multipart_upload",
+            Bucket=bucket_name,
+            Key=key,
+            Metadata=metadata,
+            ContentType=content_type
+        )
+        upload_id = mpu["UploadId"]
+        # Parts are read sequentially, and at most multipart_concurrency parts
+        # are read in memory and uploading at the same time
+        part_sem = asyncio.Semaphore(self.__multipart_concurrency)
+
+        async def upload_part(part_number: int, data: bytes) -> Dict[str, Any]:
+            try:
+                result = await self.__call(
+                    "upload_part",
+                    Bucket=bucket_name,
+                    Key=key,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    Body=data
+                )
+                return {"ETag": result["ETag"], "PartNumber": part_number}
+            finally:
+                part_sem.release()
+
+        tasks = []
+        try:
+            part_number = 1
+            while True:
+                await part_sem.acquire()
+                data = await self.__run_async(f.read, chunksize)
+                if not data and part_number > 1:
+                    part_sem.release()
+                    break
+                tasks.append(asyncio.ensure_future(upload_part(part_number, data)))
+                part_number += 1
+                if len(data) < chunksize:
+                    break
+            parts = await asyncio.gather(*tasks)
+            await self.__call(
+                "complete_multipart_upload",
+                Bucket=bucket_name,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts}
+            )
+        except BaseException:
+            await self.__abort_multipart(bucket_name, key, upload_id, tasks)
+            raise
+
+    async def __multipart_copy(
+        self, source: str, source_key: str,
+        target: str, target_key: str, size: int
+    ):
+        # Metadata is not copied by the part copying, so it needs to be
+        # set explicitly when creating the multipart uploading
+        head = await self.__call("head_object", Bucket=source, Key=source_key)
+        chunksize = max(
+            self.__multipart_chunksize,
+            (size + MAX_MULTIPART_PARTS - 1) // MAX_MULTIPART_PARTS
+        )
+        mpu = await self.__call(
+            "create_multipart_upload",
+            Bucket=target,
+            Key=target_key,
+            Metadata=head.get("Metadata", {}),
+            ContentType=head.get("ContentType", DEFAULT_MIME_TYPE)
+        )
+        upload_id = mpu["UploadId"]
+        part_sem = asyncio.Semaphore(self.__multipart_concurrency)
+
+        async def copy_part(part_number: int, start: int) -> Dict[str, Any]:
+            end = min(start + chunksize, size) - 1
+            async with part_sem:
+                result = await self.__call(
+                    "upload_part_copy",
+                    Bucket=target,
+                    Key=target_key,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    CopySource={'Bucket': source, 'Key': source_key},
+                    CopySourceRange=f"bytes={start}-{end}"
+                )
+                return {"ETag": result["CopyPartResult"]["ETag"], "PartNumber": part_number}
+
+        tasks = [
+            asyncio.ensure_future(copy_part(i + 1, start))
+            for i, start in enumerate(range(0, size, chunksize))
+        ]
+        try:
+            parts = await asyncio.gather(*tasks)
+            await self.__call(
+                "complete_multipart_upload",
+                Bucket=target,
+                Key=target_key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts}
+            )
+        except BaseException:
+            await self.__abort_multipart(target, target_key, upload_id, tasks)
+            raise
+
+    async def __abort_multipart(
+        self, bucket_name: str, key: str, upload_id: str,
+        tasks: List[asyncio.Future]
+    ):
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            await self.__call(
+                "abort_multipart_upload",
+                Bucket=bucket_name,
+                Key=key,
+                UploadId=upload_id
+            )
+        except (ClientError, HTTPClientError) as e:
+            logger.warning(
+                "[S3] Warning: Can not abort multipart uploading of %s in bucket %s"
+                " due to error: %s", key, bucket_name, e
+            )
 
     async def __copy_between_bucket(
         self, source: str, source_key: str,
-        target, target_key: str
+        target: str, target_key: str, size: int
     ) -> bool:
+        """Copy the object between buckets in the server side. The size is
+        used to decide if the object needs to be copied in parts.
+        """
         logger.debug(
             "Copying file %s from bucket %s to target %s as %s",
-            source_key, source, target.name, target_key)
-        copy_source = {
-            'Bucket': source,
-            'Key': source_key
-        }
+            source_key, source, target, target_key)
         try:
-            await self.__run_async(
-                functools.partial(
-                    target.copy,
-                    CopySource=copy_source,
-                    Key=target_key
+            if size < MAX_COPY_SIZE:
+                await self.__call(
+                    "copy_object",
+                    Bucket=target,
+                    Key=target_key,
+                    CopySource={'Bucket': source, 'Key': source_key}
                 )
-            )
+            else:
+                await self.__multipart_copy(source, source_key, target, target_key, size)
             logger.debug('Copy done')
             return True
         except (ClientError, HTTPClientError) as e:
             logger.error(
                 "ERROR: Can not copy file %s to bucket %s due to error: %s",
-                source_key, target.name, e
+                source_key, target, e
             )
             return False
 
@@ -326,13 +679,12 @@ class S3Client(object):
             * Return all failed to upload metadata files due to exceptions
         """
         bucket_name = target[0]
-        bucket = self.__get_bucket(bucket_name)
 
         async def path_upload_handler(
             full_file_path: str, path: str, index: int,
             total: int, failed: List[str]
         ):
-            async with self.__con_sem:
+            async with self.__limiter:
                 if not os.path.isfile(full_file_path):
                     logger.warning(
                         'Warning: file %s does not exist during uploading. Product: %s',
@@ -348,10 +700,15 @@ class S3Client(object):
 
                 key_prefix = target[1]
                 path_key = os.path.join(key_prefix, path) if key_prefix else path
-                file_object = bucket.Object(path_key)
+                sha1 = read_sha1(full_file_path)
+                if self.__is_journaled(bucket_name, path_key, sha1):
+                    logger.debug('Metadata %s was already updated in bucket %s', path, bucket_name)
+                    return
                 existed = False
+                head = None
                 try:
-                    existed = await self.__run_async(self.__file_exists, file_object)
+                    head = await self.__head_object(bucket_name, path_key)
+                    existed = head is not None
                 except (ClientError, HTTPClientError) as e:
                     logger.error(
                         "Error: file existence check failed due to error: %s", e
@@ -360,12 +717,11 @@ class S3Client(object):
                     return
                 f_meta = {}
                 need_overwritten = True
-                sha1 = read_sha1(full_file_path)
                 (content_type, _) = mimetypes.guess_type(full_file_path)
                 if not content_type:
                     content_type = DEFAULT_MIME_TYPE
-                if existed:
-                    f_meta = file_object.metadata
+                if head is not None:
+                    f_meta = head.get("Metadata", {})
                     need_overwritten = (
                         CHECKSUM_META_KEY not in f_meta or sha1 != f_meta[CHECKSUM_META_KEY]
                     )
@@ -374,13 +730,8 @@ class S3Client(object):
                 try:
                     if not self.__dry_run:
                         if need_overwritten:
-                            await self.__run_async(
-                                functools.partial(
-                                    file_object.put,
-                                    Body=open(full_file_path, "rb"),
-                                    Metadata=f_meta,
-                                    ContentType=content_type
-                                )
+                            await self.__put_file(
+                                bucket_name, path_key, full_file_path, f_meta, content_type
                             )
                         if product:
                             # NOTE: This should not happen for most cases, as most
@@ -389,8 +740,7 @@ class S3Client(object):
                             # This is now used for npm version-level package.json
                             prods = [product]
                             if existed:
-                                (prods, no_error) = await self.__run_async(
-                                    self.__get_prod_info,
+                                (prods, no_error) = await self.__get_prod_info(
                                     path_key, bucket_name
                                 )
                                 if not no_error:
@@ -404,6 +754,14 @@ class S3Client(object):
                             if not updated:
                                 failed.append(full_file_path)
                                 return
+                    else:
+                        if need_overwritten:
+                            self.__skip_put_file(bucket_name, full_file_path)
+                        if product:
+                            if existed:
+                                self.__skip("get_object", bucket_name)
+                            self.__skip("put_object", bucket_name)
+                    self.__record(bucket_name, path_key, sha1)
                     logger.debug('Updated metadata %s to bucket %s', path, bucket_name)
                 except (ClientError, HTTPClientError) as e:
                     logger.error(
@@ -429,13 +787,12 @@ class S3Client(object):
             * The signature files will not be overwritten if existed
         """
         bucket_name = target[0]
-        bucket = self.__get_bucket(bucket_name)
 
         async def path_upload_handler(
             full_file_path: str, path: str, index: int,
             total: int, failed: List[str]
         ):
-            async with self.__con_sem:
+            async with self.__limiter:
                 if not os.path.isfile(full_file_path):
                     logger.warning(
                         'Warning: file %s does not exist during uploading. Product: %s',
@@ -451,10 +808,15 @@ class S3Client(object):
 
                 key_prefix = target[1]
                 path_key = os.path.join(key_prefix, path) if key_prefix else path
-                file_object = bucket.Object(path_key)
+                sha1 = read_sha1(full_file_path)
+                if self.__is_journaled(bucket_name, path_key, sha1):
+                    logger.debug(
+                        'Signature %s was already updated in bucket %s', path, bucket_name
+                    )
+                    return
                 existed = False
                 try:
-                    existed = await self.__run_async(self.__file_exists, file_object)
+                    existed = await self.__head_object(bucket_name, path_key) is not None
                 except (ClientError, HTTPClientError) as e:
                     logger.error(
                         "Error: file existence check failed due to error: %s", e
@@ -468,13 +830,8 @@ class S3Client(object):
                 try:
                     if not self.__dry_run:
                         if not existed:
-                            await self.__run_async(
-                                functools.partial(
-                                    file_object.put,
-                                    Body=open(full_file_path, "rb"),
-                                    Metadata={},
-                                    ContentType=content_type
-                                )
+                            await self.__put_file(
+                                bucket_name, path_key, full_file_path, {}, content_type
                             )
                         elif product:
                             # NOTE: This should not happen for most cases, as most
@@ -483,8 +840,7 @@ class S3Client(object):
                             # This is now used for npm version-level package.json
                             prods = [product]
                             if existed:
-                                (prods, no_error) = await self.__run_async(
-                                    self.__get_prod_info,
+                                (prods, no_error) = await self.__get_prod_info(
                                     path_key, bucket_name
                                 )
                                 if not no_error:
@@ -498,6 +854,12 @@ class S3Client(object):
                             if not updated:
                                 failed.append(full_file_path)
                                 return
+                    elif not existed:
+                        self.__skip_put_file(bucket_name, full_file_path)
+                    elif product:
+                        self.__skip("get_object", bucket_name)
+                        self.__skip("put_object", bucket_name)
+                    self.__record(bucket_name, path_key, sha1)
                     logger.debug('Updated signature %s to bucket %s', path, bucket_name)
                 except (ClientError, HTTPClientError) as e:
                     logger.error(
@@ -519,14 +881,16 @@ class S3Client(object):
     ):
         target = target if target else "default"
         path_key = os.path.join(target, manifest_name)
-        manifest_bucket = self.__get_bucket(manifest_bucket_name)
         try:
-            file_object = manifest_bucket.Object(path_key)
-            file_object.upload_file(
-                Filename=manifest_full_path,
-                ExtraArgs={'ContentType': DEFAULT_MIME_TYPE}
-            )
-        except S3UploadFailedError:
+            with open(manifest_full_path, "rb") as f:
+                self.__call_sync(
+                    "put_object",
+                    Bucket=manifest_bucket_name,
+                    Key=path_key,
+                    Body=f,
+                    ContentType=DEFAULT_MIME_TYPE
+                )
+        except (ClientError, HTTPClientError):
             logger.warning(
                 'Warning: Manifest bucket %s does not exist in S3, will ignore uploading of '
                 'manifest file %s', manifest_bucket_name, manifest_name)
@@ -547,20 +911,28 @@ class S3Client(object):
             will be finally removed from bucket.
         """
         bucket_name = target[0]
-        bucket = self.__get_bucket(bucket_name)
+        key_prefix = target[1]
+        existed_keys = self.__preflight_keys(
+            bucket_name, self.__cut_keys(file_paths, key_prefix, root)
+        )
+        # Files and their .prodinfo files are not deleted one by one, but
+        # collected and deleted with DeleteObjects in batches
+        deleter = _BatchDeleter(
+            self.__skip_call if self.__dry_run else self.__call, bucket_name, self.__limiter
+        )
 
         async def path_delete_handler(
             full_file_path: str, path: str, index: int,
             total: int, failed: List[str]
         ):
-            async with self.__con_sem:
-                key_prefix = target[1]
+            async with self.__limiter:
                 logger.debug('(%d/%d) Deleting %s from bucket %s', index, total, path, bucket_name)
                 path_key = os.path.join(key_prefix, path) if key_prefix else path
-                file_object = bucket.Object(path_key)
                 existed = False
                 try:
-                    existed = await self.__run_async(self.__file_exists, file_object)
+                    existed = await self.__exists_with_preflight(
+                        bucket_name, path_key, existed_keys
+                    )
                 except (ClientError, HTTPClientError) as e:
                     logger.error(
                         "Error: file existence check failed due to error: %s", e
@@ -573,13 +945,17 @@ class S3Client(object):
                     # empty, and we will just delete the file, below. Otherwise,
                     # the product reference counts will be used (from object metadata).
                     prods = []
+                    prod_info_key = path_key + PROD_INFO_SUFFIX
                     if product:
-                        (prods, no_error) = await self.__run_async(
-                            self.__get_prod_info,
-                            path_key, bucket_name
-                        )
+                        if existed_keys is not None and prod_info_key not in existed_keys:
+                            logger.warning(
+                                "[S3] WARN: Can not get product info for file %s "
+                                "because product info file does not exist", path_key
+                            )
+                            return
+                        (prods, no_error) = await self.__get_prod_info(path_key, bucket_name)
                         if not no_error:
-                            return False
+                            return
                         if product in prods:
                             prods.remove(product)
 
@@ -590,7 +966,10 @@ class S3Client(object):
                                 " will remove %s from its metadata",
                                 path, product
                             )
-                            await self.__update_prod_info(path_key, bucket_name, prods)
+                            if self.__dry_run:
+                                self.__skip("put_object", bucket_name)
+                            else:
+                                await self.__update_prod_info(path_key, bucket_name, prods)
                             logger.debug(
                                 "Removed product %s from metadata of file %s",
                                 product, path
@@ -604,30 +983,17 @@ class S3Client(object):
                             failed.append(full_file_path)
                             return
                     elif len(prods) == 0:
-                        try:
-                            if not self.__dry_run:
-                                await self.__run_async(
-                                    functools.partial(
-                                        bucket.delete_objects,
-                                        Delete={"Objects": [{"Key": path_key}]}
-                                    )
-                                )
-                                updated = await self.__update_prod_info(
-                                    path_key, bucket_name, prods
-                                )
-                                if not updated:
-                                    failed.append(full_file_path)
-                                    return
-                            logger.info("[S3] Deleted %s from bucket %s", path, bucket_name)
-                            return
-                        except (ClientError, HTTPClientError) as e:
-                            logger.error(
-                                "ERROR: file %s failed to delete from bucket"
-                                " %s due to error: %s ",
-                                full_file_path, bucket_name, e
+                        # In dry run mode, the deleter only records the skipped requests
+                        deleter.add(path_key, full_file_path)
+                        if existed_keys is None or prod_info_key in existed_keys:
+                            deleter.add(prod_info_key, full_file_path)
+                        if not self.__dry_run:
+                            logger.debug(
+                                "[S3] Scheduled deletion of %s from bucket %s", path, bucket_name
                             )
-                            failed.append(full_file_path)
-                            return
+                        else:
+                            logger.info("[S3] Deleted %s from bucket %s", path, bucket_name)
+                        return
                 else:
                     logger.debug(
                         "File %s does not exist in s3 bucket %s, skip deletion.",
@@ -640,6 +1006,10 @@ class S3Client(object):
             path_handler=self.__path_handler_count_wrapper(path_delete_handler),
             root=root
         )
+        loop = get_or_create_event_loop()
+        for failed_file in loop.run_until_complete(deleter.close()):
+            if failed_file not in failed_files:
+                failed_files.append(failed_file)
 
         return failed_files
 
@@ -655,14 +1025,15 @@ class S3Client(object):
         """
         bucket = target[0]
         prefix = target[1]
-        bucket_obj = self.__get_bucket(bucket)
         path_key = os.path.join(prefix, file_path)
-        file_object = bucket_obj.Object(path_key)
         existed = False
         try:
-            existed = self.__file_exists(file_object)
+            existed = self.__file_exists(bucket, path_key)
             if existed:
-                bucket_obj.delete_objects(Delete={"Objects": [{"Key": path_key}]})
+                self.__call_sync(
+                    "delete_objects", Bucket=bucket,
+                    Delete={"Objects": [{"Key": path_key}]}
+                )
             else:
                 logger.warning(
                     'Warning: File %s does not exist in S3 bucket %s, will ignore its deleting',
@@ -689,16 +1060,14 @@ class S3Client(object):
         """
         bucket = target[0]
         prefix = target[1]
-        bucket_obj = self.__get_bucket(bucket)
         path_key = os.path.join(prefix, file_path)
-        file_object = bucket_obj.Object(path_key)
         existed = False
         logger.debug(
             'Uploading %s to bucket %s', path_key, bucket
         )
         existed = False
         try:
-            existed = self.__file_exists(file_object)
+            existed = self.__file_exists(bucket, path_key)
         except (ClientError, HTTPClientError) as e:
             logger.error(
                 "Error: file existence check failed due to error: %s", e
@@ -714,11 +1083,16 @@ class S3Client(object):
                 f_meta[CHECKSUM_META_KEY] = check_sum_sha1
             try:
                 if not self.__dry_run:
-                    file_object.put(
+                    self.__call_sync(
+                        "put_object",
+                        Bucket=bucket,
+                        Key=path_key,
                         Body=file_content,
                         Metadata=f_meta,
                         ContentType=content_type
                     )
+                else:
+                    self.__skip("put_object", bucket, len(file_content))
                 logger.debug('Uploaded %s to bucket %s', path_key, bucket)
             except (ClientError, HTTPClientError) as e:
                 logger.error(
@@ -740,18 +1114,19 @@ class S3Client(object):
         target = target if target else "default"
         path_key = os.path.join(target, manifest_name)
 
-        manifest_bucket = self.__get_bucket(manifest_bucket_name)
-        file_object = manifest_bucket.Object(path_key)
         existed = False
         try:
-            existed = self.__file_exists(file_object)
+            existed = self.__file_exists(manifest_bucket_name, path_key)
         except (ClientError, HTTPClientError) as e:
             logger.error(
                 "Error: file existence check failed due to error: %s", e
             )
             return
         if existed:
-            manifest_bucket.delete_objects(Delete={"Objects": [{"Key": path_key}]})
+            self.__call_sync(
+                "delete_objects", Bucket=manifest_bucket_name,
+                Delete={"Objects": [{"Key": path_key}]}
+            )
         else:
             logger.warning(
                 'Warning: Manifest %s does not exist in S3 bucket %s, will ignore its deleting',
@@ -761,109 +1136,361 @@ class S3Client(object):
         """Get the file names from s3 bucket. Can use prefix and suffix to filter the
         files wanted. If some error happend, will return an empty file list and false result
         """
-        bucket = self.__get_bucket(bucket_name)
-        objs = []
-        if prefix and prefix.strip() != "":
-            try:
-                objs = list(bucket.objects.filter(Prefix=prefix))
-            except (ClientError, HTTPClientError) as e:
-                logger.error("[S3] ERROR: Can not get files under %s in bucket"
-                             " %s due to error: %s ", prefix,
-                             bucket_name, e)
-                return ([], False)
-        else:
-            objs = list(bucket.objects.all())
-        files = []
-        if suffix and suffix.strip() != "":
-            files = [i.key for i in objs if i.key.endswith(suffix)]
-        else:
-            files = [i.key for i in objs]
-        return (files, True)
+        if not prefix or prefix.strip() == "":
+            prefix = ""
+        if self.__listing_cache:
+            keys = self.__listing_cache.get_keys(bucket_name, prefix)
+            if keys is not None:
+                return (_filter_keys(keys, suffix), True)
+        # All files are needed to fill the listing cache, otherwise the files
+        # are filtered while listing
+        list_suffix = None if self.__listing_cache else suffix
+        try:
+            keys = sorted(self.iter_files(bucket_name, prefix, list_suffix))
+        except (ClientError, HTTPClientError) as e:
+            if not prefix:
+                raise e
+            logger.error("[S3] ERROR: Can not get files under %s in bucket"
+                         " %s due to error: %s ", prefix,
+                         bucket_name, e)
+            return ([], False)
+        if self.__listing_cache:
+            self.__listing_cache.put_keys(bucket_name, prefix, keys)
+            keys = _filter_keys(keys, suffix)
+        return (keys, True)
+
+    def iter_files(self, bucket_name: str, prefix="", suffix=None) -> Iterator[str]:
+        """Iterate the file names under the prefix in s3 bucket, which can be
+        filtered by suffix. If there are more files than one listing page, the
+        rest of the files are split into shards by their subfolders, and the
+        shards are listed concurrently. The file names are yielded as soon as
+        they are listed, so they are not in order.
+        """
+        kwargs = {"Prefix": prefix} if prefix else {}
+        first = self.__call_sync(
+            "list_objects_v2", Bucket=bucket_name, MaxKeys=LISTING_PAGE_SIZE, **kwargs
+        )
+        contents = first.get("Contents", [])
+        yield from _filter_keys([c["Key"] for c in contents], suffix)
+        if not first.get("IsTruncated") or len(contents) == 0:
+            return
+        start_after = contents[-1]["Key"]
+        (shards, files) = self.__discover_shards(bucket_name, prefix, start_after)
+        logger.debug(
+            "[S3] Listing %d shards under %s in bucket %s concurrently",
+            len(shards), prefix, bucket_name
+        )
+        yield from _filter_keys(files, suffix)
+        yield from self.__list_shards(bucket_name, shards, start_after, suffix)
 
     def read_file_content(self, bucket_name: str, key: str) -> str:
-        bucket = self.__get_bucket(bucket_name)
-        file_object = bucket.Object(key)
-        return str(file_object.get()['Body'].read(), 'utf-8')
+        """Read the content of the file in s3 bucket. The content is cached,
+        and only downloaded again if the file is changed since last reading.
+        """
+        (kwargs, cached) = self.__content_request(bucket_name, key)
+        try:
+            result = self.__call_sync("get_object", **kwargs)
+        except ClientError as e:
+            if cached and _is_not_modified(e):
+                self.__content_cache.record_hit()
+                return str(cached[1], 'utf-8')
+            raise e
+        return str(self.__content_response(bucket_name, key, result), 'utf-8')
 
     def download_file(self, bucket_name: str, key: str, file_path: str):
-        bucket = self.__get_bucket(bucket_name)
-        bucket.download_file(key, file_path)
+        started = time.monotonic()
+        try:
+            self.__transport.download_sync(bucket_name, key, file_path)
+        except (ClientError, HTTPClientError) as e:
+            self.__measure(
+                "download_file", {"Bucket": bucket_name}, 0, time.monotonic() - started,
+                error=e
+            )
+            raise e
+        self.__metrics.record(
+            "download_file", bucket_name, time.monotonic() - started,
+            received=file_size(file_path)
+        )
 
     def list_folder_content(self, bucket_name: str, folder: str) -> List[str]:
         """List the content in folder in an s3 bucket. Note it's not recursive,
            which means the content only contains the items in that folder, but
            not in its subfolders.
         """
-        bucket = self.__get_bucket(bucket_name)
+        if not folder or folder.strip() == "/" or folder.strip() == "":
+            prefix = ""
+        else:
+            prefix = folder if folder.endswith("/") else folder+"/"
 
+        if self.__listing_cache:
+            cached = self.__listing_cache.get_folder(bucket_name, prefix)
+            if cached is not None:
+                return cached
         try:
-            paginator = bucket.meta.client.get_paginator('list_objects_v2')
-            if not folder or folder.strip() == "/" or folder.strip() == "":
-                pages = paginator.paginate(
-                    Bucket=bucket.name,
-                    Delimiter='/'
-                )
-            else:
-                prefix = folder if folder.endswith("/") else folder+"/"
-                pages = paginator.paginate(
-                    Bucket=bucket.name,
-                    Prefix=prefix,
-                    Delimiter='/'
-                )
-
+            (folders, files) = self.__list_folder(bucket_name, prefix)
+            contents = folders + files
         except (ClientError, HTTPClientError) as e:
             logger.error("[S3] ERROR: Can not get contents of %s from bucket"
                          " %s due to error: %s ", folder,
                          bucket_name, e)
             return []
-
-        contents = []
-        for page in pages:
-            folders = page.get("CommonPrefixes")
-            if folders:
-                contents.extend([f.get("Prefix") for f in folders])
-            files = page.get("Contents")
-            if files:
-                contents.extend([f.get("Key") for f in files])
+        if self.__listing_cache:
+            self.__listing_cache.put_folder(bucket_name, prefix, contents)
         return contents
 
     def file_exists_in_bucket(
         self, bucket_name: str, path: str
     ) -> bool:
-        bucket = self.__get_bucket(bucket_name)
-        file_object = bucket.Object(path)
-        return self.__file_exists(file_object)
+        return self.__file_exists(bucket_name, path)
+
+    def get_concurrency_summary(self) -> Dict[str, Any]:
+        """Get the concurrency chosen by the adaptive limiter, including the
+        initial, final, lowest and highest concurrency, and the number of
+        throttled requests.
+        """
+        return self.__limiter.summary()
+
+    def get_content_cache_summary(self) -> Dict[str, Any]:
+        """Get the hits and misses of the cache of the contents read from S3,
+        the number of the conditional requests to revalidate the cached
+        contents, and the number and bytes of the cached contents.
+        """
+        return self.__content_cache.summary()
+
+    def close(self):
+        """Close the transport of the client, like the event loop thread and
+        the connections of the aio transport. The client should not be used
+        after closing.
+        """
+        self.__transport.close()
+
+    def __enter__(self) -> "S3Client":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __list_folder(
+        self, bucket_name: str, prefix: str, start_after: Optional[str] = None
+    ) -> Tuple[List[str], List[str]]:
+        """List the subfolders and files directly in the folder of prefix"""
+        kwargs: Dict[str, Any] = {"Delimiter": "/"}
+        if prefix:
+            kwargs["Prefix"] = prefix
+        if start_after:
+            kwargs["StartAfter"] = start_after
+        folders: List[str] = []
+        files: List[str] = []
+        for page in self.__iter_pages(bucket_name, **kwargs):
+            folders.extend([f.get("Prefix") for f in page.get("CommonPrefixes", [])])
+            files.extend([f.get("Key") for f in page.get("Contents", [])])
+        return (folders, files)
+
+    def __discover_shards(
+        self, bucket_name: str, prefix: str, start_after: str
+    ) -> Tuple[List[str], List[str]]:
+        """Find the subfolders under the prefix which have files after the
+        start_after key, and the files after start_after directly in the
+        folders passed by.
+        """
+        files: List[str] = []
+        depth = 0
+        while True:
+            (folders, direct_files) = self.__list_folder(bucket_name, prefix, start_after)
+            files.extend(direct_files)
+            # The subfolder of start_after may have files after it, but is not
+            # always listed as it sorts before start_after
+            rest = start_after[len(prefix):]
+            if start_after.startswith(prefix) and "/" in rest:
+                current = prefix + rest.split("/", 1)[0] + "/"
+                if current not in folders:
+                    folders.insert(0, current)
+            if len(folders) != 1 or depth >= LISTING_MAX_DEPTH:
+                return (folders, files)
+            prefix = folders[0]
+            depth += 1
+
+    def __list_shards(
+        self, bucket_name: str, shards: List[str], start_after: str, suffix=None
+    ) -> Iterator[str]:
+        if len(shards) == 0:
+            return
+        workers = min(len(shards), self.__limiter.limit)
+        waiting = deque(shards)
+        with ThreadPoolExecutor(workers, thread_name_prefix="charon-list") as executor:
+            pending: Dict[Future, Dict[str, Any]] = {}
+
+            def submit(kwargs: Dict[str, Any]):
+                future = executor.submit(
+                    functools.partial(self.__call_sync, "list_objects_v2", **kwargs)
+                )
+                pending[future] = kwargs
+
+            def submit_shard():
+                submit({
+                    "Bucket": bucket_name, "Prefix": waiting.popleft(),
+                    "StartAfter": start_after, "MaxKeys": LISTING_PAGE_SIZE
+                })
+
+            while waiting and len(pending) < workers:
+                submit_shard()
+            while pending:
+                (done, _) = wait(list(pending.keys()), return_when=FIRST_COMPLETED)
+                for future in done:
+                    kwargs = pending.pop(future)
+                    page = future.result()
+                    if page.get("IsTruncated"):
+                        submit(dict(kwargs, ContinuationToken=page["NextContinuationToken"]))
+                    elif waiting:
+                        submit_shard()
+                    yield from _filter_keys(
+                        [c["Key"] for c in page.get("Contents", [])], suffix
+                    )
+
+    def __iter_pages(self, bucket_name: str, **kwargs) -> Iterator[Dict[str, Any]]:
+        kwargs["Bucket"] = bucket_name
+        kwargs.setdefault("MaxKeys", LISTING_PAGE_SIZE)
+        while True:
+            page = self.__call_sync("list_objects_v2", **kwargs)
+            yield page
+            if not page.get("IsTruncated"):
+                return
+            kwargs["ContinuationToken"] = page["NextContinuationToken"]
+
+    async def __aiter_pages(self, bucket_name: str, **kwargs) -> AsyncIterator[Dict[str, Any]]:
+        kwargs["Bucket"] = bucket_name
+        kwargs.setdefault("MaxKeys", LISTING_PAGE_SIZE)
+        while True:
+            page = await self.__call("list_objects_v2", **kwargs)
+            yield page
+            if not page.get("IsTruncated"):
+                return
+            kwargs["ContinuationToken"] = page["NextContinuationToken"]
+
+    def __preflight_keys(
+        self, bucket_name: str, keys: List[str]
+    ) -> Optional[Dict[str, Tuple[str, int]]]:
+        """List the parent folders of the keys with list_objects_v2 once, and
+        collect all existing keys under them with their ETag and size. This is
+        used to replace the per-file HEAD requests for the existence check.
+        Returns None if the listing failed, which means the caller should fall
+        back to the per-file existence check.
+        """
+        prefixes = _preflight_prefixes(keys)
+        if len(prefixes) == 0:
+            return {}
+        existed: Dict[str, Tuple[str, int]] = {}
+        failed = []
+
+        async def list_prefix(prefix: str):
+            async with self.__limiter:
+                try:
+                    listed = await self.__list_keys_with_meta(bucket_name, prefix)
+                    existed.update(listed)
+                    if self.__listing_cache:
+                        self.__listing_cache.put_keys(bucket_name, prefix, listed.keys())
+                except (ClientError, HTTPClientError) as e:
+                    logger.warning(
+                        "[S3] Warning: Can not list prefix %s in bucket %s due to error: %s",
+                        prefix, bucket_name, e
+                    )
+                    failed.append(prefix)
+
+        logger.debug(
+            "[S3] Preflight listing %d prefixes for %d keys in bucket %s",
+            len(prefixes), len(keys), bucket_name
+        )
+        run_scheduled(prefixes, list_prefix, self.__max_con_limit)
+        if len(failed) > 0:
+            logger.warning(
+                "[S3] Preflight listing failed for bucket %s, will check "
+                "files existence one by one.", bucket_name
+            )
+            return None
+        logger.debug(
+            "[S3] Preflight listing done for bucket %s, found %d existing keys",
+            bucket_name, len(existed)
+        )
+        return existed
+
+    async def __list_keys_with_meta(
+        self, bucket_name: str, prefix: str
+    ) -> Dict[str, Tuple[str, int]]:
+        keys: Dict[str, Tuple[str, int]] = {}
+        async for page in self.__aiter_pages(bucket_name, Prefix=prefix):
+            for content in page.get("Contents", []):
+                keys[content["Key"]] = (
+                    content.get("ETag", "").strip('"'), content.get("Size", 0)
+                )
+        return keys
+
+    async def __exists_with_preflight(
+        self, bucket_name: str, key: str,
+        existed_keys: Optional[Dict[str, Tuple[str, int]]]
+    ) -> bool:
+        if existed_keys is not None:
+            return key in existed_keys
+        return await self.__head_object(bucket_name, key) is not None
+
+    def __cut_keys(self, file_paths: List[str], key_prefix: str, root="/") -> List[str]:
+        slash_root = root
+        if not root.endswith("/"):
+            slash_root = slash_root + "/"
+        keys = []
+        for full_path in file_paths:
+            path = full_path
+            if path.startswith(slash_root):
+                path = path[len(slash_root):]
+            keys.append(os.path.join(key_prefix, path) if key_prefix else path)
+        return keys
+
+    def __is_journaled(self, bucket_name: str, key: str, sha1: str) -> bool:
+        return self.__journal is not None and self.__journal.is_done(bucket_name, key, sha1)
+
+    def __record(self, bucket_name: str, key: str, sha1: str):
+        if self.__journal is not None and not self.__dry_run:
+            self.__journal.record(bucket_name, key, sha1)
 
-    def __get_bucket(self, bucket_name: str):
-        self.__lock.acquire()
+    def __file_exists(self, bucket_name: str, key: str) -> bool:
+        if self.__listing_cache:
+            existed = self.__listing_cache.exists(bucket_name, key)
+            if existed is not None:
+                return existed
         try:
-            bucket = self.__buckets.get(bucket_name)
-            if bucket:
-                return bucket
-            logger.debug("[S3] Cache aws bucket %s", bucket_name)
-            bucket = self.__client.Bucket(bucket_name)
-            self.__buckets[bucket_name] = bucket
-            return bucket
-        finally:
-            self.__lock.release()
-
-    def __file_exists(self, file_object) -> bool:
+            self.__call_sync("head_object", Bucket=bucket_name, Key=key)
+            existed = True
+        except (ClientError, HTTPClientError) as e:
+            if isinstance(e, ClientError) and e.response["Error"]["Code"] == "404":
+                existed = False
+            else:
+                raise e
+        if self.__listing_cache:
+            self.__listing_cache.put_exists(bucket_name, key, existed)
+        return existed
+
+    async def __head_object(self, bucket_name: str, key: str) -> Optional[Dict[str, Any]]:
+        """Get the HEAD response of the object, or None if it does not exist"""
         try:
-            file_object.load()
-            return True
+            return await self.__call("head_object", Bucket=bucket_name, Key=key)
         except (ClientError, HTTPClientError) as e:
             if isinstance(e, ClientError) and e.response["Error"]["Code"] == "404":
-                return False
+                return None
             else:
                 raise e
 
-    def __get_prod_info(
+    async def __get_metadata(self, bucket_name: str, key: str) -> Dict[str, str]:
+        head = await self.__head_object(bucket_name, key)
+        return head.get("Metadata", {}) if head else {}
+
+    async def __get_prod_info(
         self, file: str, bucket_name: str
     ) -> Tuple[List[str], bool]:
         logger.debug("[S3] Getting product infomation for file %s", file)
         prod_info_file = file + PROD_INFO_SUFFIX
         try:
-            info_file_content = self.read_file_content(bucket_name, prod_info_file)
+            info_file_content = str(
+                await self.__get_content(bucket_name, prod_info_file), 'utf-8'
+            )
             prods = [p.strip() for p in info_file_content.split("\n")]
             logger.debug("[S3] Got product information as below %s", prods)
             return (prods, True)
@@ -876,19 +1503,17 @@ class S3Client(object):
         self, file: str, bucket_name: str, prods: List[str]
     ) -> bool:
         prod_info_file = file + PROD_INFO_SUFFIX
-        bucket = self.__get_bucket(bucket_name)
-        file_obj = bucket.Object(prod_info_file)
         content_type = "text/plain"
         if len(prods) > 0:
             logger.debug("[S3] Updating product infomation for file %s "
                          "with products: %s", file, prods)
             try:
-                await self.__run_async(
-                    functools.partial(
-                        file_obj.put,
-                        Body="\n".join(prods).encode("utf-8"),
-                        ContentType=content_type
-                    )
+                await self.__call(
+                    "put_object",
+                    Bucket=bucket_name,
+                    Key=prod_info_file,
+                    Body="\n".join(prods).encode("utf-8"),
+                    ContentType=content_type
                 )
                 logger.debug("[S3] Updated product infomation for file %s", file)
                 return True
@@ -900,16 +1525,12 @@ class S3Client(object):
             logger.debug("[S3] Removing product infomation file for file %s "
                          "because no products left", file)
             try:
-                result = await self.__run_async(
-                    self.__file_exists,
-                    file_obj
-                )
-                if result:
-                    await self.__run_async(
-                        functools.partial(
-                            bucket.delete_objects,
-                            Delete={"Objects": [{"Key": prod_info_file}]}
-                        )
+                result = await self.__head_object(bucket_name, prod_info_file)
+                if result is not None:
+                    await self.__call(
+                        "delete_objects",
+                        Bucket=bucket_name,
+                        Delete={"Objects": [{"Key": prod_info_file}]}
                     )
                     logger.debug("[S3] Removed product infomation file for file %s", file)
                 return True
@@ -918,6 +1539,54 @@ class S3Client(object):
                                "due to error: %s", file, e)
                 return False
 
+    async def __get_content(self, bucket_name: str, key: str) -> bytes:
+        (kwargs, cached) = self.__content_request(bucket_name, key)
+        try:
+            result = await self.__call("get_object", **kwargs)
+        except ClientError as e:
+            if cached and _is_not_modified(e):
+                self.__content_cache.record_hit()
+                return cached[1]
+            raise e
+        return self.__content_response(bucket_name, key, result)
+
+    def __content_request(
+        self, bucket_name: str, key: str
+    ) -> Tuple[Dict[str, Any], Optional[Tuple[str, bytes]]]:
+        kwargs = {"Bucket": bucket_name, "Key": key}
+        cached = self.__content_cache.get(bucket_name, key)
+        if cached:
+            kwargs["IfNoneMatch"] = cached[0]
+            self.__content_cache.record_revalidation()
+        return (kwargs, cached)
+
+    def __content_response(self, bucket_name: str, key: str, result: Dict[str, Any]) -> bytes:
+        self.__content_cache.record_miss()
+        body = result['Body']
+        self.__content_cache.put(bucket_name, key, result.get("ETag", ""), body)
+        return body
+
+    def __on_written(self, operation: str, kwargs: Dict[str, Any], result: Dict[str, Any]):
+        """Patch the caches with the keys written or deleted by the operation"""
+        if operation not in WRITE_OPERATIONS:
+            return
+        bucket_name = kwargs.get("Bucket", "")
+        if operation == "delete_objects":
+            errors = {e.get("Key") for e in result.get("Errors", [])}
+            for obj in kwargs.get("Delete", {}).get("Objects", []):
+                key = obj.get("Key", "")
+                self.__content_cache.invalidate(bucket_name, key)
+                if self.__listing_cache and key not in errors:
+                    self.__listing_cache.remove(bucket_name, key)
+            return
+        key = kwargs.get("Key", "")
+        self.__content_cache.invalidate(bucket_name, key)
+        if self.__listing_cache:
+            if operation == "delete_object":
+                self.__listing_cache.remove(bucket_name, key)
+            else:
+                self.__listing_cache.add(bucket_name, key)
+
     def __path_handler_count_wrapper(
         self,
         path_handler: PATH_HANDLER_TYPE
@@ -936,30 +1605,302 @@ class S3Client(object):
     def __do_path_cut_and(
         self, file_paths: List[str],
         path_handler: PATH_HANDLER_TYPE,
-        root="/"
+        root="/", largest_first=False, size: Callable[[str], int] = file_size
     ) -> List[str]:
+        """Run the path handler for the file paths with at most max_con_limit
+        handlers in progress, the adaptive limiter in the handlers decides how
+        many of them can send requests. If largest_first is True, the biggest
+        files are handled first, so that they will not be the last ones left.
+        """
         slash_root = root
         if not root.endswith("/"):
             slash_root = slash_root + "/"
         failed_paths: List[str] = []
-        index = 1
         file_paths_count = len(file_paths)
-        tasks = []
-        for full_path in file_paths:
+        index = 0
+
+        async def handle(full_path: str):
+            nonlocal index
+            index += 1
             path = full_path
             if path.startswith(slash_root):
                 path = path[len(slash_root):]
-            tasks.append(
-                asyncio.ensure_future(
-                    path_handler(full_path, path, index, file_paths_count, failed_paths)
-                )
-            )
-            index += 1
+            await path_handler(full_path, path, index, file_paths_count, failed_paths)
 
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(asyncio.gather(*tasks))
+        run_scheduled(
+            file_paths, handle, self.__max_con_limit,
+            order_key=size if largest_first else None
+        )
         return failed_paths
 
+    async def __call(self, operation: str, **kwargs) -> Dict[str, Any]:
+        """Send the S3 request with the transport. Throttled requests are retried
+        with jittered backoff, and the latency and throttling of the requests are
+        fed to the adaptive limiter.
+        """
+        position = _body_position(kwargs)
+        # The body is read by the request, so it is measured before sending
+        sent = _body_size(kwargs)
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                result = await self.__transport.call(operation, **kwargs)
+                latency = time.monotonic() - started
+                self.__limiter.on_success(latency)
+                self.__measure(operation, kwargs, sent, latency, result)
+                self.__on_written(operation, kwargs, result)
+                return result
+            except HTTPClientError as e:
+                self.__measure(operation, kwargs, sent, time.monotonic() - started, error=e)
+                raise e
+            except ClientError as e:
+                self.__measure(operation, kwargs, sent, time.monotonic() - started, error=e)
+                if not _is_throttled(e):
+                    raise e
+                self.__limiter.on_throttle(started)
+                attempt += 1
+                if attempt > THROTTLE_RETRY_LIMIT:
+                    raise e
+                delay = self.__throttle_delay(operation, attempt)
+                _rewind_body(kwargs, position)
+                await asyncio.sleep(delay)
+
+    def __call_sync(self, operation: str, **kwargs) -> Dict[str, Any]:
+        position = _body_position(kwargs)
+        # The body is read by the request, so it is measured before sending
+        sent = _body_size(kwargs)
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                result = self.__transport.call_sync(operation, **kwargs)
+                latency = time.monotonic() - started
+                self.__limiter.on_success(latency)
+                self.__measure(operation, kwargs, sent, latency, result)
+                self.__on_written(operation, kwargs, result)
+                return result
+            except HTTPClientError as e:
+                self.__measure(operation, kwargs, sent, time.monotonic() - started, error=e)
+                raise e
+            except ClientError as e:
+                self.__measure(operation, kwargs, sent, time.monotonic() - started, error=e)
+                if not _is_throttled(e):
+                    raise e
+                self.__limiter.on_throttle(started)
+                attempt += 1
+                if attempt > THROTTLE_RETRY_LIMIT:
+                    raise e
+                delay = self.__throttle_delay(operation, attempt)
+                _rewind_body(kwargs, position)
+                time.sleep(delay)
+
+    def __measure(
+        self, operation: str, kwargs: Dict[str, Any], sent: int, latency: float,
+        result: Optional[Dict[str, Any]] = None, error: Optional[Exception] = None
+    ):
+        """Record the request in the request metrics. The body of a response is
+        counted by its length, as it is read by the caller later.
+        """
+        received = 0
+        if result is not None and "Body" in result:
+            received = result.get("ContentLength", 0)
+        self.__metrics.record(
+            operation, kwargs.get("Bucket", ""), latency,
+            sent=sent, received=received,
+            error=error is not None and not (
+                isinstance(error, ClientError) and _is_not_modified(error)
+            )
+        )
+
+    def __skip(self, operation: str, bucket_name: str, sent=0):
+        """Record the request which is not sent in dry run mode"""
+        self.__metrics.record_skipped(operation, bucket_name, sent)
+
+    async def __skip_call(self, operation: str, **kwargs) -> Dict[str, Any]:
+        """Used in place of __call in dry run mode, which records the request
+        and returns an empty result.
+        """
+        self.__skip(operation, kwargs.get("Bucket", ""), _body_size(kwargs))
+        return {}
+
+    def __skip_put_file(
+        self, bucket_name: str, full_file_path: str, source: LocalFiles = LOCAL_FILES
+    ):
+        """Record the requests __put_file would send for the file"""
+        size = source.size(full_file_path)
+        if size < self.__multipart_threshold:
+            self.__skip("put_object", bucket_name, size)
+            return
+        chunksize = self.__multipart_chunksize
+        self.__skip("create_multipart_upload", bucket_name)
+        for start in range(0, size, chunksize):
+            self.__skip("upload_part", bucket_name, min(chunksize, size - start))
+        self.__skip("complete_multipart_upload", bucket_name)
+
+    def __throttle_delay(self, operation: str, attempt: int) -> float:
+        delay = backoff_delay(attempt, THROTTLE_BACKOFF_BASE, THROTTLE_BACKOFF_CAP)
+        logger.warning(
+            "[S3] %s request is throttled, will retry in %.2f seconds (%d/%d)",
+            operation, delay, attempt, THROTTLE_RETRY_LIMIT
+        )
+        return delay
+
     async def __run_async(self, fn: Callable, *args) -> Any:
+        """Run the blocking local work, like file reading, out of the event loop.
+        S3 requests should be sent with the transport instead.
+        """
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(_executor, fn, *args)
+        return await loop.run_in_executor(None, fn, *args)
+
+
+def _is_throttled(e: ClientError) -> bool:
+    error = e.response.get("Error", {})
+    status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return error.get("Code") in THROTTLE_ERROR_CODES or status in (429, 503)
+
+
+def _is_not_modified(e: ClientError) -> bool:
+    error = e.response.get("Error", {})
+    status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return error.get("Code") in ("304", "NotModified") or status == 304
+
+
+def _filter_keys(keys: List[str], suffix=None) -> List[str]:
+    if suffix and suffix.strip() != "":
+        return [k for k in keys if k.endswith(suffix)]
+    return keys
+
+
+def _body_position(kwargs: Dict[str, Any]) -> Optional[int]:
+    body = kwargs.get("Body")
+    if hasattr(body, "seek") and hasattr(body, "tell"):
+        return body.tell()
+    return None
+
+
+def _body_size(kwargs: Dict[str, Any]) -> int:
+    """The number of bytes to be sent from the body of the request"""
+    body = kwargs.get("Body")
+    if body is None:
+        return 0
+    if "ContentLength" in kwargs:
+        return kwargs["ContentLength"]
+    if isinstance(body, (bytes, bytearray, str)):
+        return len(body)
+    try:
+        return os.fstat(body.fileno()).st_size - body.tell()
+    except (AttributeError, OSError, ValueError):
+        return 0
+
+
+def _rewind_body(kwargs: Dict[str, Any], position: Optional[int]):
+    if position is not None:
+        kwargs["Body"].seek(position)
+
+
+def _preflight_prefixes(keys: List[str]) -> List[str]:
+    """Collect the minimal list of prefixes which covers all parent folders
+    of the keys. Keys without a parent folder use the key itself as prefix,
+    to avoid listing the whole bucket.
+    """
+    candidates = set()
+    for key in keys:
+        parent = key.rsplit("/", 1)[0] + "/" if "/" in key else key
+        candidates.add(parent)
+    prefixes: List[str] = []
+    for candidate in sorted(candidates):
+        if prefixes and candidate.startswith(prefixes[-1]) and prefixes[-1].endswith("/"):
+            continue
+        prefixes.append(candidate)
+    return prefixes
+
+
+def preflight_groups(keys: List[str]) -> Dict[str, str]:
+    """Map the keys to the preflight prefixes which cover them. The keys of
+    different prefixes are never listed by the same preflight listing.
+    """
+    prefixes = _preflight_prefixes(keys)
+    groups: Dict[str, str] = {}
+    for key in keys:
+        parent = key.rsplit("/", 1)[0] + "/" if "/" in key else key
+        # The prefixes are sorted and not under each other, so the covering
+        # one is the last prefix sorted before the parent folder
+        groups[key] = prefixes[bisect.bisect_right(prefixes, parent) - 1]
+    return groups
+
+
+class _BatchDeleter(object):
+    """Collects keys to be deleted from one bucket, and deletes them with
+    DeleteObjects requests of at most DELETE_BATCH_SIZE keys. A batch is
+    flushed as soon as it is full, so batches are deleted concurrently
+    while the keys are still being collected. Each key is bound with the
+    original file path, so the per-key errors in the responses can be
+    mapped back to the failed files.
+    """
+
+    def __init__(
+        self, call: Callable[..., Awaitable[Dict[str, Any]]], bucket_name: str,
+        limiter: AdaptiveLimiter, batch_size=DELETE_BATCH_SIZE
+    ):
+        self.__call = call
+        self.__bucket_name = bucket_name
+        self.__limiter = limiter
+        self.__batch_size = batch_size
+        self.__pending: Dict[str, str] = {}
+        self.__flushes: List[asyncio.Future] = []
+        self.__failed: List[str] = []
+
+    def add(self, key: str, origin: str):
+        self.__pending[key] = origin
+        if len(self.__pending) >= self.__batch_size:
+            self.__flushes.append(asyncio.ensure_future(self.__flush(self.__pending)))
+            self.__pending = {}
+
+    async def close(self) -> List[str]:
+        """Flush all remaining keys, wait for all batches to be done and
+        return the original file paths which failed to be deleted.
+        """
+        if len(self.__pending) > 0:
+            self.__flushes.append(asyncio.ensure_future(self.__flush(self.__pending)))
+            self.__pending = {}
+        await asyncio.gather(*self.__flushes)
+        self.__flushes = []
+        return self.__failed
+
+    async def __flush(self, batch: Dict[str, str]):
+        bucket_name = self.__bucket_name
+        async with self.__limiter:
+            try:
+                result = await self.__call(
+                    "delete_objects",
+                    Bucket=bucket_name,
+                    Delete={
+                        "Objects": [{"Key": k} for k in batch.keys()],
+                        "Quiet": True
+                    }
+                )
+            except (ClientError, HTTPClientError) as e:
+                logger.error(
+                    "ERROR: %d files failed to delete from bucket %s due to error: %s",
+                    len(batch), bucket_name, e
+                )
+                self.__fail(batch.values())
+                return
+        errors = result.get("Errors", [])
+        for error in errors:
+            key = error.get("Key", "")
+            logger.error(
+                "ERROR: file %s failed to delete from bucket %s due to error: %s %s",
+                key, bucket_name, error.get("Code", ""), error.get("Message", "")
+            )
+            if key in batch:
+                self.__fail([batch[key]])
+        logger.info(
+            "[S3] Deleted %d objects from bucket %s", len(batch) - len(errors), bucket_name
+        )
+
+    def __fail(self, origins):
+        for origin in origins:
+            if origin not in self.__failed:
+                self.__failed.append(origin)
@@ -0,0 +1,263 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import asyncio
+import functools
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from boto3 import session
+from botocore.config import Config
+
+try:
+    from aiobotocore.session import AioSession
+except ImportError:  # pragma: no cover - aiobotocore is an optional dependency
+    AioSession = None
+
+logger = logging.getLogger(__name__)
+
+TRANSPORT_ENV = "charon_s3_transport"
+TRANSPORT_AUTO = "auto"
+TRANSPORT_EXECUTOR = "executor"
+TRANSPORT_AIO = "aio"
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# The get_object requests are used to read small contents like the metadata
+# files, so their bodies are read in memory only up to this size. Bigger
+# objects should be downloaded to files with download_sync.
+MAX_BODY_SIZE = 128 * 1024 * 1024
+
+# Executors are shared by all transports with the same concurrency budget,
+# so that creating lots of S3Client objects does not leak idle threads.
+_executors: Dict[int, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+class S3Transport(object):
+    """The S3Transport sends the S3 requests of the S3Client. All S3 requests
+    of charon go through one transport, which governs the socket pool, the
+    in-flight requests and the transfer threads with one concurrency budget.
+        * call is used in coroutines and call_sync is used in normal functions.
+          Both can be used from any thread.
+        * The Body of get_object response is always read as bytes, so a
+          ValueError is raised before reading it if it is bigger than
+          MAX_BODY_SIZE.
+        * The transport should be closed when it is not used any more.
+    """
+
+    def __init__(self, con_limit: int) -> None:
+        self.con_limit = con_limit
+
+    async def call(self, operation: str, **kwargs) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def call_sync(self, operation: str, **kwargs) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def download_sync(self, bucket: str, key: str, file_path: str):
+        """Download the object to the local file without holding the whole
+        content in memory.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class ExecutorS3Transport(S3Transport):
+    """This transport uses the blocking boto3 client and runs the requests in
+    a thread pool. The thread pool and the connection pool of the client have
+    the same size, which is the concurrency budget of the transport.
+    """
+
+    def __init__(
+        self, aws_profile=None, endpoint_url=None,
+        config: Optional[Config] = None, con_limit=25
+    ) -> None:
+        super().__init__(con_limit)
+        if aws_profile:
+            s3_session = session.Session(profile_name=aws_profile)
+        else:
+            s3_session = session.Session()
+        pool_config = Config(max_pool_connections=con_limit)
+        self.client = s3_session.client(
+            's3',
+            endpoint_url=endpoint_url,
+            config=config.merge(pool_config) if config else pool_config
+        )
+        self.__executor = _get_executor(con_limit)
+
+    async def call(self, operation: str, **kwargs) -> Dict[str, Any]:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self.__executor,
+            functools.partial(self.call_sync, operation, **kwargs)
+        )
+
+    def call_sync(self, operation: str, **kwargs) -> Dict[str, Any]:
+        result = getattr(self.client, operation)(**kwargs)
+        if operation == "get_object":
+            body = result["Body"]
+            try:
+                _check_body_size(kwargs, result)
+                result["Body"] = body.read()
+            finally:
+                body.close()
+        return result
+
+    def download_sync(self, bucket: str, key: str, file_path: str):
+        result = self.client.get_object(Bucket=bucket, Key=key)
+        body = result["Body"]
+        try:
+            with open(file_path, "wb") as f:
+                shutil.copyfileobj(body, f, DOWNLOAD_CHUNK_SIZE)
+        finally:
+            body.close()
+
+
+class AioS3Transport(S3Transport):
+    """This transport uses the non-blocking aiobotocore client. All requests
+    run in the event loop of a dedicated background thread, so they can be
+    awaited from any event loop and also be called from normal functions.
+    At most con_limit requests are in flight, which is also the size of the
+    connection pool.
+    """
+
+    def __init__(
+        self, aws_profile=None, endpoint_url=None,
+        config: Optional[Config] = None, con_limit=25
+    ) -> None:
+        super().__init__(con_limit)
+        if AioSession is None:
+            raise ImportError("aiobotocore is required for the aio transport")
+        pool_config = Config(max_pool_connections=con_limit)
+        self.__client_kwargs = {
+            "endpoint_url": endpoint_url,
+            "config": config.merge(pool_config) if config else pool_config
+        }
+        self.__aws_profile = aws_profile
+        self.__loop = asyncio.new_event_loop()
+        self.__thread = threading.Thread(
+            target=self.__loop.run_forever, name="charon-s3-aio", daemon=True
+        )
+        self.__thread.start()
+        self.__sem: Optional[asyncio.Semaphore] = None
+        self.__client_ctx: Any = None
+        self.__client: Any = None
+        self.__submit(self.__open()).result()
+
+    async def __open(self):
+        aio_session = AioSession(profile=self.__aws_profile)
+        self.__sem = asyncio.Semaphore(self.con_limit)
+        self.__client_ctx = aio_session.create_client('s3', **self.__client_kwargs)
+        self.__client = await self.__client_ctx.__aenter__()
+
+    async def __close(self):
+        await self.__client_ctx.__aexit__(None, None, None)
+
+    def __submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.__loop)
+
+    async def __do_call(self, operation: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        body = kwargs.get("Body")
+        if hasattr(body, "read"):
+            # Local files are read out of the event loop of the transport
+            kwargs["Body"] = await asyncio.get_event_loop().run_in_executor(None, body.read)
+        async with self.__sem:
+            result = await getattr(self.__client, operation)(**kwargs)
+            if operation == "get_object":
+                async with result["Body"] as stream:
+                    _check_body_size(kwargs, result)
+                    result["Body"] = await stream.read()
+            return result
+
+    async def __do_download(self, bucket: str, key: str, file_path: str):
+        loop = asyncio.get_event_loop()
+        async with self.__sem:
+            result = await self.__client.get_object(Bucket=bucket, Key=key)
+            with open(file_path, "wb") as f:
+                async with result["Body"] as stream:
+                    while True:
+                        chunk = await stream.read(DOWNLOAD_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        await loop.run_in_executor(None, f.write, chunk)
+
+    async def call(self, operation: str, **kwargs) -> Dict[str, Any]:
+        return await asyncio.wrap_future(self.__submit(self.__do_call(operation, kwargs)))
+
+    def call_sync(self, operation: str, **kwargs) -> Dict[str, Any]:
+        return self.__submit(self.__do_call(operation, kwargs)).result()
+
+    def download_sync(self, bucket: str, key: str, file_path: str):
+        self.__submit(self.__do_download(bucket, key, file_path)).result()
+
+    def close(self):
+        if self.__loop.is_running():
+            try:
+                self.__submit(self.__close()).result()
+            finally:
+                self.__loop.call_soon_threadsafe(self.__loop.stop)
+                self.__thread.join()
+                self.__loop.close()
+
+
+def new_transport(
+    aws_profile=None, endpoint_url=None,
+    config: Optional[Config] = None,
+    con_limit=25, kind: Optional[str] = None
+) -> S3Transport:
+    """Create the S3 transport. The kind of the transport can be "aio",
+    "executor" or "auto", and can also be set with the environment variable
+    charon_s3_transport. The default kind is "executor". The "auto" kind will
+    use the aio transport if aiobotocore is installed, or the executor
+    transport as fallback.
+    """
+    if not kind:
+        kind = os.getenv(TRANSPORT_ENV, TRANSPORT_EXECUTOR)
+    kind = kind.strip().lower()
+    if kind == TRANSPORT_AUTO:
+        kind = TRANSPORT_AIO if AioSession is not None else TRANSPORT_EXECUTOR
+    if kind == TRANSPORT_AIO:
+        logger.debug("[S3] Using aio transport with concurrency %d", con_limit)
+        return AioS3Transport(aws_profile, endpoint_url, config, con_limit)
+    if kind != TRANSPORT_EXECUTOR:
+        logger.warning(
+            "[S3] Unknown transport %s, will use the executor transport", kind
+        )
+    logger.debug("[S3] Using executor transport with concurrency %d", con_limit)
+    return ExecutorS3Transport(aws_profile, endpoint_url, config, con_limit)
+
+
+def _check_body_size(kwargs: Dict[str, Any], result: Dict[str, Any]):
+    size = result.get("ContentLength", 0)
+    if size > MAX_BODY_SIZE:
+        raise ValueError(
+            f"Object {kwargs.get('Key')} of {size} bytes is too big to be read "
+            "in memory, it should be downloaded to a file"
+        )
+
+
+def _get_executor(size: int) -> ThreadPoolExecutor:
+    with _executors_lock:
+        executor = _executors.get(size)
+        if not executor:
+            executor = ThreadPoolExecutor(size, thread_name_prefix="charon-s3")
+            _executors[size] = executor
+        return executor
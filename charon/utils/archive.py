@@ -13,21 +13,29 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+import errno
+import hashlib
 import logging
+import multiprocessing
 import os
 import sys
 import tarfile
-import requests
-import tempfile
+import threading
 import shutil
-import subresource_integrity
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
-from json import load, JSONDecodeError, dump
-from typing import Tuple
-from zipfile import ZipFile, is_zipfile
+from json import loads, JSONDecodeError, dump
+from typing import IO, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from zipfile import ZipFile, ZipInfo, is_zipfile
 from charon.constants import DEFAULT_REGISTRY
-from charon.utils.files import digest, HashType
+from charon.utils.download import get_downloader
+from charon.utils.files import (
+    cached_digests, calculate_digests, digest, digests, integrity, read_sha1,
+    stream_digests, HashType, LocalFiles, DIGEST_CHUNK_SIZE
+)
 from charon.utils.map import del_none
+from charon.utils.remote_zip import HttpRangeFile, is_remote, open_zip_member
+from charon.utils.scheduler import partition_files
 
 logger = logging.getLogger(__name__)
 
@@ -46,40 +54,269 @@ def extract_zip_with_files(zf: ZipFile, target_dir: str, file_suffix: str, debug
     zf.extractall(target_dir, members=filtered)
 
 
+class ZipSource(LocalFiles):
+    """ZipSource serves the members of a zip archive as the files under root,
+    so that they can be scanned and uploaded from the zip stream without
+    being extracted to disk.
+        * The path of a member is its name joined to root. Only the files
+          materialized by materialize() exist on disk.
+        * The sha1 of a member is read from its .sha1 member if there is one,
+          like read_sha1 does for the local files, or digested from the stream.
+          The digests are cached by the fingerprint of the zip and the member
+          name, so they are reused when the same zip is read again.
+        * The zip is opened lazily and shared by the threads. A ZipSource can
+          be sent to worker processes, which open the zip again.
+        * zip_path can be the http(s) url of a remote zip served with Range
+          support, of which only the central directory is fetched on opening,
+          and every member is streamed by its own Range request when opened.
+    """
+
+    def __init__(self, zip_path: str, root: str):
+        self.zip_path = zip_path
+        self.root = root
+        self.__slash_root = root if root.endswith("/") else root + "/"
+        self.__zip: Optional[ZipFile] = None
+        self.__remote: Optional[HttpRangeFile] = None
+        self.__members: Optional[Dict[str, ZipInfo]] = None
+        self.__fingerprint: Optional[str] = None
+        self.__lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"zip_path": self.zip_path, "root": self.root}
+
+    def __setstate__(self, state):
+        self.__init__(state["zip_path"], state["root"])
+
+    def close(self):
+        with self.__lock:
+            if self.__zip:
+                self.__zip.close()
+                self.__zip = None
+            if self.__remote:
+                self.__remote.close()
+                self.__remote = None
+
+    def members(self) -> Dict[str, ZipInfo]:
+        """The file members of the zip by their names"""
+        if self.__members is None:
+            members = {}
+            for info in self.__zipfile().infolist():
+                name = info.filename
+                # The unsafe names are skipped, like extractall does
+                if info.is_dir() or os.path.isabs(name) or ".." in name.split("/"):
+                    continue
+                members[name] = info
+            self.__members = members
+        return self.__members
+
+    def walk(self, top: str) -> Iterator[Tuple[str, List[str], List[str]]]:
+        """Walk the folders of the members top-down like os.walk, where top
+        should be root.
+        """
+        (dirs, files) = self.__tree()
+        pending = [top]
+        while pending:
+            folder = pending.pop()
+            subdirs = sorted(dirs.get(folder, []))
+            yield (folder, subdirs, sorted(files.get(folder, [])))
+            pending.extend(os.path.join(folder, d) for d in reversed(subdirs))
+
+    def is_file(self, path: str) -> bool:
+        return self.__member(path) is not None
+
+    def size(self, path: str) -> int:
+        member = self.__member(path)
+        return member.file_size if member else 0
+
+    def sha1(self, path: str) -> str:
+        member = self.__member(path)
+        if not member:
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+        (_, suffix) = os.path.splitext(path)
+        if suffix not in [".md5", ".sha1", ".sha256", ".sha512"]:
+            sha1_member = self.__member(path + ".sha1")
+            if sha1_member:
+                with self.__open(sha1_member) as f:
+                    return str(f.read(), "utf-8").strip()
+        return self.member_digests(path, [HashType.SHA1])[HashType.SHA1]
+
+    def member_digests(
+        self, path: str, hash_types: Iterable[HashType],
+        calculate: Optional[Callable[[Iterable[HashType]], Dict[HashType, str]]] = None
+    ) -> Dict[HashType, str]:
+        """The digests of the member of path, which are got from the digest
+        cache or calculated by calculate, which digests the member stream by
+        default.
+        """
+        member = self.__member(path)
+        if not member:
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+
+        def digest_stream(hash_types: Iterable[HashType]) -> Dict[HashType, str]:
+            with self.__open(member) as f:
+                return stream_digests(f, hash_types)
+
+        return cached_digests(
+            f"zip:{self.fingerprint()}:{member.filename}",
+            f"{member.CRC:08x}:{member.file_size}",
+            hash_types, calculate if calculate else digest_stream
+        )
+
+    def fingerprint(self) -> str:
+        """The digest of the central directory entries of the zip, which
+        identifies the zip without reading all its content.
+        """
+        if self.__fingerprint is None:
+            sha256 = hashlib.sha256()
+            for info in self.members().values():
+                sha256.update(
+                    f"{info.filename}\0{info.CRC}\0{info.compress_size}\0"
+                    f"{info.file_size}\0{info.header_offset}\n".encode("utf-8")
+                )
+            self.__fingerprint = sha256.hexdigest()
+        return self.__fingerprint
+
+    def open(self, path: str) -> IO[bytes]:
+        member = self.__member(path)
+        if not member:
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+        return self.__open(member)
+
+    def materialize(self, paths: List[str], dirs: List[str]):
+        """Extract the members of paths, which are needed on disk like the
+        archetype-catalog.xml, and create the folders of dirs.
+        """
+        for d in dirs:
+            os.makedirs(d, exist_ok=True)
+        for path in paths:
+            member = self.__member(path)
+            if member:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with self.__open(member) as src, open(path, "wb") as dst:
+                    shutil.copyfileobj(src, dst, DIGEST_CHUNK_SIZE)
+
+    def __member(self, path: str) -> Optional[ZipInfo]:
+        if not path.startswith(self.__slash_root):
+            return None
+        return self.members().get(path[len(self.__slash_root):])
+
+    def __open(self, member: ZipInfo) -> IO[bytes]:
+        zip_file = self.__zipfile()
+        if self.__remote:
+            return open_zip_member(self.__remote, member)
+        return zip_file.open(member)
+
+    def __zipfile(self) -> ZipFile:
+        with self.__lock:
+            if not self.__zip:
+                if is_remote(self.zip_path):
+                    self.__remote = HttpRangeFile(self.zip_path)
+                    self.__zip = ZipFile(self.__remote)
+                else:
+                    self.__zip = ZipFile(self.zip_path)
+            return self.__zip
+
+    def __tree(self) -> Tuple[Dict[str, Set[str]], Dict[str, List[str]]]:
+        dirs: Dict[str, Set[str]] = {}
+        files: Dict[str, List[str]] = {}
+        names = list(self.members().keys())
+        names.extend(
+            i.filename.rstrip("/") + "/" for i in self.__zipfile().infolist() if i.is_dir()
+        )
+        for name in names:
+            parts = [p for p in name.split("/") if p]
+            if not parts or ".." in parts:
+                continue
+            folder = self.root
+            is_dir = name.endswith("/")
+            for part in parts if is_dir else parts[:-1]:
+                dirs.setdefault(folder, set()).add(part)
+                folder = os.path.join(folder, part)
+            if not is_dir:
+                files.setdefault(folder, []).append(parts[-1])
+        return (dirs, files)
+
+
+class ExtractedZipFiles(LocalFiles):
+    """ExtractedZipFiles serves the files extracted from the zip of source to
+    its root. The digests of the files are cached by their zip members like
+    the ones of ZipSource, instead of by their paths which are new for every
+    extraction.
+    """
+
+    def __init__(self, source: ZipSource):
+        self.source = source
+
+    def sha1(self, path: str) -> str:
+        return read_sha1(path, digest_file=self.__digest)
+
+    def close(self):
+        self.source.close()
+
+    def __digest(self, path: str) -> str:
+        if not self.source.is_file(path):
+            return digest(path)
+        return self.source.member_digests(
+            path, [HashType.SHA1], lambda hash_types: calculate_digests(path, hash_types)
+        )[HashType.SHA1]
+
+
+def extract_zip_members(
+    source: ZipSource, paths: List[str], dirs: List[str], workers=1
+):
+    """Extract only the members of paths from the zip of source, and create
+    the folders of dirs, so the members which are not needed are never
+    written to disk.
+        * If workers is more than 1, the members are partitioned by their
+          sizes and extracted by the worker processes, each of which opens
+          the zip with its own handle.
+        * Any error of the extraction is raised, like extractall does.
+    """
+    for d in dirs:
+        os.makedirs(d, exist_ok=True)
+    partitions = partition_files(paths, workers, source.size)
+    if len(partitions) <= 1:
+        source.materialize(paths, [])
+        return
+    logger.info(
+        "Extracting %d files of %s in %d worker processes",
+        len(paths), source.zip_path, len(partitions)
+    )
+    # Spawn the workers, as forking a process with running threads is not safe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(len(partitions), mp_context=context) as executor:
+        futures = [
+            executor.submit(_extract_zip_partition, source, partition)
+            for partition in partitions
+        ]
+        for future in futures:
+            future.result()
+
+
+def _extract_zip_partition(source: ZipSource, paths: List[str]):
+    try:
+        source.materialize(paths, [])
+    finally:
+        source.close()
+
+
 def extract_npm_tarball(
     path: str, target_dir: str, is_for_upload: bool, pkg_root="package", registry=DEFAULT_REGISTRY
 ) -> Tuple[str, list]:
     """ Extract npm tarball will relocate the tgz file and metadata files.
         * Locate tar path ( e.g.: jquery/-/jquery-7.6.1.tgz or @types/jquery/-/jquery-2.2.3.tgz).
         * Locate version metadata path (e.g.: jquery/7.6.1 or @types/jquery/2.2.3).
+        * Only the package.json is read from the tarball stream, and nothing
+          else is extracted. The tgz file is linked to its location instead of
+          being copied if they are on the same file system.
         Result returns the version meta file path and is for following package meta generating.
     """
     valid_paths = []
     package_name_path = str()
-    tgz = tarfile.open(path)
-    pkg_file = None
-    root_pkg_file_exists = True
-    try:
-        root_pkg_path = os.path.join(pkg_root, "package.json")
-        logger.debug(root_pkg_path)
-        pkg_file = tgz.getmember(root_pkg_path)
-        root_pkg_file_exists = pkg_file.isfile()
-    except KeyError:
-        root_pkg_file_exists = False
-        pkg_file = None
-    tgz.extractall()
-    if not root_pkg_file_exists:
-        logger.info(
-            "Root package.json is not found for archive: %s, will search others",
-            path
-        )
-        for f in tgz:
-            if f.name.endswith("package.json"):
-                logger.info("Found package.json as %s", f.path)
-                pkg_file = f
-                break
+    with tarfile.open(path) as tgz:
+        (pkg_file, pkg_content) = __read_npm_package_json(tgz, pkg_root, path)
     if pkg_file:
-        version_data, parse_paths = __parse_npm_package_version_paths(pkg_file.path)
+        version_data, parse_paths = __parse_npm_package_version_paths(pkg_content)
         package_name_path = parse_paths[0]
         os.makedirs(os.path.join(target_dir, parse_paths[0]))
         tarball_parent_path = os.path.join(target_dir, parse_paths[0], "-")
@@ -90,17 +327,15 @@ def extract_npm_tarball(
         valid_paths.append(os.path.join(version_metadata_parent_path, "package.json"))
 
         if is_for_upload:
-            tgz_relative_path = "/".join([parse_paths[0], "-", _get_tgz_name(path)])
-            __write_npm_version_dist(
-                path, pkg_file.path, version_data, tgz_relative_path, registry
-            )
-
             os.makedirs(tarball_parent_path)
             target = os.path.join(tarball_parent_path, os.path.basename(path))
-            shutil.copyfile(path, target)
+            link_or_copy(path, target)
             os.makedirs(version_metadata_parent_path)
-            target = os.path.join(version_metadata_parent_path, os.path.basename(pkg_file.path))
-            shutil.copyfile(pkg_file.path, target)
+            tgz_relative_path = "/".join([parse_paths[0], "-", _get_tgz_name(path)])
+            target = os.path.join(
+                version_metadata_parent_path, os.path.basename(pkg_file.name)
+            )
+            __write_npm_version_dist(path, target, version_data, tgz_relative_path, registry)
     return package_name_path, valid_paths
 
 
@@ -111,24 +346,69 @@ def _get_tgz_name(path: str):
     return ""
 
 
-def __write_npm_version_dist(path: str, version_meta_extract_path: str, version_data: dict,
+def npm_tarball_url(registry: str, tgz_relative_path: str) -> str:
+    """The url of the npm tarball in the registry, which is the dist.tarball
+    of its version metadata.
+    """
+    return "".join(["https://", registry, "/", tgz_relative_path])
+
+
+def link_or_copy(src: str, dst: str):
+    """Hard link dst to src, or copy src to dst if they can not be linked,
+    like on different file systems.
+    """
+    try:
+        os.link(src, dst)
+    except OSError as e:
+        logger.debug("Can not link %s to %s, will copy it: %s", dst, src, e)
+        shutil.copyfile(src, dst)
+
+
+def __read_npm_package_json(
+    tgz: tarfile.TarFile, pkg_root: str, path: str
+) -> Tuple[Optional[tarfile.TarInfo], bytes]:
+    """Find the package.json of pkg_root, or the first package.json if it does
+    not exist, and read it from the tarball stream.
+    """
+    root_pkg_path = os.path.join(pkg_root, "package.json")
+    logger.debug(root_pkg_path)
+    pkg_file = None
+    for f in tgz:
+        if f.name == root_pkg_path and f.isfile():
+            pkg_file = f
+            break
+        if not pkg_file and f.name.endswith("package.json"):
+            pkg_file = f
+    if pkg_file and pkg_file.name != root_pkg_path:
+        logger.info(
+            "Root package.json is not found for archive: %s, will search others",
+            path
+        )
+        logger.info("Found package.json as %s", pkg_file.path)
+    if not pkg_file:
+        return (None, b"")
+    content = tgz.extractfile(pkg_file)
+    if not content:
+        return (None, b"")
+    with content:
+        return (pkg_file, content.read())
+
+
+def __write_npm_version_dist(path: str, version_meta_path: str, version_data: dict,
                              tgz_relative_path: str, registry: str):
     dist = dict()
-    dist["tarball"] = "".join(["https://", registry, "/", tgz_relative_path])
-    dist["shasum"] = digest(path, HashType.SHA1)
-    with open(path, "rb") as tarball:
-        tarball_data = tarball.read()
-        integrity = subresource_integrity.render(tarball_data, ['sha512'])
-        dist["integrity"] = integrity
+    dist["tarball"] = npm_tarball_url(registry, tgz_relative_path)
+    checksums = digests(path, [HashType.SHA1, HashType.SHA512])
+    dist["shasum"] = checksums[HashType.SHA1]
+    dist["integrity"] = integrity(checksums[HashType.SHA512], HashType.SHA512)
     version_data["dist"] = dist
-    with open(version_meta_extract_path, mode='w', encoding='utf-8') as f:
+    with open(version_meta_path, mode='w', encoding='utf-8') as f:
         dump(del_none(version_data), f)
 
 
-def __parse_npm_package_version_paths(path: str) -> Tuple[dict, list]:
+def __parse_npm_package_version_paths(content: bytes) -> Tuple[dict, list]:
     try:
-        with open(path, encoding='utf-8') as version_package:
-            data = load(version_package)
+        data = loads(str(content, encoding='utf-8'))
         package_version_paths = [data['name'], data['version']]
         return data, package_version_paths
     except JSONDecodeError:
@@ -182,24 +462,9 @@ def detect_npm_archive(repo):
     return NpmArchiveType.NOT_NPM
 
 
-def download_archive(url: str, base_dir=None) -> str:
-    dir_ = base_dir
-    if not dir_ or not os.path.isdir(dir_):
-        dir_ = tempfile.mkdtemp()
-        logger.info("No base dir specified for holding archive."
-                    " Will use a temp dir %s to hold archive",
-                    dir_)
-    # Used solution here:
-    # https://stackoverflow.com/questions/16694907/download-large-file-in-python-with-requests
-    local_filename = os.path.join(dir_, url.split('/')[-1])
-    # NOTE the stream=True parameter below
-    # NOTE(2) timeout=30 parameter to set a 30-second timeout, and prevent indefinite hang.
-    with requests.get(url, stream=True, timeout=30, verify=True) as r:
-        r.raise_for_status()
-        with open(local_filename, 'wb') as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                # If you have chunk encoded response uncomment if
-                # and set chunk_size parameter to None.
-                # if chunk:
-                f.write(chunk)
-    return local_filename
+def download_archive(url: str, base_dir=None, checksum: Optional[str] = None) -> str:
+    """Download the archive of url with concurrent Range requests, resuming
+    the partial download and reusing the cached archive if the download cache
+    is enabled. See ArchiveDownloader for details.
+    """
+    return get_downloader().download(url, base_dir=base_dir, checksum=checksum)
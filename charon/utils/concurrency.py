@@ -0,0 +1,159 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# The limit will not be increased if the smoothed latency is worse than
+# LATENCY_TOLERANCE times of the best smoothed latency seen
+LATENCY_TOLERANCE = 2.0
+LATENCY_SMOOTHING = 0.2
+
+
+class AdaptiveLimiter(object):
+    """An AIMD (additive increase, multiplicative decrease) limiter which can be
+    used like an asyncio semaphore with "async with". The limit is increased by
+    one for every limit successful operations when the latency is healthy, and
+    halved when the operations are throttled. Throttles of the operations which
+    were started before the last decrease are counted but will not decrease the
+    limit again, so that one burst of throttle errors only halves it once.
+        * The limiter is thread safe and can be shared by coroutines running in
+          different event loops.
+        * The limit stays between minimum and maximum.
+    """
+
+    def __init__(self, initial: int, minimum=1, maximum: Optional[int] = None):
+        self.__minimum = max(minimum, 1)
+        self.__maximum = max(maximum if maximum else initial, self.__minimum)
+        self.__initial = min(max(initial, self.__minimum), self.__maximum)
+        self.__limit = self.__initial
+        self.__lowest = self.__limit
+        self.__highest = self.__limit
+        self.__in_flight = 0
+        self.__credit = 0.0
+        self.__latency: Optional[float] = None
+        self.__best_latency: Optional[float] = None
+        self.__last_decrease = 0.0
+        self.__throttled = 0
+        self.__waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self.__lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return self.__limit
+
+    async def acquire(self):
+        with self.__lock:
+            if self.__in_flight < self.__limit and not self.__waiters:
+                self.__in_flight += 1
+                return
+            loop = asyncio.get_running_loop()
+            waiter = loop.create_future()
+            self.__waiters.append((loop, waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self.__lock:
+                if (loop, waiter) in self.__waiters:
+                    self.__waiters.remove((loop, waiter))
+                elif not waiter.cancelled():
+                    # The slot was granted before the cancellation
+                    self.__release_locked()
+            raise
+
+    def release(self):
+        with self.__lock:
+            self.__release_locked()
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    def on_success(self, latency: float):
+        """Record the latency of a successful operation"""
+        with self.__lock:
+            if self.__latency is None:
+                self.__latency = latency
+            else:
+                self.__latency += LATENCY_SMOOTHING * (latency - self.__latency)
+            if self.__best_latency is None or self.__latency < self.__best_latency:
+                self.__best_latency = self.__latency
+            if self.__latency > LATENCY_TOLERANCE * self.__best_latency:
+                return
+            self.__credit += 1.0 / self.__limit
+            if self.__credit >= 1.0 and self.__limit < self.__maximum:
+                self.__credit = 0.0
+                self.__limit += 1
+                self.__highest = max(self.__highest, self.__limit)
+                self.__wake_locked()
+
+    def on_throttle(self, started: float):
+        """Record a throttled operation which was started at the time.monotonic()
+        time of started.
+        """
+        with self.__lock:
+            self.__throttled += 1
+            if started < self.__last_decrease:
+                return
+            self.__last_decrease = time.monotonic()
+            self.__credit = 0.0
+            limit = max(self.__limit // 2, self.__minimum)
+            if limit < self.__limit:
+                logger.warning(
+                    "[S3] Requests are throttled, decrease concurrency from %d to %d",
+                    self.__limit, limit
+                )
+                self.__limit = limit
+                self.__lowest = min(self.__lowest, limit)
+
+    def summary(self) -> Dict[str, Any]:
+        with self.__lock:
+            return {
+                "initial": self.__initial,
+                "final": self.__limit,
+                "lowest": self.__lowest,
+                "highest": self.__highest,
+                "throttled": self.__throttled
+            }
+
+    def __release_locked(self):
+        self.__in_flight -= 1
+        self.__wake_locked()
+
+    def __wake_locked(self):
+        while self.__waiters and self.__in_flight < self.__limit:
+            (loop, waiter) = self.__waiters.popleft()
+            self.__in_flight += 1
+            loop.call_soon_threadsafe(self.__grant, waiter)
+
+    def __grant(self, waiter: asyncio.Future):
+        if waiter.cancelled():
+            self.release()
+        else:
+            waiter.set_result(None)
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full jitter exponential backoff delay for the retry attempt, which starts from 1"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
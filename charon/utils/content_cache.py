@@ -0,0 +1,156 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class ContentCache(object):
+    """The ContentCache stores the bodies of remote objects with their ETags,
+    keyed by (bucket, key), so that the cached body can be revalidated by a
+    conditional GET instead of downloading it again.
+        * The memory tier is an LRU limited by max_entries and max_bytes. Bodies
+          bigger than max_bytes are not cached.
+        * If disk_dir is set, the entries are also stored in it, so they can be
+          revalidated in later runs.
+        * The cache is thread safe.
+    """
+
+    def __init__(
+        self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES,
+        disk_dir: Optional[str] = None
+    ):
+        self.__max_entries = max_entries
+        self.__max_bytes = max_bytes
+        self.__disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+        self.__entries: OrderedDict[Tuple[str, str], Tuple[str, bytes]] = OrderedDict()
+        self.__size = 0
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def get(self, bucket: str, key: str) -> Optional[Tuple[str, bytes]]:
+        """Get the cached (etag, body) of the object, or None if not cached"""
+        with self.__lock:
+            entry = self.__entries.get((bucket, key))
+            if entry:
+                self.__entries.move_to_end((bucket, key))
+                return entry
+        entry = self.__read_disk(bucket, key)
+        if entry:
+            with self.__lock:
+                self.__put_memory(bucket, key, entry)
+        return entry
+
+    def put(self, bucket: str, key: str, etag: str, body: bytes):
+        if not etag or len(body) > self.__max_bytes:
+            self.invalidate(bucket, key)
+            return
+        with self.__lock:
+            self.__put_memory(bucket, key, (etag, body))
+        self.__write_disk(bucket, key, etag, body)
+
+    def invalidate(self, bucket: str, key: str):
+        with self.__lock:
+            entry = self.__entries.pop((bucket, key), None)
+            if entry:
+                self.__size -= len(entry[1])
+        disk_file = self.__disk_file(bucket, key)
+        if disk_file and os.path.isfile(disk_file):
+            try:
+                os.remove(disk_file)
+            except FileNotFoundError:
+                pass
+
+    def record_hit(self):
+        with self.__lock:
+            self.hits += 1
+
+    def record_miss(self):
+        with self.__lock:
+            self.misses += 1
+
+    def record_revalidation(self):
+        with self.__lock:
+            self.revalidations += 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self.__lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+                "entries": len(self.__entries),
+                "bytes": self.__size
+            }
+
+    def __put_memory(self, bucket: str, key: str, entry: Tuple[str, bytes]):
+        old = self.__entries.pop((bucket, key), None)
+        if old:
+            self.__size -= len(old[1])
+        self.__entries[(bucket, key)] = entry
+        self.__size += len(entry[1])
+        while self.__entries and (
+            len(self.__entries) > self.__max_entries or self.__size > self.__max_bytes
+        ):
+            (_, (_, body)) = self.__entries.popitem(last=False)
+            self.__size -= len(body)
+
+    def __disk_file(self, bucket: str, key: str) -> Optional[str]:
+        if not self.__disk_dir:
+            return None
+        name = hashlib.sha256("{}/{}".format(bucket, key).encode("utf-8")).hexdigest()
+        return os.path.join(self.__disk_dir, name)
+
+    def __read_disk(self, bucket: str, key: str) -> Optional[Tuple[str, bytes]]:
+        disk_file = self.__disk_file(bucket, key)
+        if not disk_file or not os.path.isfile(disk_file):
+            return None
+        try:
+            with open(disk_file, "rb") as f:
+                content = f.read()
+        except OSError as e:
+            logger.debug("Can not read content cache file %s: %s", disk_file, e)
+            return None
+        (etag, _, body) = content.partition(b"\n")
+        return (etag.decode("utf-8"), body)
+
+    def __write_disk(self, bucket: str, key: str, etag: str, body: bytes):
+        disk_file = self.__disk_file(bucket, key)
+        if not disk_file:
+            return
+        # Written to a temp file first so that readers never see a partial entry
+        (fd, tmp_file) = tempfile.mkstemp(dir=self.__disk_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(etag.encode("utf-8") + b"\n" + body)
+            os.replace(tmp_file, disk_file)
+        except OSError as e:
+            logger.debug("Can not write content cache file %s: %s", disk_file, e)
+            if os.path.isfile(tmp_file):
+                os.remove(tmp_file)
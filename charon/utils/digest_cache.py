@@ -0,0 +1,128 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable
+
+logger = logging.getLogger(__name__)
+
+# The digests are stored by the keys of the contents, which are validated by
+# the validators of the keys, like the stat of a local file
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS content_digests (
+    key TEXT NOT NULL,
+    hash_type TEXT NOT NULL,
+    validator TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (key, hash_type)
+)
+"""
+# The number of puts committed at once, so a run does not sync the database
+# for every file
+COMMIT_BATCH_SIZE = 1000
+
+
+class DigestCache(object):
+    """The DigestCache stores the digests of contents in a SQLite database by
+    their keys. A cached digest is only used if the validator of the key is
+    the same as the time it was digested, like the (dev, inode, size,
+    mtime_ns) of a local file keyed by its path, so a changed or replaced
+    content will always be digested again.
+        * The keys of the zip members are the fingerprints of their zips with
+          their names, so they are reused when a zip is extracted again.
+        * The puts are committed in batches of COMMIT_BATCH_SIZE, and the rest
+          are committed by flush or close.
+        * The cache is thread safe.
+        * The hash types are stored by their names, like "SHA1".
+    """
+
+    def __init__(self, db_path: str):
+        self.__db_path = db_path
+        parent = os.path.dirname(db_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute(_SCHEMA)
+        self.__conn.commit()
+        self.__pending = 0
+        self.__closed = False
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def db_path(self) -> str:
+        return self.__db_path
+
+    def get(self, key: str, validator: str, hash_types: Iterable[str]) -> Dict[str, str]:
+        """Get the cached digests of the key by hash types. The hash types
+        which are not cached for the validator are missing in the result.
+        """
+        hash_types = list(hash_types)
+        with self.__lock:
+            rows = self.__conn.execute(
+                "SELECT hash_type, value FROM content_digests WHERE key = ? "
+                "AND validator = ? AND hash_type IN ({})".format(
+                    ",".join("?" * len(hash_types))
+                ),
+                (key, validator, *hash_types)
+            ).fetchall()
+            result = {hash_type: value for (hash_type, value) in rows}
+            self.hits += len(result)
+            self.misses += len(hash_types) - len(result)
+            return result
+
+    def put(self, key: str, validator: str, values: Dict[str, str]):
+        with self.__lock:
+            self.__conn.executemany(
+                "INSERT OR REPLACE INTO content_digests "
+                "(key, hash_type, validator, value) VALUES (?, ?, ?, ?)",
+                [
+                    (key, hash_type, validator, value)
+                    for (hash_type, value) in values.items()
+                ]
+            )
+            self.__pending += 1
+            if self.__pending >= COMMIT_BATCH_SIZE:
+                self.__commit()
+
+    def flush(self):
+        with self.__lock:
+            self.__commit()
+
+    def log_stats(self):
+        total = self.hits + self.misses
+        logger.debug(
+            "Digest cache %s: %d hits, %d misses, hit rate %.1f%%",
+            self.__db_path, self.hits, self.misses,
+            (self.hits * 100.0 / total) if total else 0.0
+        )
+
+    def close(self):
+        with self.__lock:
+            if self.__closed:
+                return
+            self.__commit()
+            self.__conn.close()
+            self.__closed = True
+
+    def __commit(self):
+        if self.__pending and not self.__closed:
+            self.__conn.commit()
+            self.__pending = 0
@@ -0,0 +1,383 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# "true" to cache the downloaded archives in $HOME/.charon/downloads, or the
+# folder of the cache
+DOWNLOAD_CACHE_ENV = "charon_download_cache"
+# The max size of the download cache in MiB
+DOWNLOAD_CACHE_SIZE_ENV = "charon_download_cache_size"
+DEFAULT_DOWNLOAD_CACHE = "downloads"
+DEFAULT_CACHE_MAX_BYTES = 10 * 1024 * 1024 * 1024
+# The folder under the system temp dir to keep the partial downloads, which
+# are not in the cache or a base dir, so that they can be resumed by the
+# next run
+DEFAULT_PARTIAL_DIR = "charon-partial-downloads"
+
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_CONNECTIONS = 4
+DEFAULT_RETRIES = 3
+DEFAULT_TIMEOUT = 30
+READ_CHUNK_SIZE = 1024 * 1024
+
+STATE_SUFFIX = ".state"
+PART_SUFFIX = ".part"
+META_SUFFIX = ".json"
+
+
+class RemoteInfo(object):
+    """The size and validators of a remote file got by a HEAD request"""
+
+    def __init__(
+        self, size: int, etag: str, last_modified: str, accept_ranges: bool
+    ):
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.accept_ranges = accept_ranges
+
+    def validators(self) -> Dict[str, str]:
+        return {"etag": self.etag, "last_modified": self.last_modified}
+
+
+class ArchiveDownloader(object):
+    """The ArchiveDownloader downloads the remote archives with concurrent
+    HTTP Range requests, and keeps them in a size bounded cache.
+        * The file is split to parts of part_size, which are downloaded by up
+          to connections threads and written to their offsets. The finished
+          parts are recorded in a state file next to the partial file, so an
+          interrupted download is resumed from the missing parts if the ETag
+          and Last-Modified of the remote file are unchanged. Each part is
+          retried up to retries times.
+        * If the server does not support Range requests, or does not report
+          the size, the file is downloaded by a single GET.
+        * If checksum is given as "<algorithm>:<hex digest>" like
+          "sha256:...", the downloaded file is verified against it, and a
+          ValueError is raised if it does not match.
+        * If cache_dir is set, the downloaded files are kept in it by their
+          urls, and reused while the ETag and Last-Modified of the remote
+          file are unchanged. The least recently used files are evicted when
+          the total size of the cache is over max_bytes.
+        * If neither the cache nor a base dir is used, the partial file is
+          kept in partial_dir by its url until it is done, so that the
+          download can be resumed by the next run. partial_dir is under the
+          system temp dir by default.
+    """
+
+    def __init__(
+        self, cache_dir: Optional[str] = None, max_bytes=DEFAULT_CACHE_MAX_BYTES,
+        part_size=DEFAULT_PART_SIZE, connections=DEFAULT_CONNECTIONS,
+        retries=DEFAULT_RETRIES, timeout=DEFAULT_TIMEOUT,
+        partial_dir: Optional[str] = None
+    ):
+        self.cache_dir = cache_dir
+        self.partial_dir = partial_dir if partial_dir else os.path.join(
+            tempfile.gettempdir(), DEFAULT_PARTIAL_DIR
+        )
+        self.max_bytes = max_bytes
+        self.part_size = part_size
+        self.connections = connections
+        self.retries = retries
+        self.timeout = timeout
+        self.__session = requests.Session()
+
+    def download(
+        self, url: str, base_dir: Optional[str] = None, checksum: Optional[str] = None
+    ) -> str:
+        """Download the file of url and return its local path, which is in the
+        cache if it is enabled, or in base_dir, or in a new temp dir.
+        """
+        info = self.head(url)
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            target = os.path.join(self.cache_dir, _cache_name(url))
+            cached = self.__cached(url, target, info)
+            if cached:
+                try:
+                    _verify(cached, checksum, url)
+                    logger.info("Reuse the cached archive %s of %s", cached, url)
+                    return cached
+                except ValueError as e:
+                    logger.warning("The cached archive will be downloaded again: %s", e)
+            part_file = target + PART_SUFFIX
+        elif base_dir and os.path.isdir(base_dir):
+            target = os.path.join(base_dir, _file_name(url))
+            part_file = target + PART_SUFFIX
+        else:
+            dir_ = tempfile.mkdtemp()
+            logger.info("No base dir specified for holding archive."
+                        " Will use a temp dir %s to hold archive",
+                        dir_)
+            target = os.path.join(dir_, _file_name(url))
+            os.makedirs(self.partial_dir, exist_ok=True)
+            part_file = os.path.join(self.partial_dir, _cache_name(url) + PART_SUFFIX)
+
+        if info.accept_ranges and info.size > 0:
+            self.__download_ranges(url, part_file, info)
+        else:
+            self.__download_whole(url, part_file)
+        _verify(part_file, checksum, url)
+        # The partial dir can be in another file system than the target
+        shutil.move(part_file, target)
+        _remove(part_file + STATE_SUFFIX)
+        if self.cache_dir:
+            _write_json(
+                target + META_SUFFIX,
+                {"url": url, "size": os.path.getsize(target), **info.validators()}
+            )
+            self.evict(keep=target)
+        return target
+
+    def head(self, url: str) -> RemoteInfo:
+        try:
+            with self.__session.head(
+                url, allow_redirects=True, timeout=self.timeout, verify=True
+            ) as r:
+                r.raise_for_status()
+                headers = r.headers
+        except requests.RequestException as e:
+            # Some servers do not allow HEAD, so the download goes on without
+            # the validators
+            logger.warning("Can not get the information of %s: %s", url, e)
+            return RemoteInfo(0, "", "", False)
+        size = int(headers.get("Content-Length", 0) or 0)
+        if headers.get("Content-Encoding"):
+            # The length is not of the file itself if it is encoded
+            size = 0
+        return RemoteInfo(
+            size, headers.get("ETag", ""), headers.get("Last-Modified", ""),
+            headers.get("Accept-Ranges", "").lower() == "bytes"
+        )
+
+    def evict(self, keep: Optional[str] = None):
+        """Remove the least recently used files of the cache until the total
+        size is not over max_bytes. The file of keep is never removed.
+        """
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return
+        entries: List[Tuple[float, int, str]] = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if not os.path.isfile(path):
+                continue
+            if name.endswith(META_SUFFIX) or name.endswith(STATE_SUFFIX):
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for (_, size, _) in entries)
+        for (_, size, path) in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            logger.info("Evict the cached archive %s", path)
+            for p in [path, path + META_SUFFIX, path + STATE_SUFFIX]:
+                _remove(p)
+            total -= size
+
+    def __cached(self, url: str, target: str, info: RemoteInfo) -> Optional[str]:
+        if not os.path.isfile(target):
+            return None
+        meta = _read_json(target + META_SUFFIX)
+        if not meta or meta.get("url") != url or meta.get("size") != os.path.getsize(target):
+            return None
+        if not info.etag and not info.last_modified:
+            # Nothing to revalidate the cached file with
+            return None
+        if meta.get("etag") != info.etag or meta.get("last_modified") != info.last_modified:
+            logger.info("The cached archive of %s is changed in remote", url)
+            return None
+        # Touched for the LRU eviction
+        os.utime(target)
+        return target
+
+    def __download_ranges(self, url: str, part_file: str, info: RemoteInfo):
+        state_file = part_file + STATE_SUFFIX
+        ranges = [
+            (start, min(start + self.part_size, info.size) - 1)
+            for start in range(0, info.size, self.part_size)
+        ]
+        done: Set[int] = set()
+        state = _read_json(state_file)
+        validators = info.validators()
+        if (
+            state and os.path.isfile(part_file)
+            and os.path.getsize(part_file) == info.size
+            and state.get("size") == info.size and state.get("part_size") == self.part_size
+            and any(validators.values()) and state.get("validators") == validators
+        ):
+            done = set(state.get("done", []))
+            logger.info(
+                "Resume the download of %s with %d of %d parts done", url, len(done), len(ranges)
+            )
+        else:
+            with open(part_file, "wb") as f:
+                f.truncate(info.size)
+        lock = threading.Lock()
+
+        def fetch(index: int):
+            (start, end) = ranges[index]
+            self.__fetch_range(url, part_file, start, end)
+            with lock:
+                done.add(index)
+                _write_json(state_file, {
+                    "size": info.size, "part_size": self.part_size,
+                    "validators": validators, "done": sorted(done)
+                })
+
+        pending = [i for i in range(len(ranges)) if i not in done]
+        logger.info(
+            "Downloading %s (%d bytes) in %d parts with %d connections",
+            url, info.size, len(pending), self.connections
+        )
+        with ThreadPoolExecutor(max(self.connections, 1)) as executor:
+            for future in [executor.submit(fetch, i) for i in pending]:
+                future.result()
+
+    def __fetch_range(self, url: str, part_file: str, start: int, end: int):
+        for attempt in range(self.retries + 1):
+            offset = start
+            try:
+                with self.__session.get(
+                    url, headers={"Range": f"bytes={start}-{end}"}, stream=True,
+                    timeout=self.timeout, verify=True
+                ) as r:
+                    r.raise_for_status()
+                    if r.status_code != 206:
+                        raise requests.RequestException(
+                            f"Range request is not supported, got status {r.status_code}"
+                        )
+                    with open(part_file, "r+b") as f:
+                        f.seek(start)
+                        for chunk in r.iter_content(chunk_size=READ_CHUNK_SIZE):
+                            f.write(chunk)
+                            offset += len(chunk)
+                if offset != end + 1:
+                    raise requests.RequestException(
+                        f"Got {offset - start} bytes for range {start}-{end}"
+                    )
+                return
+            except requests.RequestException as e:
+                if attempt >= self.retries:
+                    raise
+                logger.warning(
+                    "Failed to download range %d-%d of %s, will retry: %s", start, end, url, e
+                )
+
+    def __download_whole(self, url: str, part_file: str):
+        for attempt in range(self.retries + 1):
+            try:
+                with self.__session.get(url, stream=True, timeout=self.timeout, verify=True) as r:
+                    r.raise_for_status()
+                    with open(part_file, "wb") as f:
+                        for chunk in r.iter_content(chunk_size=READ_CHUNK_SIZE):
+                            f.write(chunk)
+                return
+            except requests.RequestException as e:
+                if attempt >= self.retries:
+                    raise
+                logger.warning("Failed to download %s, will retry: %s", url, e)
+
+
+def get_downloader() -> ArchiveDownloader:
+    """Get the downloader with the cache configured by the charon_download_cache
+       and charon_download_cache_size environment variables.
+    """
+    setting = os.getenv(DOWNLOAD_CACHE_ENV, "").strip()
+    cache_dir = None
+    if setting and setting.lower() != "false":
+        cache_dir = setting
+        if setting.lower() == "true":
+            cache_dir = os.path.join(os.getenv("HOME", ""), ".charon", DEFAULT_DOWNLOAD_CACHE)
+    max_bytes = DEFAULT_CACHE_MAX_BYTES
+    size = os.getenv(DOWNLOAD_CACHE_SIZE_ENV, "").strip()
+    if size:
+        try:
+            max_bytes = int(size) * 1024 * 1024
+        except ValueError:
+            logger.warning(
+                "Invalid %s %s, will use the default size", DOWNLOAD_CACHE_SIZE_ENV, size
+            )
+    return ArchiveDownloader(cache_dir=cache_dir, max_bytes=max_bytes)
+
+
+def _verify(path: str, checksum: Optional[str], url: str):
+    if not checksum:
+        return
+    (algorithm, _, expected) = checksum.partition(":")
+    if not expected:
+        raise ValueError(
+            f"Invalid checksum {checksum}, should be like <algorithm>:<hex digest>"
+        )
+    hash_obj = hashlib.new(algorithm.strip().lower())
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(READ_CHUNK_SIZE)
+            if not data:
+                break
+            hash_obj.update(data)
+    actual = hash_obj.hexdigest()
+    if actual != expected.strip().lower():
+        for p in [path, path + STATE_SUFFIX, path + META_SUFFIX]:
+            _remove(p)
+        raise ValueError(
+            f"The {algorithm} checksum {actual} of {url} does not match {expected}"
+        )
+
+
+def _cache_name(url: str) -> str:
+    digest = hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
+    return f"{digest}-{_file_name(url)}"
+
+
+def _file_name(url: str) -> str:
+    return urlsplit(url).path.split("/")[-1] or "archive"
+
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path: str, data: Dict[str, Any]):
+    # Written to a temp file first so that readers never see a partial file
+    tmp_file = path + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_file, path)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
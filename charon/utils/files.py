@@ -14,11 +14,31 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 from enum import Enum
+import atexit
 import os
+import base64
 import hashlib
 import errno
-from typing import List, Tuple
+import mmap
+import threading
+from typing import IO, Callable, Dict, Iterable, List, Optional, Tuple
 from charon.constants import MANIFEST_SUFFIX
+from charon.utils.digest_cache import DigestCache
+
+# Files are hashed in chunks of DIGEST_CHUNK_SIZE. Files bigger than it are
+# memory mapped, so the chunks are hashed without being copied. hashlib
+# releases the GIL when hashing big chunks, so files can be hashed in
+# parallel threads.
+DIGEST_CHUNK_SIZE = 1024 * 1024
+
+# The digest cache is enabled by this environment variable, which can be
+# "true" to use $HOME/.charon/digest_cache.db, or the path of the database
+DIGEST_CACHE_ENV = "charon_digest_cache"
+DEFAULT_DIGEST_CACHE = "digest_cache.db"
+
+_digest_cache: Optional[DigestCache] = None
+_digest_cache_setting = ""
+_digest_cache_lock = threading.Lock()
 
 
 class HashType(Enum):
@@ -52,12 +72,13 @@ def overwrite_file(file_path: str, content: str):
         f.write(content)
 
 
-def read_sha1(file: str) -> str:
+def read_sha1(file: str, digest_file: Optional[Callable[[str], str]] = None) -> str:
     """This function will read sha1 hash of a file from a ${file}.sha1 file first, which should
     contain the sha1 has of the file. This is a maven repository rule which contains .sha1 files
     for artifact files. We can use this to avoid the digestion of big files which will improve
     performance. BTW, for some files like .md5, .sha1 and .sha256, they don't have .sha1 files as
-    they are used for hashing, so we will directly calculate its sha1 hash through digesting.
+    they are used for hashing, so we will directly calculate its sha1 hash through digesting,
+    which is done by digest_file if it is set, or by digest.
     """
     if os.path.isfile(file):
         non_search_suffix = [".md5", ".sha1", ".sha256", ".sha512"]
@@ -67,24 +88,151 @@ def read_sha1(file: str) -> str:
             if os.path.isfile(sha1_file):
                 with open(sha1_file, encoding="utf-8") as f:
                     return f.read().strip()
-        return digest(file)
+        return digest_file(file) if digest_file else digest(file)
     else:
         raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), file)
 
 
+class LocalFiles(object):
+    """The source of the files to upload, which reads them from the local file
+    system. Other sources, like the members of an archive, can be uploaded by
+    S3Client with the same paths by overriding these methods.
+    """
+
+    def is_file(self, path: str) -> bool:
+        return os.path.isfile(path)
+
+    def size(self, path: str) -> int:
+        """The size of the file, and 0 if it is missing"""
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    def sha1(self, path: str) -> str:
+        return read_sha1(path)
+
+    def open(self, path: str) -> IO[bytes]:
+        return open(path, "rb")
+
+    def close(self):
+        """Release the resources held by the source"""
+
+
+LOCAL_FILES = LocalFiles()
+
+
 def digest(file: str, hash_type=HashType.SHA1) -> str:
-    hash_obj = _hash_object(hash_type)
+    return digests(file, [hash_type])[hash_type]
+
+
+def digests(file: str, hash_types: Iterable[HashType]) -> Dict[HashType, str]:
+    """This function will caculate the hash values of the file for all the
+       hash types in one pass of reading, and return the hex values by type.
+       If the digest cache is enabled, only the hash values not cached will be
+       calculated.
+    """
+    if not get_digest_cache():
+        return calculate_digests(file, hash_types)
+    path = os.path.abspath(file)
+    stat = os.stat(path)
+    return cached_digests(
+        path, f"{stat.st_dev}:{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}",
+        hash_types, lambda types: calculate_digests(path, types)
+    )
 
-    # BUF_SIZE is totally arbitrary, change for your app!
-    BUF_SIZE = 65536  # lets read stuff in 64kb chunks!
+
+def cached_digests(
+    key: str, validator: str, hash_types: Iterable[HashType],
+    calculate: Callable[[Iterable[HashType]], Dict[HashType, str]]
+) -> Dict[HashType, str]:
+    """Get the hash values of the content of key from the digest cache if it
+       is enabled, where validator should change with the content, and only
+       the missing ones are calculated by calculate.
+    """
+    hash_types = set(hash_types)
+    cache = get_digest_cache()
+    if not cache:
+        return calculate(hash_types)
+    cached = cache.get(key, validator, [t.name for t in hash_types])
+    result = {t: cached[t.name] for t in hash_types if t.name in cached}
+    missing = hash_types - set(result.keys())
+    if missing:
+        calculated = calculate(missing)
+        cache.put(key, validator, {t.name: v for (t, v) in calculated.items()})
+        result.update(calculated)
+    return result
+
+
+def get_digest_cache() -> Optional[DigestCache]:
+    """Get the digest cache if it is enabled by the charon_digest_cache
+       environment variable.
+    """
+    global _digest_cache, _digest_cache_setting
+    setting = os.getenv(DIGEST_CACHE_ENV, "").strip()
+    with _digest_cache_lock:
+        if _digest_cache and setting == _digest_cache_setting:
+            return _digest_cache
+        if _digest_cache:
+            atexit.unregister(_digest_cache.close)
+            _digest_cache.close()
+            _digest_cache = None
+        _digest_cache_setting = setting
+        if setting == "" or setting.lower() == "false":
+            return None
+        db_path = setting
+        if setting.lower() == "true":
+            db_path = os.path.join(os.getenv("HOME", ""), ".charon", DEFAULT_DIGEST_CACHE)
+        _digest_cache = DigestCache(db_path)
+        # The digests put by the end of the process are committed
+        atexit.register(_digest_cache.close)
+        return _digest_cache
+
+
+def flush_digest_cache():
+    cache = _digest_cache
+    if cache:
+        cache.flush()
+
+
+def log_digest_cache_stats():
+    cache = _digest_cache
+    if cache:
+        cache.flush()
+        cache.log_stats()
+
+
+def calculate_digests(file: str, hash_types: Iterable[HashType]) -> Dict[HashType, str]:
+    """Calculate the hash values of the file without the digest cache"""
+    hash_objs = {t: _hash_object(t) for t in hash_types}
     with open(file, "rb") as f:
-        while True:
-            data = f.read(BUF_SIZE)
-            if not data:
-                break
-            hash_obj.update(data)
+        size = os.fstat(f.fileno()).st_size
+        if size > DIGEST_CHUNK_SIZE:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                with memoryview(m) as view:
+                    for offset in range(0, size, DIGEST_CHUNK_SIZE):
+                        with view[offset:offset + DIGEST_CHUNK_SIZE] as chunk:
+                            for hash_obj in hash_objs.values():
+                                hash_obj.update(chunk)
+        else:
+            # Small files, or files which size is unknown, like pipes
+            while True:
+                data = f.read(DIGEST_CHUNK_SIZE)
+                if not data:
+                    break
+                for hash_obj in hash_objs.values():
+                    hash_obj.update(data)
+    return {t: h.hexdigest() for (t, h) in hash_objs.items()}
 
-    return hash_obj.hexdigest()
+
+def integrity(hex_digest: str, hash_type=HashType.SHA512) -> str:
+    """Render the hex digest as the subresource integrity string, which is
+       used as the npm dist integrity, like "sha512-<base64 of digest>"
+    """
+    return "{}-{}".format(
+        hash_type.name.lower(),
+        base64.b64encode(bytes.fromhex(hex_digest)).decode("ascii")
+    )
 
 
 def digest_content(content: str, hash_type=HashType.SHA1) -> str:
@@ -96,6 +244,18 @@ def digest_content(content: str, hash_type=HashType.SHA1) -> str:
     return hash_obj.hexdigest()
 
 
+def stream_digests(f: IO[bytes], hash_types: Iterable[HashType]) -> Dict[HashType, str]:
+    """Calculate the hash values of the content read from the stream"""
+    hash_objs = {t: _hash_object(t) for t in hash_types}
+    while True:
+        data = f.read(DIGEST_CHUNK_SIZE)
+        if not data:
+            break
+        for h in hash_objs.values():
+            h.update(data)
+    return {t: h.hexdigest() for (t, h) in hash_objs.items()}
+
+
 def _hash_object(hash_type: HashType):
     hash_obj = None
     if hash_type == HashType.SHA1:
@@ -0,0 +1,212 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import bisect
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _BucketListing(object):
+    def __init__(self):
+        # The sorted prefixes whose keys are all listed into keys, where none
+        # of them is under another one
+        self.complete: List[str] = []
+        # The sorted keys under the complete prefixes
+        self.keys: List[str] = []
+        # The delimiter listings of folders, with both the files and subfolders
+        self.folders: Dict[str, Set[str]] = {}
+        # The results of single key existence checks
+        self.known: Dict[str, bool] = {}
+
+    def covering(self, prefix: str) -> Optional[str]:
+        # As the complete prefixes are not under each other, only the last one
+        # sorted before the prefix can be a parent of it
+        i = bisect.bisect_right(self.complete, prefix)
+        if i > 0 and prefix.startswith(self.complete[i - 1]):
+            return self.complete[i - 1]
+        return None
+
+    def keys_under(self, prefix: str) -> List[str]:
+        (start, end) = _prefix_range(self.keys, prefix)
+        return self.keys[start:end]
+
+    def has_key(self, key: str) -> bool:
+        i = bisect.bisect_left(self.keys, key)
+        return i < len(self.keys) and self.keys[i] == key
+
+    def put_keys(self, prefix: str, keys: Iterable[str]):
+        """Replace the keys under the prefix, which also covers the complete
+        prefixes under it.
+        """
+        (start, end) = _prefix_range(self.keys, prefix)
+        self.keys[start:end] = sorted(set(k for k in keys if k.startswith(prefix)))
+        (start, end) = _prefix_range(self.complete, prefix)
+        self.complete[start:end] = [prefix]
+
+
+class ListingCache(object):
+    """The ListingCache keeps the S3 listings fetched during one run, so that
+    the same prefix is listed only once. A query is served from any listing
+    which covers it, like a folder listing from the recursive listing of one
+    of its parent prefixes.
+        * The cache should be patched with add and remove for every key written
+          or deleted during the run, as it is never revalidated with S3.
+        * Folders are "" for the root or end with "/", and the folder contents
+          are in the same form as the S3 delimiter listing, which means the
+          keys of the files and the prefixes of the subfolders.
+        * The cache is thread safe.
+    """
+
+    def __init__(self):
+        self.__buckets: Dict[str, _BucketListing] = {}
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_keys(self, bucket: str, prefix: str) -> Optional[List[str]]:
+        """Get all keys starting with the prefix, or None if not cached"""
+        with self.__lock:
+            listing = self.__buckets.get(bucket)
+            if listing is None or listing.covering(prefix) is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return listing.keys_under(prefix)
+
+    def put_keys(self, bucket: str, prefix: str, keys: Iterable[str]):
+        with self.__lock:
+            listing = self.__listing(bucket)
+            if listing.covering(prefix) is not None:
+                return
+            listing.put_keys(prefix, keys)
+
+    def get_folder(self, bucket: str, folder: str) -> Optional[List[str]]:
+        """Get the contents of the folder, or None if not cached"""
+        with self.__lock:
+            listing = self.__buckets.get(bucket)
+            if listing is None:
+                self.misses += 1
+                return None
+            contents = listing.folders.get(folder)
+            if contents is None and listing.covering(folder) is not None:
+                contents = set(_child(folder, k) for k in listing.keys_under(folder))
+            if contents is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            # Subfolders go first, like the S3 delimiter listing
+            return sorted(c for c in contents if c.endswith("/")) + \
+                sorted(c for c in contents if not c.endswith("/"))
+
+    def put_folder(self, bucket: str, folder: str, contents: Iterable[str]):
+        with self.__lock:
+            self.__listing(bucket).folders[folder] = set(contents)
+
+    def exists(self, bucket: str, key: str) -> Optional[bool]:
+        """Check if the key exists, or None if it is not known"""
+        with self.__lock:
+            listing = self.__buckets.get(bucket)
+            result = None
+            if listing is not None:
+                parent = _parent(key)
+                if key in listing.known:
+                    result = listing.known[key]
+                elif listing.covering(key) is not None:
+                    result = listing.has_key(key)
+                elif parent in listing.folders:
+                    result = key in listing.folders[parent]
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return result
+
+    def put_exists(self, bucket: str, key: str, existed: bool):
+        with self.__lock:
+            self.__listing(bucket).known[key] = existed
+
+    def add(self, bucket: str, key: str):
+        """Patch the cache with a key written to the bucket"""
+        with self.__lock:
+            listing = self.__buckets.get(bucket)
+            if listing is None:
+                return
+            listing.known[key] = True
+            if listing.covering(key) is not None and not listing.has_key(key):
+                bisect.insort(listing.keys, key)
+            for folder in _ancestors(key):
+                contents = listing.folders.get(folder)
+                if contents is not None:
+                    contents.add(_child(folder, key))
+
+    def remove(self, bucket: str, key: str):
+        """Patch the cache with a key deleted from the bucket. The parent
+        folders of the key's parent folder are not known to be empty or not,
+        so their listings are dropped.
+        """
+        with self.__lock:
+            listing = self.__buckets.get(bucket)
+            if listing is None:
+                return
+            listing.known[key] = False
+            i = bisect.bisect_left(listing.keys, key)
+            if i < len(listing.keys) and listing.keys[i] == key:
+                del listing.keys[i]
+            parent = _parent(key)
+            for folder in _ancestors(key):
+                if folder == parent:
+                    listing.folders.get(folder, set()).discard(key)
+                else:
+                    listing.folders.pop(folder, None)
+
+    def summary(self) -> Dict[str, Any]:
+        with self.__lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def __listing(self, bucket: str) -> _BucketListing:
+        listing = self.__buckets.get(bucket)
+        if listing is None:
+            listing = _BucketListing()
+            self.__buckets[bucket] = listing
+        return listing
+
+
+def _prefix_range(items: List[str], prefix: str) -> Tuple[int, int]:
+    """The range of the sorted items which start with the prefix"""
+    start = bisect.bisect_left(items, prefix)
+    return (start, bisect.bisect_left(items, prefix + "\U0010ffff", lo=start))
+
+
+def _parent(key: str) -> str:
+    return key.rsplit("/", 1)[0] + "/" if "/" in key else ""
+
+
+def _ancestors(key: str) -> List[str]:
+    folders = [""]
+    parts = key.split("/")[:-1]
+    for i in range(len(parts)):
+        folders.append("/".join(parts[:i + 1]) + "/")
+    return folders
+
+
+def _child(folder: str, key: str) -> str:
+    """The entry of the key in the delimiter listing of the folder"""
+    rest = key[len(folder):]
+    if "/" in rest:
+        return folder + rest.split("/", 1)[0] + "/"
+    return key
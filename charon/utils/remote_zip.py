@@ -0,0 +1,225 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import io
+import logging
+import struct
+from typing import IO, Optional
+from zipfile import (
+    BadZipFile, ZipExtFile, ZipInfo, sizeFileHeader, stringFileHeader, structFileHeader
+)
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_RETRIES = 3
+DEFAULT_POOL_SIZE = 32
+# The min size of a Range request which is not limited to an end, like the
+# requests to read the central directory
+MIN_REQUEST_SIZE = 64 * 1024
+# A forward seek in the open response is done by skipping the bytes if it is
+# not longer than this
+MAX_SKIP_SIZE = 64 * 1024
+# The local header of a member can have a longer extra field than the one in
+# the central directory, so the request of a member goes a bit further
+HEADER_SLACK = 1024
+
+
+def is_remote(path: str) -> bool:
+    return path.startswith("http://") or path.startswith("https://")
+
+
+def new_session(pool_size=DEFAULT_POOL_SIZE) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class HttpRangeFile(io.RawIOBase):
+    """HttpRangeFile is a seekable read-only file of a remote url, which is
+    read with HTTP Range requests, so that a ZipFile can be opened on it to
+    read only the central directory of a remote zip.
+        * The reads from one position on are served by one streaming response,
+          which is requested again only after a seek to another position. The
+          requests are limited to end if it is set, or to the size of the read.
+        * A broken response is requested again from the current position, up
+          to retries times.
+        * An OSError is raised if the server does not support Range requests.
+        * clone() opens another file of the same url and session, so that the
+          members can be read in parallel by their own responses.
+    """
+
+    def __init__(
+        self, url: str, session: Optional[requests.Session] = None,
+        size: Optional[int] = None, end: Optional[int] = None,
+        timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES
+    ):
+        super().__init__()
+        self.url = url
+        self.timeout = timeout
+        self.retries = retries
+        self.__session = session if session else new_session()
+        self.size = size if size is not None else self.__head()
+        self.__end = min(end, self.size) if end is not None else None
+        self.__pos = 0
+        self.__response: Optional[requests.Response] = None
+        self.__response_pos = 0
+        self.__response_end = 0
+
+    def clone(self, end: Optional[int] = None) -> "HttpRangeFile":
+        return HttpRangeFile(
+            self.url, session=self.__session, size=self.size, end=end,
+            timeout=self.timeout, retries=self.retries
+        )
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.__pos
+
+    def seek(self, offset: int, whence=io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self.__pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence {whence}")
+        if pos < 0:
+            raise ValueError(f"Negative seek position {pos}")
+        self.__pos = pos
+        return pos
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast("B")
+        filled = 0
+        while filled < len(view) and self.__pos < self.size:
+            data = self.__read(len(view) - filled)
+            view[filled:filled + len(data)] = data
+            filled += len(data)
+            self.__pos += len(data)
+        return filled
+
+    def close(self):
+        self.__drop()
+        super().close()
+
+    def __read(self, size: int) -> bytes:
+        for attempt in range(self.retries + 1):
+            try:
+                self.__prepare(size)
+                response = self.__response
+                assert response is not None
+                data = response.raw.read(
+                    min(size, self.__response_end - self.__response_pos), decode_content=False
+                )
+                if not data:
+                    raise requests.ConnectionError(
+                        f"Response of {self.url} ended at {self.__response_pos}"
+                    )
+                self.__response_pos += len(data)
+                return data
+            except (requests.RequestException, HTTPError, OSError) as e:
+                self.__drop()
+                if attempt >= self.retries:
+                    raise
+                logger.warning(
+                    "Failed to read %s at %d, will retry: %s", self.url, self.__pos, e
+                )
+        return b""
+
+    def __prepare(self, size: int):
+        """Make the open response at the current position, by skipping the
+        bytes to it or by requesting the range from it.
+        """
+        response = self.__response
+        if response is not None:
+            gap = self.__pos - self.__response_pos
+            if 0 <= gap <= MAX_SKIP_SIZE and self.__pos < self.__response_end:
+                while self.__response_pos < self.__pos:
+                    skipped = response.raw.read(self.__pos - self.__response_pos)
+                    if not skipped:
+                        break
+                    self.__response_pos += len(skipped)
+                if self.__response_pos == self.__pos:
+                    return
+            self.__drop()
+        end = self.__end if self.__end and self.__end > self.__pos else None
+        if end is None:
+            end = self.__pos + max(size, MIN_REQUEST_SIZE)
+        end = min(end, self.size)
+        response = self.__session.get(
+            self.url, headers={"Range": f"bytes={self.__pos}-{end - 1}"},
+            stream=True, timeout=self.timeout
+        )
+        if response.status_code != 206:
+            response.close()
+            response.raise_for_status()
+            raise OSError(
+                f"Range requests are not supported by {self.url}, got {response.status_code}"
+            )
+        self.__response = response
+        self.__response_pos = self.__pos
+        self.__response_end = end
+
+    def __drop(self):
+        if self.__response is not None:
+            self.__response.close()
+            self.__response = None
+
+    def __head(self) -> int:
+        with self.__session.head(self.url, allow_redirects=True, timeout=self.timeout) as r:
+            r.raise_for_status()
+            if r.headers.get("Accept-Ranges", "").lower() != "bytes":
+                raise OSError(f"Range requests are not supported by {self.url}")
+            return int(r.headers.get("Content-Length", 0))
+
+
+def open_zip_member(fp: HttpRangeFile, member: ZipInfo) -> IO[bytes]:
+    """Open the member of the remote zip of fp to read its content, which is
+    streamed by its own response from the local header to the end of the
+    compressed data.
+    """
+    name_size = len(member.orig_filename.encode("utf-8"))
+    end = (
+        member.header_offset + sizeFileHeader + name_size + len(member.extra)
+        + member.compress_size + HEADER_SLACK
+    )
+    member_fp = fp.clone(end=end)
+    try:
+        member_fp.seek(member.header_offset)
+        header = member_fp.read(sizeFileHeader)
+        if len(header) != sizeFileHeader:
+            raise BadZipFile(f"Truncated file header of {member.filename}")
+        fields = struct.unpack(structFileHeader, header)
+        if fields[0] != stringFileHeader:
+            raise BadZipFile(f"Bad magic number for file header of {member.filename}")
+        # Skip the file name and the extra field of the local header
+        member_fp.seek(fields[10] + fields[11], io.SEEK_CUR)
+        return ZipExtFile(member_fp, "r", member, None, True)
+    except Exception:
+        member_fp.close()
+        raise
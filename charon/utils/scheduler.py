@@ -0,0 +1,173 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import asyncio
+import heapq
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def get_or_create_event_loop() -> asyncio.AbstractEventLoop:
+    """Get the event loop of current thread, or create and set one if the
+    thread does not have it, like the threads other than the main thread.
+    """
+    try:
+        loop = asyncio.get_event_loop()
+        if not loop.is_closed():
+            return loop
+    except RuntimeError:
+        pass
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    return loop
+
+
+async def schedule(
+    items: Iterable[T],
+    worker: Callable[[T], Awaitable[Any]],
+    workers: int,
+    order_key: Optional[Callable[[T], Any]] = None
+):
+    """Run the worker for every item with at most workers items in progress.
+    The items are pulled from the iterable only when a worker is free, so the
+    number of pending coroutines does not grow with the number of items.
+        * If order_key is set, the items are handled from the largest key to the
+          smallest one, which needs the items to be sorted first.
+        * If a worker raises an error, the other workers are cancelled and the
+          error is raised.
+    """
+    if order_key:
+        items = sorted(items, key=order_key, reverse=True)
+    iterator = iter(items)
+
+    async def consume():
+        # All consumers pull from the same iterator, which is safe as
+        # they run in the same event loop
+        for item in iterator:
+            await worker(item)
+
+    tasks = [asyncio.ensure_future(consume()) for _ in range(max(workers, 1))]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+class BoundedQueue(object):
+    """Run the worker for the items put into the queue with at most workers
+    items in progress. put waits while maxsize items are waiting, so the
+    pending items do not grow with the number of items put by the producers.
+        * The consumers are started by the first put, in the event loop of the
+          caller, and join should be awaited in the same event loop.
+        * If a worker raises an error, the rest of the items are dropped so the
+          producers are not blocked, and the error is raised by join.
+    """
+
+    def __init__(
+        self, worker: Callable[[T], Awaitable[Any]], workers: int,
+        maxsize: Optional[int] = None
+    ):
+        self.__worker = worker
+        self.__workers = max(workers, 1)
+        self.__maxsize = maxsize if maxsize is not None else self.__workers
+        self.__queue: Optional[asyncio.Queue] = None
+        self.__consumers: List[asyncio.Future] = []
+        self.__error: Optional[BaseException] = None
+
+    async def put(self, item: T):
+        if self.__queue is None:
+            self.__queue = asyncio.Queue(maxsize=self.__maxsize)
+            self.__consumers = [
+                asyncio.ensure_future(self.__consume()) for _ in range(self.__workers)
+            ]
+        await self.__queue.put((item,))
+
+    async def join(self):
+        """Wait for all items put to be done"""
+        if self.__queue is None:
+            return
+        for _ in self.__consumers:
+            await self.__queue.put(None)
+        await asyncio.gather(*self.__consumers)
+        self.__queue = None
+        if self.__error:
+            raise self.__error
+
+    async def __consume(self):
+        assert self.__queue is not None
+        while True:
+            entry = await self.__queue.get()
+            if entry is None:
+                return
+            if self.__error:
+                continue
+            try:
+                await self.__worker(entry[0])
+            except Exception as e:  # pylint: disable=broad-except
+                self.__error = e
+
+
+def run_scheduled(
+    items: Iterable[T],
+    worker: Callable[[T], Awaitable[Any]],
+    workers: int,
+    order_key: Optional[Callable[[T], Any]] = None
+):
+    """Run schedule in the event loop of current thread until all items are done"""
+    loop = get_or_create_event_loop()
+    loop.run_until_complete(schedule(items, worker, workers, order_key))
+
+
+def file_size(file_path: str) -> int:
+    """The size of the file as the order_key for largest first scheduling, the
+    missing files are treated as empty ones.
+    """
+    try:
+        return os.path.getsize(file_path)
+    except OSError:
+        return 0
+
+
+def partition_files(
+    file_paths: List[str], parts: int, size_of: Callable[[str], int] = file_size,
+    group_of: Optional[Callable[[str], str]] = None
+) -> List[List[str]]:
+    """Split the files into at most parts partitions of about the same total
+    size. The files are assigned from the largest one to the partition which
+    is the smallest at that time, and the empty partitions are dropped. The
+    sizes are got by size_of, which is the local file size by default.
+        * If group_of is set, the files of the same group are kept in the same
+          partition, and the groups are assigned by their total sizes instead.
+    """
+    groups: Dict[str, List[str]] = {}
+    for path in file_paths:
+        groups.setdefault(group_of(path) if group_of else path, []).append(path)
+    group_sizes = {g: sum(size_of(p) for p in paths) for (g, paths) in groups.items()}
+    parts = max(min(parts, len(groups)), 1)
+    partitions: List[List[str]] = [[] for _ in range(parts)]
+    sizes: List[Tuple[int, int]] = [(0, i) for i in range(parts)]
+    for group in sorted(groups, key=lambda g: group_sizes[g], reverse=True):
+        (size, i) = heapq.heappop(sizes)
+        partitions[i].extend(sorted(groups[group], key=size_of, reverse=True))
+        heapq.heappush(sizes, (size + group_sizes[group], i))
+    return [p for p in partitions if p]
@@ -0,0 +1,194 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# The path of the file to write the traced spans in the Chrome trace format,
+# which can be opened by chrome://tracing, Perfetto or other timeline viewers
+TRACE_FILE_ENV = "charon_trace_file"
+
+
+def _peak_rss() -> int:
+    """The peak resident set size of the process in bytes"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, and in kilobytes on Linux
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Span(object):
+    """A span measures one stage of the process with its wall time, CPU time
+    and peak RSS. It is used as a context manager, and the item counts of the
+    stage can be added with set().
+    """
+
+    def __init__(self, tracer: "Tracer", name: str, args: Dict[str, Any]):
+        self.__tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0.0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.thread_cpu = 0.0
+        self.peak_rss = 0
+        self.thread = ""
+        self.tid = 0
+        self.__cpu = 0.0
+        self.__thread_cpu = 0.0
+
+    def set(self, **counts):
+        self.args.update(counts)
+
+    def __enter__(self) -> "Span":
+        self.thread = threading.current_thread().name
+        self.tid = threading.get_ident()
+        self.__cpu = time.process_time()
+        self.__thread_cpu = time.thread_time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.wall = time.perf_counter() - self.start
+        self.cpu = time.process_time() - self.__cpu
+        self.thread_cpu = time.thread_time() - self.__thread_cpu
+        self.peak_rss = _peak_rss()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.__tracer.add(self)
+        logger.debug(
+            "Stage %s %s done in %.3fs, CPU %.3fs",
+            self.name, self.args, self.wall, self.cpu
+        )
+
+
+class Tracer(object):
+    """The Tracer collects the finished spans of the process.
+        * The cpu_ms of a span is the CPU time of the whole process, which
+          includes the work of other threads, like the concurrent targets. The
+          thread_cpu_ms only counts the thread which runs the span.
+        * The tracer is thread safe.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__spans: List[Span] = []
+        self.__origin = time.perf_counter()
+
+    def span(self, name: str, **args) -> Span:
+        return Span(self, name, args)
+
+    def add(self, span: Span):
+        with self.__lock:
+            self.__spans.append(span)
+
+    def spans(self) -> List[Span]:
+        with self.__lock:
+            return list(self.__spans)
+
+    def reset(self):
+        with self.__lock:
+            self.__spans = []
+            self.__origin = time.perf_counter()
+
+    def events(self) -> List[Dict[str, Any]]:
+        """The spans as complete events of the Chrome trace event format, with
+        the thread names as metadata events.
+        """
+        pid = os.getpid()
+        events: List[Dict[str, Any]] = []
+        threads: Dict[int, str] = {}
+        for span in sorted(self.spans(), key=lambda s: s.start):
+            threads[span.tid] = span.thread
+            args = dict(span.args)
+            args.update({
+                "cpu_ms": round(span.cpu * 1000, 3),
+                "thread_cpu_ms": round(span.thread_cpu * 1000, 3),
+                "peak_rss_mb": round(span.peak_rss / 1024 / 1024, 1)
+            })
+            events.append({
+                "name": span.name,
+                "cat": "charon",
+                "ph": "X",
+                "ts": round((span.start - self.__origin) * 1000000),
+                "dur": round(span.wall * 1000000),
+                "pid": pid,
+                "tid": span.tid,
+                "args": args
+            })
+        for (tid, name) in threads.items():
+            events.append({
+                "name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                "args": {"name": name}
+            })
+        return events
+
+    def write(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.events(), "displayTimeUnit": "ms"}, f)
+
+    def report(self):
+        """Log the wall and CPU time of the stages, summed by the stage names"""
+        totals: Dict[str, List[float]] = {}
+        for span in self.spans():
+            total = totals.setdefault(span.name, [0, 0.0, 0.0])
+            total[0] += 1
+            total[1] += span.wall
+            total[2] += span.cpu
+        if not totals:
+            return
+        lines = [
+            "%-12s %5d %10.3fs %10.3fs" % (name, count, wall, cpu)
+            for (name, (count, wall, cpu)) in totals.items()
+        ]
+        logger.info(
+            "Stage timing:\n%-12s %5s %11s %11s\n%s",
+            "stage", "spans", "wall", "cpu", "\n".join(lines)
+        )
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def span(name: str, **args) -> Span:
+    """Create a span of the process tracer for the stage of name, with args
+    like the target and the item counts.
+    """
+    return _tracer.span(name, **args)
+
+
+def report_trace(path: Optional[str] = None):
+    """Log the timing of the stages, and write the spans to the trace file of
+    path, or of the charon_trace_file environment variable if path is not set.
+    """
+    _tracer.report()
+    path = path or os.getenv(TRACE_FILE_ENV)
+    if path and _tracer.spans():
+        try:
+            _tracer.write(path)
+            logger.info("Trace of the stages is written to %s", path)
+        except OSError as e:
+            logger.warning("Can not write trace file %s: %s", path, e)
@@ -40,7 +40,7 @@ setup(
     keywords="charon mrrc maven npm build java",
     author="RedHat EXD SPMM",
     license="APLv2",
-    packages=find_packages(exclude=["ez_setup", "examples", "tests"]),
+    packages=find_packages(exclude=["ez_setup", "examples", "tests", "benchmarks"]),
     package_data={'charon': ['schemas/*.json']},
     test_suite="tests",
     entry_points={
@@ -54,11 +54,13 @@ setup(
         "requests>=2.25.0",
         "PyYAML>=5.4.1",
         "defusedxml>=0.7.1",
-        "subresource-integrity>=0.2",
         "jsonschema>=4.9.1",
         "urllib3>=1.25.10",
         "semantic-version>=2.10.0",
         "oras>=0.2.31",
         "python-qpid-proton>=0.39.0"
     ],
+    extras_require={
+        "aio": ["aiobotocore>=2.5.0"],
+    },
 )
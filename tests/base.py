@@ -24,6 +24,7 @@ from charon.config import CONFIG_FILE
 from charon.constants import PROD_INFO_SUFFIX
 from charon.pkgs.pkg_utils import is_metadata
 from charon.storage import PRODUCT_META_KEY, CHECKSUM_META_KEY
+from charon.utils.trace import get_tracer
 from tests.commons import TEST_BUCKET, TEST_MANIFEST_BUCKET
 from tests.constants import HERE, TEST_DS_CONFIG
 from moto import mock_aws
@@ -135,6 +136,24 @@ class PackageBaseTest(BaseTest):
     def __prepare_s3(self):
         return boto3.resource('s3')
 
+    def check_target_spans(self, buckets: List[str], concurrent: bool):
+        """Check the target spans of the last run of the targets of buckets,
+        which should be run by their own threads if concurrent, or one by one
+        in the same thread if not. The spans are reset after the check.
+        """
+        tracer = get_tracer()
+        spans = [s for s in tracer.spans() if s.name == "target"]
+        tracer.reset()
+        self.assertEqual(sorted(buckets), sorted(s.args["bucket"] for s in spans))
+        self.assertTrue(all(s.args["succeeded"] for s in spans))
+        threads = set(s.tid for s in spans)
+        if concurrent:
+            self.assertEqual(len(buckets), len(threads))
+            self.assertTrue(all(s.thread.startswith("charon-target") for s in spans))
+        else:
+            self.assertEqual(1, len(threads))
+            self.assertTrue(all(s.start >= p.start + p.wall for (p, s) in zip(spans, spans[1:])))
+
     def check_product(self, file: str, prods: List[str], bucket=None, msg=None):
         prod_file = file + PROD_INFO_SUFFIX
         test_bucket = bucket
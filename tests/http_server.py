@@ -0,0 +1,90 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+
+
+class RangeServer(object):
+    """A local HTTP server of files with Range support, which counts the GET
+    requests and can fail the requests of some ranges.
+    """
+
+    def __init__(self, accept_ranges=True):
+        self.files = {}
+        self.etags = {}
+        self.gets = []
+        self.failing_starts = set()
+        self.accept_ranges = accept_ranges
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_HEAD(self):
+                self.__respond(False)
+
+            def do_GET(self):
+                self.__respond(True)
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                pass
+
+            def __respond(self, with_body: bool):
+                content = server.files.get(self.path)
+                if content is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                (start, end) = (0, len(content) - 1)
+                status = 200
+                range_header = self.headers.get("Range")
+                if with_body:
+                    server.gets.append(range_header)
+                if range_header and server.accept_ranges:
+                    (start, end) = [int(v) for v in range_header[6:].split("-")]
+                    status = 206
+                    if start in server.failing_starts:
+                        # Send a part of the range and close the connection
+                        self.send_response(status)
+                        self.send_header("Content-Length", str(end - start + 1))
+                        self.end_headers()
+                        self.wfile.write(content[start:start + 10])
+                        self.close_connection = True
+                        return
+                self.send_response(status)
+                self.send_header("Content-Length", str(end - start + 1))
+                self.send_header("ETag", server.etags[self.path])
+                if server.accept_ranges:
+                    self.send_header("Accept-Ranges", "bytes")
+                self.end_headers()
+                if with_body:
+                    self.wfile.write(content[start:end + 1])
+
+        self.__server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.__server.daemon_threads = True
+        host, port = self.__server.server_address[:2]
+        self.endpoint = f"http://{host}:{port}"
+        threading.Thread(target=self.__server.serve_forever, daemon=True).start()
+
+    def put(self, path: str, content: bytes, etag: str = '"1"') -> str:
+        self.files[path] = content
+        self.etags[path] = etag
+        return self.endpoint + path
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
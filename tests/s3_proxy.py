@@ -0,0 +1,326 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from http.client import HTTPConnection
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from moto.server import ThreadedMotoServer
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+from charon.storage import ENDPOINT_ENV
+from tests.base import BaseTest
+from tests.commons import TEST_BUCKET, TEST_MANIFEST_BUCKET
+import boto3
+import logging
+import os
+import random
+import socket
+import struct
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+SLOW_DOWN_BODY = """<?xml version="1.0" encoding="UTF-8"?>
+<Error><Code>SlowDown</Code><Message>Please reduce your request rate.</Message>\
+<RequestId>{request_id}</RequestId></Error>"""
+# The headers which are only meaningful for one connection, and will not be
+# forwarded by the proxy
+HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-connection", "transfer-encoding",
+    "te", "trailer", "upgrade"
+}
+# The size of the chunks to send the bodies with the bandwidth limit
+CHUNK_SIZE = 16 * 1024
+
+
+class FaultConfig(object):
+    """The faults injected by S3Proxy to every request.
+        * latency is the seconds added before a request is forwarded, with a
+          random jitter of up to jitter seconds.
+        * bandwidth is the bytes per second of every connection to send the
+          request and response bodies, which is not limited if 0.
+        * slow_down_rate is the probability of a request to be answered with a
+          503 SlowDown error without being forwarded.
+        * reset_rate is the probability of the connection of a request to be
+          reset without being forwarded.
+        * seed makes the injected faults reproducible for the same sequence of
+          requests.
+    """
+
+    def __init__(
+        self, latency=0.0, jitter=0.0, bandwidth=0,
+        slow_down_rate=0.0, reset_rate=0.0, seed: Optional[int] = None
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.slow_down_rate = slow_down_rate
+        self.reset_rate = reset_rate
+        self.seed = seed
+
+    def to_dict(self) -> Dict[str, float]:
+        return dict(vars(self))
+
+
+class S3Proxy(object):
+    """S3Proxy is a local HTTP proxy in front of an S3 endpoint, like a moto
+    server, which injects the latency, bandwidth limit, SlowDown errors and
+    connection resets of FaultConfig, so the concurrency, retrying and batching
+    of S3Client can be evaluated under realistic conditions. It is used as a
+    context manager, and its endpoint can be used as the aws_endpoint_url of
+    charon.
+    """
+
+    def __init__(self, upstream: str, faults: Optional[FaultConfig] = None):
+        self.faults = faults if faults else FaultConfig()
+        self.endpoint = ""
+        self.__upstream = urlsplit(upstream)
+        self.__random = random.Random(self.faults.seed)
+        self.__lock = threading.Lock()
+        self.__stats = {"forwarded": 0, "slow_down": 0, "reset": 0}
+        self.__server: Optional[ThreadingHTTPServer] = None
+        self.__thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "S3Proxy":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self):
+        proxy = self
+
+        class Handler(_ProxyHandler):
+            def proxy(self):
+                return proxy
+
+        self.__server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.__server.daemon_threads = True
+        host, port = self.__server.server_address[:2]
+        self.endpoint = f"http://{host}:{port}"
+        self.__thread = threading.Thread(
+            target=self.__server.serve_forever, name="s3-proxy", daemon=True
+        )
+        self.__thread.start()
+        logger.debug("S3 proxy for %s started at %s", self.__upstream.netloc, self.endpoint)
+
+    def stop(self):
+        if self.__server:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+
+    def stats(self) -> Dict[str, int]:
+        """The counts of the forwarded requests and the injected faults"""
+        with self.__lock:
+            return dict(self.__stats)
+
+    def next_fault(self) -> Optional[str]:
+        """Decide the fault of the next request, which is "reset", "slow_down"
+        or None for forwarding it.
+        """
+        with self.__lock:
+            draw = self.__random.random()
+            if draw < self.faults.reset_rate:
+                fault: Optional[str] = "reset"
+            elif draw < self.faults.reset_rate + self.faults.slow_down_rate:
+                fault = "slow_down"
+            else:
+                fault = None
+            self.__stats[fault if fault else "forwarded"] += 1
+            return fault
+
+    def delay(self) -> float:
+        with self.__lock:
+            return self.faults.latency + self.__random.uniform(0, self.faults.jitter)
+
+    def connect(self) -> HTTPConnection:
+        return HTTPConnection(
+            self.__upstream.hostname, self.__upstream.port or 80, timeout=60
+        )
+
+
+class _ProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def proxy(self) -> S3Proxy:
+        raise NotImplementedError
+
+    def do_GET(self):
+        self.__handle()
+
+    def do_HEAD(self):
+        self.__handle()
+
+    def do_PUT(self):
+        self.__handle()
+
+    def do_POST(self):
+        self.__handle()
+
+    def do_DELETE(self):
+        self.__handle()
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        logger.debug("S3 proxy: " + format, *args)
+
+    def __handle(self):
+        proxy = self.proxy()
+        body = self.__read_body(proxy.faults.bandwidth)
+        time.sleep(proxy.delay())
+        fault = proxy.next_fault()
+        if fault == "reset":
+            # Close with SO_LINGER of 0, so the client gets a RST instead of FIN
+            self.connection.setsockopt(
+                socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0)
+            )
+            self.close_connection = True
+            self.connection.close()
+            return
+        if fault == "slow_down":
+            content = SLOW_DOWN_BODY.format(request_id=uuid.uuid4().hex).encode("utf-8")
+            self.__respond(503, {"Content-Type": "application/xml"}, content, 0)
+            return
+
+        headers = {
+            k: v for (k, v) in self.headers.items()
+            if k.lower() not in HOP_HEADERS and k.lower() != "content-length"
+        }
+        headers["Content-Length"] = str(len(body))
+        upstream = proxy.connect()
+        try:
+            upstream.request(self.command, self.path, body=body, headers=headers)
+            response = upstream.getresponse()
+            content = response.read()
+            response_headers = {
+                k: v for (k, v) in response.getheaders() if k.lower() not in HOP_HEADERS
+            }
+            self.__respond(response.status, response_headers, content, proxy.faults.bandwidth)
+        finally:
+            upstream.close()
+
+    def __read_body(self, bandwidth: int) -> bytes:
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+                if size == 0:
+                    # Skip the trailers
+                    while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            body = b"".join(chunks)
+        else:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if bandwidth > 0:
+            time.sleep(len(body) / bandwidth)
+        return body
+
+    def __respond(self, status: int, headers: Dict[str, str], content: bytes, bandwidth: int):
+        self.send_response(status)
+        for (k, v) in headers.items():
+            if k.lower() not in ("server", "date", "content-length"):
+                self.send_header(k, v)
+        # The content length of a HEAD response is the length of the object
+        length = headers.get("Content-Length", headers.get("content-length"))
+        self.send_header(
+            "Content-Length", length if self.command == "HEAD" and length else str(len(content))
+        )
+        self.end_headers()
+        if self.command == "HEAD":
+            return
+        for start in range(0, len(content), CHUNK_SIZE):
+            chunk = content[start:start + CHUNK_SIZE]
+            self.wfile.write(chunk)
+            if bandwidth > 0:
+                time.sleep(len(chunk) / bandwidth)
+
+
+class LocalS3Server(object):
+    """LocalS3Server runs a moto server on a free local port, behind an
+    S3Proxy if faults are given.
+        * endpoint is the endpoint for charon, which is the proxy if there is.
+        * upstream is the endpoint of the moto server, which can be used to
+          prepare and check the buckets without the faults.
+    """
+
+    def __init__(self, faults: Optional[FaultConfig] = None):
+        self.faults = faults
+        self.proxy: Optional[S3Proxy] = None
+        self.endpoint = ""
+        self.upstream = ""
+        self.__server: Optional[ThreadedMotoServer] = None
+
+    def __enter__(self) -> "LocalS3Server":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        self.__server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+        self.__server.start()
+        self.upstream = f"http://127.0.0.1:{port}"
+        self.endpoint = self.upstream
+        if self.faults:
+            self.proxy = S3Proxy(self.upstream, self.faults)
+            self.proxy.start()
+            self.endpoint = self.proxy.endpoint
+
+    def stop(self):
+        if self.proxy:
+            self.proxy.stop()
+            self.proxy = None
+        if self.__server:
+            self.__server.stop()
+            self.__server = None
+
+
+class FaultyS3Test(BaseTest):
+    """The tests against a local moto server behind an S3Proxy, which injects
+    the faults of get_faults(), like latency and SlowDown errors. The test
+    buckets are created and checked with mock_s3, which connects to the moto
+    server directly without the faults.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.s3_server = LocalS3Server(self.get_faults())
+        self.s3_server.start()
+        os.environ.update({
+            ENDPOINT_ENV: self.s3_server.endpoint,
+            "AWS_ACCESS_KEY_ID": "testing",
+            "AWS_SECRET_ACCESS_KEY": "testing",
+            "AWS_DEFAULT_REGION": "us-east-1"
+        })
+        self.mock_s3 = boto3.resource("s3", endpoint_url=self.s3_server.upstream)
+        self.mock_s3.create_bucket(Bucket=TEST_BUCKET)
+        self.mock_s3.create_bucket(Bucket=TEST_MANIFEST_BUCKET)
+        self.test_bucket = self.mock_s3.Bucket(TEST_BUCKET)
+
+    def tearDown(self):
+        self.s3_server.stop()
+        super().tearDown()
+
+    def get_faults(self) -> FaultConfig:
+        return FaultConfig()
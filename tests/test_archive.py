@@ -1,6 +1,14 @@
 from tests.base import BaseTest
-from charon.utils.archive import NpmArchiveType, detect_npm_archive
+from charon.utils.archive import (
+    NpmArchiveType, ZipSource, detect_npm_archive, extract_npm_tarball,
+    extract_zip_members
+)
+from zipfile import ZipFile
+import hashlib
+import json
 import os
+import pickle
+import shutil
 
 from tests.constants import INPUTS
 
@@ -14,3 +22,94 @@ class ArchiveTest(BaseTest):
 
     def test_download_archive(self):
         pass
+
+    def test_zip_source(self):
+        test_zip = os.path.join(INPUTS, "commons-client-4.5.6.zip")
+        root = os.path.join(self.tempdir, "root")
+        source = ZipSource(test_zip, root)
+        jar = os.path.join(
+            root, "commons-client-4.5.6", "maven-repository",
+            "org/apache/httpcomponents/httpclient/4.5.6/httpclient-4.5.6.jar"
+        )
+        with ZipFile(test_zip) as z:
+            content = z.read(os.path.relpath(jar, root))
+            sha1 = z.read(os.path.relpath(jar, root) + ".sha1")
+        self.assertTrue(source.is_file(jar))
+        self.assertFalse(source.is_file(os.path.dirname(jar)))
+        self.assertEqual(len(content), source.size(jar))
+        # The sha1 of the jar is read from its .sha1 member, while the one of
+        # the .sha1 member is digested
+        self.assertEqual(str(sha1, "utf-8").strip(), source.sha1(jar))
+        self.assertEqual(hashlib.sha1(sha1).hexdigest(), source.sha1(jar + ".sha1"))
+        with source.open(jar) as f:
+            self.assertEqual(content, f.read())
+        self.assertFalse(os.path.exists(jar))
+
+        walked = [
+            os.path.join(d, f) for (d, _, files) in source.walk(root) for f in files
+        ]
+        self.assertIn(jar, walked)
+        self.assertEqual(len(source.members()), len(walked))
+
+        top_level = os.path.join(root, "commons-client-4.5.6")
+        source.materialize([jar], [top_level])
+        self.assertTrue(os.path.isdir(top_level))
+        with open(jar, "rb") as f:
+            self.assertEqual(content, f.read())
+
+        # The source sent to a worker process opens the zip again
+        copied = pickle.loads(pickle.dumps(source))
+        self.assertEqual(len(content), copied.size(jar))
+        copied.close()
+        source.close()
+
+    def test_extract_zip_members(self):
+        test_zip = os.path.join(INPUTS, "commons-client-4.5.6.zip")
+        root = os.path.join(self.tempdir, "root")
+        source = ZipSource(test_zip, root)
+        top_level = os.path.join(root, "commons-client-4.5.6", "maven-repository")
+        paths = [
+            os.path.join(d, f) for (d, _, files) in source.walk(top_level) for f in files
+            if not f.endswith(".sha1")
+        ]
+        empty_dir = os.path.join(top_level, "empty")
+        # The members are extracted by 2 worker processes
+        extract_zip_members(source, paths, [top_level, empty_dir], workers=2)
+        source.close()
+
+        extracted = [
+            os.path.join(d, f) for (d, _, files) in os.walk(root) for f in files
+        ]
+        self.assertEqual(sorted(paths), sorted(extracted))
+        self.assertTrue(os.path.isdir(empty_dir))
+        with ZipFile(test_zip) as z:
+            for path in paths:
+                with open(path, "rb") as f:
+                    self.assertEqual(z.read(os.path.relpath(path, root)), f.read())
+
+    def test_extract_npm_tarball(self):
+        tarball = os.path.join(self.tempdir, "code-frame-7.14.5.tgz")
+        shutil.copyfile(os.path.join(INPUTS, "code-frame-7.14.5.tgz"), tarball)
+        target_dir = os.path.join(self.tempdir, "target")
+        cwd = os.getcwd()
+        os.chdir(self.tempdir)
+        try:
+            (name_path, valid_paths) = extract_npm_tarball(
+                tarball, target_dir, True, registry="npm.registry.redhat.com"
+            )
+        finally:
+            os.chdir(cwd)
+        self.assertEqual("@babel/code-frame", name_path)
+        (tgz, version_meta) = valid_paths
+        # Nothing is extracted, and the tgz is linked instead of copied
+        self.assertFalse(os.path.exists(os.path.join(self.tempdir, "package")))
+        self.assertTrue(os.path.samefile(tarball, tgz))
+        with open(tarball, "rb") as f:
+            content = f.read()
+        with open(version_meta, encoding="utf-8") as f:
+            dist = json.load(f)["dist"]
+        self.assertEqual(hashlib.sha1(content).hexdigest(), dist["shasum"])
+        self.assertEqual(
+            "https://npm.registry.redhat.com/@babel/code-frame/-/code-frame-7.14.5.tgz",
+            dist["tarball"]
+        )
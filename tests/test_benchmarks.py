@@ -0,0 +1,75 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from benchmarks.generators import generate_maven_zip, generate_npm_tarball
+from benchmarks.runner import compare
+from charon.pkgs.maven import _scan_paths
+from charon.utils.archive import extract_zip_all
+from zipfile import ZipFile
+import copy
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+
+
+class BenchmarksTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix="charon-test-")
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    def test_generate_maven_zip(self):
+        path = os.path.join(self.tempdir, "bench.zip")
+        stats = generate_maven_zip(path, ga_count=3, versions=2, file_size=100)
+        # pom, jar and sources jar with their sha1 files for each version
+        self.assertEqual(3 * 2 * 6, stats["files"])
+
+        root = os.path.join(self.tempdir, "extracted")
+        extract_zip_all(ZipFile(path), root)
+        (_, mvn_paths, poms, _) = _scan_paths(root, [], "maven-repository")
+        self.assertEqual(stats["files"], len(mvn_paths))
+        self.assertEqual(6, len(poms))
+        # The content is the same for the same seed
+        crcs = [info.CRC for info in ZipFile(path).infolist()]
+        generate_maven_zip(path, ga_count=3, versions=2, file_size=100)
+        self.assertEqual(crcs, [info.CRC for info in ZipFile(path).infolist()])
+
+    def test_generate_npm_tarball(self):
+        path = os.path.join(self.tempdir, "bench.tgz")
+        stats = generate_npm_tarball(path, file_count=5, file_size=100)
+        self.assertEqual(6, stats["files"])
+        with tarfile.open(path) as tar:
+            self.assertIn("package/package.json", tar.getnames())
+
+    def test_compare(self):
+        baseline = {
+            "params": {"ga_count": 1},
+            "scenarios": {
+                "maven_upload": {"succeeded": True, "files_per_sec": 100, "requests": 50}
+            }
+        }
+        result = copy.deepcopy(baseline)
+        result["scenarios"]["maven_upload"]["files_per_sec"] = 85
+        self.assertEqual([], compare(result, baseline, 0.2))
+
+        result["scenarios"]["maven_upload"]["files_per_sec"] = 70
+        result["scenarios"]["maven_upload"]["requests"] = 51
+        self.assertEqual(2, len(compare(result, baseline, 0.2)))
+
+        result["params"] = {"ga_count": 2}
+        self.assertEqual(1, len(compare(result, baseline, 0.2)))
@@ -24,7 +24,9 @@ from tests.commons import (
     ARCHETYPE_CATALOG, ARCHETYPE_CATALOG_FILES, COMMONS_CLIENT_459_MVN_NUM,
     COMMONS_CLIENT_META_NUM
 )
+from tests.http_server import RangeServer
 from moto import mock_aws
+from zipfile import ZipFile
 import os
 
 from tests.constants import INPUTS
@@ -97,6 +99,44 @@ class MavenDeleteTest(PackageBaseTest):
         for f in non_sha1_files:
             self.assertNotIn(f, actual_files)
 
+    def test_remote_deletion(self):
+        self.__prepare_content()
+        test_zip = os.path.join(INPUTS, "commons-client-4.5.6.zip")
+        server = RangeServer()
+        try:
+            with open(test_zip, "rb") as f:
+                url = server.put("/commons-client-4.5.6.zip", f.read())
+            (_, succeeded) = handle_maven_del(
+                url, "commons-client-4.5.6",
+                targets=[('', TEST_BUCKET, '', '')],
+                dir_=self.tempdir, do_index=False
+            )
+        finally:
+            server.stop()
+        self.assertTrue(succeeded)
+
+        objs = list(self.mock_s3.Bucket(TEST_BUCKET).objects.all())
+        actual_files = [obj.key for obj in objs]
+        self.assertEqual(
+            COMMONS_CLIENT_459_MVN_NUM * 2 + COMMONS_CLIENT_META_NUM,
+            len(actual_files)
+        )
+        for f in COMMONS_CLIENT_456_FILES:
+            self.assertNotIn(f, actual_files)
+
+        # Only the archetype-catalog.xml member is read from the remote zip
+        with ZipFile(test_zip) as z:
+            offsets = {
+                i.header_offset: i.filename for i in z.infolist() if not i.is_dir()
+            }
+        read_members = [
+            offsets[int(r[6:].split("-")[0])] for r in server.gets
+            if int(r[6:].split("-")[0]) in offsets
+        ]
+        self.assertEqual(
+            ["commons-client-4.5.6/maven-repository/archetype-catalog.xml"], read_members
+        )
+
     def __test_prefix_deletion(self, prefix: str):
         self.__prepare_content(prefix)
 
@@ -16,6 +16,7 @@ limitations under the License.
 from charon.pkgs.maven import handle_maven_uploading, handle_maven_del
 from charon.storage import PRODUCT_META_KEY, CHECKSUM_META_KEY
 from charon.utils.strings import remove_prefix
+from charon.utils.trace import get_tracer
 from charon.constants import PROD_INFO_SUFFIX
 from tests.base import LONG_TEST_PREFIX, SHORT_TEST_PREFIX, PackageBaseTest
 from tests.commons import (
@@ -54,6 +55,9 @@ class MavenDeleteMultiTgtsTest(PackageBaseTest):
     def test_root_prefix_deletion(self):
         self.__test_prefix_deletion("/")
 
+    def test_concurrent_deletion(self):
+        self.__test_prefix_deletion(SHORT_TEST_PREFIX, concurrent=True)
+
     def test_ignore_del(self):
         self.__prepare_content()
         product_456 = "commons-client-4.5.6"
@@ -107,17 +111,20 @@ class MavenDeleteMultiTgtsTest(PackageBaseTest):
         for f in non_sha1_files:
             self.assertNotIn(f, actual_files)
 
-    def __test_prefix_deletion(self, prefix: str):
+    def __test_prefix_deletion(self, prefix: str, concurrent=False):
         self.__prepare_content(prefix)
 
         targets_ = [('', TEST_BUCKET, prefix, ''), ('', TEST_BUCKET_2, prefix, '')]
         test_zip = os.path.join(INPUTS, "commons-client-4.5.6.zip")
         product_456 = "commons-client-4.5.6"
+        get_tracer().reset()
         handle_maven_del(
             test_zip, product_456,
             targets=targets_,
-            dir_=self.tempdir, do_index=False
+            dir_=self.tempdir, do_index=False,
+            concurrent_targets=concurrent
         )
+        self.check_target_spans([t[1] for t in targets_], concurrent)
 
         for target in targets_:
             bucket_name = target[1]
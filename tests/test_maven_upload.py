@@ -14,7 +14,9 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 from charon.pkgs.maven import handle_maven_uploading
+from charon.journal import UploadJournal, get_journal_path
 from charon.utils.strings import remove_prefix
+from charon.utils.trace import get_tracer
 from tests.base import SHORT_TEST_PREFIX, LONG_TEST_PREFIX, PackageBaseTest
 from tests.commons import (
     TEST_BUCKET, COMMONS_CLIENT_456_FILES, COMMONS_CLIENT_459_FILES,
@@ -23,7 +25,9 @@ from tests.commons import (
     COMMONS_CLIENT_456_MVN_NUM, COMMONS_CLIENT_MVN_NUM,
     COMMONS_CLIENT_META_NUM
 )
+from tests.http_server import RangeServer
 from moto import mock_aws
+from zipfile import ZipFile
 import os
 
 from tests.constants import INPUTS
@@ -43,6 +47,32 @@ class MavenUploadTest(PackageBaseTest):
     def test_root_prefix_upload(self):
         self.__test_prefix_upload("/")
 
+    def test_stage_spans(self):
+        test_zip = os.path.join(INPUTS, "commons-client-4.5.6.zip")
+        tracer = get_tracer()
+        tracer.reset()
+        with self.assertLogs("charon.pkgs.pkg_utils", level="INFO") as logs:
+            handle_maven_uploading(
+                test_zip, "commons-client-4.5.6",
+                targets=[('', TEST_BUCKET, '', '')],
+                dir_=self.tempdir
+            )
+        # The cache summaries are reported with the run summary
+        self.assertTrue(any("S3 content cache:" in line for line in logs.output))
+        spans = {s.name: s for s in tracer.spans()}
+        tracer.reset()
+        self.assertEqual(
+            {
+                "extract", "scan", "validate", "upload", "manifest", "metadata",
+                "archetype", "sign", "index", "target"
+            },
+            set(spans.keys())
+        )
+        self.assertEqual(COMMONS_CLIENT_456_MVN_NUM, spans["upload"].args["files"])
+        self.assertEqual(0, spans["upload"].args["failed"])
+        self.assertEqual(TEST_BUCKET, spans["metadata"].args["bucket"])
+        self.assertTrue(spans["index"].args["files"] > 0)
+
     def test_overlap_upload(self):
         test_zip = os.path.join(INPUTS, "commons-client-4.5.6.zip")
         product_456 = "commons-client-4.5.6"
@@ -113,7 +143,7 @@ class MavenUploadTest(PackageBaseTest):
     def test_ignore_upload(self):
         test_zip = os.path.join(INPUTS, "commons-client-4.5.6.zip")
         product_456 = "commons-client-4.5.6"
-        handle_maven_uploading(
+        (tmp_root, _) = handle_maven_uploading(
             test_zip, product_456, [".*.sha1"],
             targets=[('', TEST_BUCKET, '', '')],
             dir_=self.tempdir, do_index=False
@@ -139,6 +169,101 @@ class MavenUploadTest(PackageBaseTest):
         for f in ignored_files:
             self.assertNotIn(f, actual_files)
 
+        # Only the files in the root which are not ignored are extracted
+        top_level = os.path.join(tmp_root, product_456, "maven-repository")
+        for f in not_ignored:
+            self.assertTrue(os.path.isfile(os.path.join(top_level, f)))
+        for f in ignored_files:
+            self.assertFalse(os.path.exists(os.path.join(top_level, f)))
+        for f in NON_MVN_FILES:
+            self.assertFalse(os.path.exists(os.path.join(tmp_root, f)))
+
+    def test_resume_upload(self):
+        test_zip = os.path.join(INPUTS, "commons-client-4.5.6.zip")
+        product = "commons-client-4.5.6"
+        jar = "org/apache/httpcomponents/httpclient/4.5.6/httpclient-4.5.6.jar"
+        # Simulate the journal of an interrupted uploading, in which the jar
+        # was uploaded
+        journal = UploadJournal(get_journal_path(product))
+        journal.record(TEST_BUCKET, jar, "3afd53bd91c51ae6d35bcfee559175ae197ccfe4")
+        journal.close(False)
+
+        handle_maven_uploading(
+            test_zip, product,
+            targets=[('', TEST_BUCKET, '', '')],
+            dir_=self.tempdir, do_index=False, resume=True
+        )
+
+        actual_files = [obj.key for obj in self.test_bucket.objects.all()]
+        # The journaled jar is not uploaded again, so it does not exist in the
+        # mock bucket, but the other files and metadata are uploaded
+        self.assertNotIn(jar, actual_files)
+        self.assertEqual(
+            (COMMONS_CLIENT_456_MVN_NUM - 1) * 2 + COMMONS_CLIENT_META_NUM,
+            len(actual_files)
+        )
+        for f in COMMONS_CLIENT_METAS:
+            self.assertIn(f, actual_files)
+        # Journal is removed after the successful uploading
+        self.assertFalse(os.path.exists(get_journal_path(product)))
+
+    def test_stream_upload(self):
+        test_zip = os.path.join(INPUTS, "commons-client-4.5.6.zip")
+        product = "commons-client-4.5.6"
+        (tmp_root, succeeded) = handle_maven_uploading(
+            test_zip, product,
+            targets=[('', TEST_BUCKET, '', '')],
+            dir_=self.tempdir, do_index=False, stream=True
+        )
+        self.assertTrue(succeeded)
+
+        objs = list(self.test_bucket.objects.all())
+        actual_files = [obj.key for obj in objs]
+        self.assertEqual(
+            COMMONS_CLIENT_456_MVN_NUM * 2 + COMMONS_CLIENT_META_NUM,
+            len(actual_files)
+        )
+        for f in [*COMMONS_CLIENT_456_FILES, *COMMONS_CLIENT_METAS, *ARCHETYPE_CATALOG_FILES]:
+            self.assertIn(f, actual_files)
+        self.check_content(objs, [product])
+
+        # The artifacts are uploaded from the zip without being extracted
+        jar = "org/apache/httpcomponents/httpclient/4.5.6/httpclient-4.5.6.jar"
+        self.assertFalse(
+            os.path.exists(os.path.join(tmp_root, product, "maven-repository", jar))
+        )
+        with ZipFile(test_zip) as z:
+            content = z.read(os.path.join(product, "maven-repository", jar))
+        self.assertEqual(content, self.test_bucket.Object(jar).get()["Body"].read())
+
+    def test_remote_stream_upload(self):
+        test_zip = os.path.join(INPUTS, "commons-client-4.5.6.zip")
+        product = "commons-client-4.5.6"
+        server = RangeServer()
+        try:
+            with open(test_zip, "rb") as f:
+                url = server.put("/commons-client-4.5.6.zip", f.read())
+            (_, succeeded) = handle_maven_uploading(
+                url, product,
+                targets=[('', TEST_BUCKET, '', '')],
+                dir_=self.tempdir, do_index=False, stream=True
+            )
+        finally:
+            server.stop()
+        self.assertTrue(succeeded)
+        # The zip is read by Range requests instead of being downloaded
+        self.assertTrue(all(r and r.startswith("bytes=") for r in server.gets))
+
+        objs = list(self.test_bucket.objects.all())
+        actual_files = [obj.key for obj in objs]
+        self.assertEqual(
+            COMMONS_CLIENT_456_MVN_NUM * 2 + COMMONS_CLIENT_META_NUM,
+            len(actual_files)
+        )
+        for f in [*COMMONS_CLIENT_456_FILES, *COMMONS_CLIENT_METAS, *ARCHETYPE_CATALOG_FILES]:
+            self.assertIn(f, actual_files)
+        self.check_content(objs, [product])
+
     def __test_prefix_upload(self, prefix: str):
         test_zip = os.path.join(INPUTS, "commons-client-4.5.6.zip")
         product = "commons-client-4.5.6"
@@ -16,6 +16,7 @@ limitations under the License.
 from typing import List, Tuple
 from charon.pkgs.maven import handle_maven_uploading
 from charon.utils.strings import remove_prefix
+from charon.utils.trace import get_tracer
 from tests.base import SHORT_TEST_PREFIX, LONG_TEST_PREFIX, PackageBaseTest
 from tests.commons import (
     TEST_BUCKET, COMMONS_CLIENT_456_FILES, COMMONS_CLIENT_459_FILES,
@@ -61,6 +62,28 @@ class MavenUploadMultiTgtsTest(PackageBaseTest):
         self.__test_prefix_upload([('', TEST_BUCKET, "/", ''),
                                    ('', TEST_BUCKET_2, "/", '')])
 
+    def test_concurrent_upload(self):
+        self.__test_prefix_upload(
+            [('', TEST_BUCKET, SHORT_TEST_PREFIX, ''), ('', TEST_BUCKET_2, SHORT_TEST_PREFIX, '')],
+            concurrent=True
+        )
+
+    def test_concurrent_upload_failure(self):
+        test_zip = os.path.join(INPUTS, "commons-client-4.5.6.zip")
+        product_456 = "commons-client-4.5.6"
+        # The failure of the missing bucket should not stop the other target
+        _, succeeded = handle_maven_uploading(
+            test_zip, product_456,
+            targets=[('', TEST_BUCKET, '', ''), ('', "no-such-bucket", '', '')],
+            dir_=self.tempdir, do_index=False,
+            concurrent_targets=True
+        )
+        self.assertFalse(succeeded)
+        actual_files = [obj.key for obj in self.test_bucket.objects.all()]
+        self.assertEqual(
+            COMMONS_CLIENT_456_MVN_NUM * 2 + COMMONS_CLIENT_META_NUM, len(actual_files)
+        )
+
     def test_overlap_upload(self):
         test_zip = os.path.join(INPUTS, "commons-client-4.5.6.zip")
         product_456 = "commons-client-4.5.6"
@@ -217,15 +240,20 @@ class MavenUploadMultiTgtsTest(PackageBaseTest):
             for f in ignored_files:
                 self.assertNotIn(f, actual_files, msg=f'{bucket_name}')
 
-    def __test_prefix_upload(self, targets: List[Tuple[str, str, str, str]]):
+    def __test_prefix_upload(
+        self, targets: List[Tuple[str, str, str, str]], concurrent=False
+    ):
         test_zip = os.path.join(INPUTS, "commons-client-4.5.6.zip")
         product = "commons-client-4.5.6"
+        get_tracer().reset()
         handle_maven_uploading(
             test_zip, product,
             targets=targets,
             dir_=self.tempdir,
-            do_index=False
+            do_index=False,
+            concurrent_targets=concurrent
         )
+        self.check_target_spans([t[1] for t in targets], concurrent)
 
         for target in targets:
             bucket = self.mock_s3.Bucket(target[1])
@@ -0,0 +1,83 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from charon.metrics import RequestMetrics, report_request_metrics, get_request_metrics
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class RequestMetricsTest(unittest.TestCase):
+    def test_record(self):
+        metrics = RequestMetrics()
+        for i in range(100):
+            metrics.record("head_object", "bucket", 0.01 if i < 90 else 1.0)
+        metrics.record("put_object", "bucket", 0.02, sent=10)
+        metrics.record("get_object", "bucket", 0.03, received=20, error=True)
+        metrics.record_skipped("put_object", "bucket", sent=5)
+
+        summary = metrics.summary()
+        operations = {o["operation"]: o for o in summary["operations"]}
+        head = operations["head_object"]
+        self.assertEqual(100, head["count"])
+        # The percentiles are the upper bounds of the 25% wide buckets
+        self.assertTrue(10 <= head["latency_ms"]["p50"] <= 12.5)
+        self.assertEqual(1000, head["latency_ms"]["p95"])
+        self.assertEqual(1000, head["latency_ms"]["p99"])
+        self.assertEqual(1000, head["latency_ms"]["max"])
+
+        put = operations["put_object"]
+        self.assertEqual((2, 1, 15), (put["count"], put["skipped"], put["bytes_sent"]))
+        # The skipped requests are not timed
+        self.assertEqual(20, put["latency_ms"]["mean"])
+        self.assertEqual(1, operations["get_object"]["errors"])
+        self.assertEqual(20, operations["get_object"]["bytes_received"])
+
+        total = summary["total"]
+        self.assertEqual((103, 1, 1), (total["count"], total["skipped"], total["errors"]))
+
+    def test_merge(self):
+        metrics = RequestMetrics()
+        metrics.record("put_object", "bucket", 0.1, sent=10)
+        other = RequestMetrics()
+        other.record("put_object", "bucket", 0.2, sent=10)
+        other.record("put_object", "another", 0.2)
+        metrics.merge(json.loads(json.dumps(other.snapshot())))
+
+        operations = metrics.summary()["operations"]
+        self.assertEqual(["another", "bucket"], [o["bucket"] for o in operations])
+        self.assertEqual(2, operations[1]["count"])
+        self.assertEqual(20, operations[1]["bytes_sent"])
+        self.assertEqual(200, operations[1]["latency_ms"]["max"])
+
+    def test_report(self):
+        tempdir = tempfile.mkdtemp(prefix="charon-test-")
+        path = os.path.join(tempdir, "metrics.json")
+        metrics = get_request_metrics()
+        metrics.reset()
+        report_request_metrics(path)
+        # Nothing is reported without requests
+        self.assertFalse(os.path.exists(path))
+
+        metrics.record("list_objects_v2", "bucket", 0.01)
+        report_request_metrics(path)
+        with open(path, encoding="utf-8") as f:
+            summary = json.load(f)
+        self.assertEqual("list_objects_v2", summary["operations"][0]["operation"])
+        self.assertEqual(1, summary["total"]["count"])
+        metrics.reset()
+        shutil.rmtree(tempdir)
@@ -18,6 +18,7 @@ from moto import mock_aws
 from charon.constants import PROD_INFO_SUFFIX, DEFAULT_REGISTRY
 from charon.pkgs.npm import handle_npm_uploading, handle_npm_del
 from charon.storage import CHECKSUM_META_KEY
+from charon.utils.trace import get_tracer
 from tests.base import LONG_TEST_PREFIX, SHORT_TEST_PREFIX, PackageBaseTest
 from tests.commons import TEST_BUCKET, CODE_FRAME_7_14_5_FILES, CODE_FRAME_META, TEST_BUCKET_2
 from tests.constants import INPUTS
@@ -47,16 +48,22 @@ class NPMDeleteMultiTgtsTest(PackageBaseTest):
     def test_npm_deletion_with_root_prefix(self):
         self.__test_prefix("/")
 
-    def __test_prefix(self, prefix: str = None):
+    def test_concurrent_deletion(self):
+        self.__test_prefix(SHORT_TEST_PREFIX, concurrent=True)
+
+    def __test_prefix(self, prefix: str = None, concurrent=False):
         self.__prepare_content(prefix)
         targets_ = [('', TEST_BUCKET, prefix, ''), ('', TEST_BUCKET_2, prefix, '')]
         test_tgz = os.path.join(INPUTS, "code-frame-7.14.5.tgz")
         product_7_14_5 = "code-frame-7.14.5"
+        get_tracer().reset()
         handle_npm_del(
             test_tgz, product_7_14_5,
             targets=targets_,
-            dir_=self.tempdir, do_index=False
+            dir_=self.tempdir, do_index=False,
+            concurrent_targets=concurrent
         )
+        self.check_target_spans([t[1] for t in targets_], concurrent)
 
         for target in targets_:
             bucket_name = target[1]
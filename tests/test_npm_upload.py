@@ -13,7 +13,9 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+import io
 import os
+import tarfile
 
 from moto import mock_aws
 
@@ -44,6 +46,22 @@ class NPMUploadTest(PackageBaseTest):
     def test_upload_with_root_prefix(self):
         self.__test_prefix("/")
 
+    def test_upload_without_package_json(self):
+        test_tgz = os.path.join(self.tempdir, "no-package-json.tgz")
+        with tarfile.open(test_tgz, "w:gz") as tar:
+            content = b"module.exports = {};"
+            info = tarfile.TarInfo("package/index.js")
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+        # The tarball without version metadata is refused before any uploading
+        with self.assertRaises(SystemExit):
+            handle_npm_uploading(
+                test_tgz, "no-package-json",
+                targets=[('', TEST_BUCKET, '', DEFAULT_REGISTRY)],
+                dir_=self.tempdir, do_index=False
+            )
+        self.assertEqual([], list(self.test_bucket.objects.all()))
+
     def test_double_uploads(self):
         test_tgz = os.path.join(INPUTS, "code-frame-7.14.5.tgz")
         product_7_14_5 = "code-frame-7.14.5"
@@ -13,6 +13,7 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+import json
 import os
 
 from moto import mock_aws
@@ -20,11 +21,12 @@ from moto import mock_aws
 from charon.pkgs.npm import handle_npm_uploading
 from charon.pkgs.pkg_utils import is_metadata
 from charon.storage import CHECKSUM_META_KEY
+from charon.utils.trace import get_tracer
 from charon.constants import PROD_INFO_SUFFIX, DEFAULT_REGISTRY
 from tests.base import LONG_TEST_PREFIX, SHORT_TEST_PREFIX, PackageBaseTest
 from tests.commons import (
     TEST_BUCKET, CODE_FRAME_7_14_5_FILES,
-    CODE_FRAME_7_15_8_FILES, CODE_FRAME_META, TEST_BUCKET_2
+    CODE_FRAME_7_15_8_FILES, CODE_FRAME_META, CODE_FRAME_7_14_5_META, TEST_BUCKET_2
 )
 from tests.constants import INPUTS
 
@@ -53,6 +55,38 @@ class NPMUploadMultiTgtsTest(PackageBaseTest):
     def test_upload_with_root_prefix(self):
         self.__test_prefix("/")
 
+    def test_concurrent_upload(self):
+        self.__test_prefix(SHORT_TEST_PREFIX, concurrent=True)
+
+    def test_registry_per_target(self):
+        targets_ = [('t1', TEST_BUCKET, '', DEFAULT_REGISTRY),
+                    ('t2', TEST_BUCKET_2, '', "npm.example.com")]
+        test_tgz = os.path.join(INPUTS, "code-frame-7.14.5.tgz")
+        tracer = get_tracer()
+        tracer.reset()
+        handle_npm_uploading(
+            test_tgz, "code-frame-7.14.5",
+            targets=targets_,
+            dir_=self.tempdir, do_index=False
+        )
+        spans = [s.name for s in tracer.spans()]
+        tracer.reset()
+        # The tarball is ingested once for both targets
+        self.assertEqual(1, spans.count("extract"))
+        self.assertEqual(2, spans.count("upload"))
+
+        for (_, bucket_name, _, registry) in targets_:
+            bucket = self.mock_s3.Bucket(bucket_name)
+            version = json.loads(bucket.Object(CODE_FRAME_7_14_5_META).get()["Body"].read())
+            self.assertEqual(
+                f"https://{registry}/@babel/code-frame/-/code-frame-7.14.5.tgz",
+                version["dist"]["tarball"]
+            )
+            meta = json.loads(bucket.Object(CODE_FRAME_META).get()["Body"].read())
+            self.assertEqual(
+                version["dist"], meta["versions"]["7.14.5"]["dist"]
+            )
+
     def test_double_uploads(self):
         targets_ = [('', TEST_BUCKET, '', DEFAULT_REGISTRY),
                     ('', TEST_BUCKET_2, '', DEFAULT_REGISTRY)]
@@ -125,16 +159,19 @@ class NPMUploadMultiTgtsTest(PackageBaseTest):
             )
             self.assertNotIn("\"dist_tags\":", meta_content_client)
 
-    def __test_prefix(self, prefix: str = None):
+    def __test_prefix(self, prefix: str = None, concurrent=False):
         targets_ = [('', TEST_BUCKET, prefix, DEFAULT_REGISTRY),
                     ('', TEST_BUCKET_2, prefix, DEFAULT_REGISTRY)]
         test_tgz = os.path.join(INPUTS, "code-frame-7.14.5.tgz")
         product_7_14_5 = "code-frame-7.14.5"
+        get_tracer().reset()
         handle_npm_uploading(
             test_tgz, product_7_14_5,
             targets=targets_,
-            dir_=self.tempdir, do_index=False
+            dir_=self.tempdir, do_index=False,
+            concurrent_targets=concurrent
         )
+        self.check_target_spans([t[1] for t in targets_], concurrent)
 
         for target in targets_:
             bucket_name = target[1]
@@ -0,0 +1,61 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from charon.pkgs.maven import handle_maven_uploading
+from charon.storage import S3Client
+from tests.commons import TEST_BUCKET, COMMONS_CLIENT_456_MVN_NUM
+from tests.constants import INPUTS
+from tests.s3_proxy import FaultConfig, FaultyS3Test
+import os
+import time
+
+
+class S3ProxyLatencyTest(FaultyS3Test):
+    def get_faults(self) -> FaultConfig:
+        return FaultConfig(latency=0.1, bandwidth=100 * 1024)
+
+    def test_latency(self):
+        self.test_bucket.put_object(Key="large", Body=b"0" * 50 * 1024)
+        s3_client = S3Client()
+        start = time.monotonic()
+        self.assertTrue(s3_client.file_exists_in_bucket(TEST_BUCKET, "large"))
+        self.assertTrue(time.monotonic() - start >= 0.1)
+
+        start = time.monotonic()
+        content = s3_client.read_file_content(TEST_BUCKET, "large")
+        # 0.1s of the latency, and about 0.5s to send the 50KB in 100KB/s
+        self.assertTrue(time.monotonic() - start >= 0.55)
+        self.assertEqual(50 * 1024, len(content))
+        self.assertEqual(2, self.s3_server.proxy.stats()["forwarded"])
+
+
+class S3ProxyFaultsTest(FaultyS3Test):
+    def get_faults(self) -> FaultConfig:
+        return FaultConfig(slow_down_rate=0.2, reset_rate=0.05, seed=1)
+
+    def test_upload_with_faults(self):
+        test_zip = os.path.join(INPUTS, "commons-client-4.5.6.zip")
+        (_, succeeded) = handle_maven_uploading(
+            test_zip, "commons-client-4.5.6",
+            targets=[('', TEST_BUCKET, '', '')],
+            dir_=self.tempdir, do_index=False
+        )
+        self.assertTrue(succeeded)
+        stats = self.s3_server.proxy.stats()
+        self.assertTrue(stats["slow_down"] > 0)
+        self.assertTrue(stats["reset"] > 0)
+        keys = [obj.key for obj in self.test_bucket.objects.all()]
+        # The files with their .prodinfo files, and the metadata files
+        self.assertTrue(len(keys) > COMMONS_CLIENT_456_MVN_NUM * 2)
@@ -13,13 +13,19 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-from typing import List
-from charon.storage import S3Client, CHECKSUM_META_KEY
+from typing import Dict, List
+from charon.storage import S3Client, CHECKSUM_META_KEY, _BatchDeleter
 from charon.utils.archive import extract_zip_all
+from charon.utils.concurrency import AdaptiveLimiter
+from charon.journal import UploadJournal
+from charon.metrics import get_request_metrics
 from charon.utils.files import overwrite_file, read_sha1
 from charon.constants import PROD_INFO_SUFFIX
 from tests.base import BaseTest, SHORT_TEST_PREFIX
+from botocore.exceptions import ClientError
 from moto import mock_aws
+from unittest import mock
+import asyncio
 import boto3
 import os
 import sys
@@ -347,6 +353,297 @@ class S3ClientTest(BaseTest):
 
         shutil.rmtree(temp_root)
 
+    def test_upload_files_preflight(self):
+        (temp_root, root, all_files) = self.__prepare_files()
+        test_files = list(filter(lambda f: f.startswith(root), all_files))
+        heads = self.__count_requests("HeadObject")
+        lists = self.__count_requests("ListObjectsV2")
+
+        # Nothing exists in bucket, so no HEAD is needed for the existence check
+        failed = self.s3_client.upload_files(
+            test_files, targets=[(MY_BUCKET, SHORT_TEST_PREFIX)],
+            product="apache-commons", root=root
+        )
+        self.assertEqual(0, len(failed))
+        self.assertEqual(0, len(heads))
+        self.assertTrue(0 < len(lists) < len(test_files))
+
+        # All files exist now, so HEAD is only used to get the checksum metadata
+        failed = self.s3_client.upload_files(
+            test_files, targets=[(MY_BUCKET, SHORT_TEST_PREFIX)],
+            product="commons-lang3", root=root
+        )
+        self.assertEqual(0, len(failed))
+        self.assertEqual(len(test_files), len(heads))
+        bucket = self.mock_s3.Bucket(MY_BUCKET)
+        for o in bucket.objects.all():
+            if o.key.endswith(PROD_INFO_SUFFIX):
+                content = str(o.get()['Body'].read(), 'utf-8')
+                self.assertEqual(
+                    {"apache-commons", "commons-lang3"},
+                    set([f for f in content.split("\n") if f.strip() != ""])
+                )
+
+        shutil.rmtree(temp_root)
+
+    def test_upload_files_multipart(self):
+        temp_root = os.path.join(self.tempdir, "tmp_mpu")
+        path = "org/foo/bar/1.0"
+        os.makedirs(os.path.join(temp_root, path))
+        file = os.path.join(temp_root, path, "foo-bar-1.0-dist.zip")
+        with open(file, "wb") as f:
+            f.write(os.urandom(12 * 1024 * 1024))
+        sha1 = read_sha1(file)
+        s3_client = S3Client(
+            multipart_threshold=6 * 1024 * 1024,
+            multipart_chunksize=5 * 1024 * 1024,
+            multipart_concurrency=2,
+            max_open_files=1
+        )
+        failed = s3_client.upload_files(
+            [file], targets=[(MY_BUCKET, '')],
+            product="foo-bar-1.0", root=temp_root
+        )
+        self.assertEqual(0, len(failed))
+        obj = self.mock_s3.Bucket(MY_BUCKET).Object(os.path.join(path, "foo-bar-1.0-dist.zip"))
+        # ETag of multipart uploaded object contains the parts count
+        self.assertTrue(obj.e_tag.strip('"').endswith("-3"))
+        self.assertEqual(sha1, obj.metadata[CHECKSUM_META_KEY])
+        self.assertEqual("application/zip", obj.content_type)
+        with open(file, "rb") as f:
+            self.assertEqual(f.read(), obj.get()["Body"].read())
+
+        shutil.rmtree(temp_root)
+
+    def test_upload_files_multipart_copy(self):
+        extra_bucket = "my_extra_bucket"
+        self.mock_s3.create_bucket(Bucket=extra_bucket)
+        temp_root = os.path.join(self.tempdir, "tmp_mpc")
+        path = "org/foo/bar/1.0"
+        os.makedirs(os.path.join(temp_root, path))
+        file = os.path.join(temp_root, path, "foo-bar-1.0-dist.zip")
+        with open(file, "wb") as f:
+            f.write(os.urandom(12 * 1024 * 1024))
+        sha1 = read_sha1(file)
+        s3_client = S3Client(multipart_chunksize=5 * 1024 * 1024)
+        with mock.patch("charon.storage.MAX_COPY_SIZE", 6 * 1024 * 1024):
+            failed = s3_client.upload_files(
+                [file], targets=[(MY_BUCKET, ''), (extra_bucket, MY_PREFIX)],
+                product="foo-bar-1.0", root=temp_root
+            )
+        self.assertEqual(0, len(failed))
+        obj = self.mock_s3.Bucket(extra_bucket).Object(
+            os.path.join(MY_PREFIX, path, "foo-bar-1.0-dist.zip")
+        )
+        self.assertTrue(obj.e_tag.strip('"').endswith("-3"))
+        self.assertEqual(sha1, obj.metadata[CHECKSUM_META_KEY])
+        self.assertEqual("application/zip", obj.content_type)
+        with open(file, "rb") as f:
+            self.assertEqual(f.read(), obj.get()["Body"].read())
+
+        self.mock_s3.Bucket(extra_bucket).objects.all().delete()
+        self.mock_s3.Bucket(extra_bucket).delete()
+        shutil.rmtree(temp_root)
+
+    def test_upload_files_throttled(self):
+        (temp_root, root, all_files) = self.__prepare_files()
+        test_files = list(filter(lambda f: f.startswith(root), all_files))
+        s3_client = S3Client(con_limit=8)
+        throttled = []
+
+        class FakeResponse(object):
+            status_code = 503
+
+        def throttle(params, **kwargs):
+            if len(throttled) < 3:
+                throttled.append(params.get("url_path", ""))
+                return (FakeResponse(), {
+                    "Error": {"Code": "SlowDown", "Message": "Please reduce your request rate."},
+                    "ResponseMetadata": {"HTTPStatusCode": 503}
+                })
+            return None
+
+        events = s3_client._S3Client__transport.client.meta.events
+        events.register("before-call.s3.PutObject", throttle)
+        with mock.patch("charon.storage.THROTTLE_BACKOFF_BASE", 0.001):
+            failed = s3_client.upload_files(
+                test_files, targets=[(MY_BUCKET, '')],
+                product="apache-commons", root=root
+            )
+        self.assertEqual(0, len(failed))
+        self.assertEqual(3, len(throttled))
+        bucket = self.mock_s3.Bucket(MY_BUCKET)
+        self.assertEqual(COMMONS_LANG3_ZIP_MVN_ENTRY * 2, len(list(bucket.objects.all())))
+        summary = s3_client.get_concurrency_summary()
+        self.assertEqual(8, summary["initial"])
+        self.assertEqual(3, summary["throttled"])
+        self.assertLess(summary["lowest"], 8)
+
+        shutil.rmtree(temp_root)
+
+    def test_upload_files_with_journal(self):
+        (temp_root, root, all_files) = self.__prepare_files()
+        test_files = list(filter(lambda f: f.startswith(root), all_files))
+        journal_path = os.path.join(self.tempdir, "journals", "apache-commons.journal")
+        journal = UploadJournal(journal_path)
+        s3_client = S3Client(journal=journal)
+        failed = s3_client.upload_files(
+            test_files, targets=[(MY_BUCKET, '')],
+            product="apache-commons", root=root
+        )
+        self.assertEqual(0, len(failed))
+        self.assertEqual(COMMONS_LANG3_ZIP_MVN_ENTRY, len(journal))
+        journal.close(False)
+        self.assertTrue(os.path.isfile(journal_path))
+
+        # Resume the uploading with the journal, all files will be skipped
+        journal = UploadJournal(journal_path, resume=True)
+        self.assertEqual(COMMONS_LANG3_ZIP_MVN_ENTRY, len(journal))
+        s3_client = S3Client(journal=journal)
+        events = s3_client._S3Client__transport.client.meta.events
+        requests = []
+        for operation in ["HeadObject", "GetObject", "PutObject"]:
+            events.register(
+                f"before-call.s3.{operation}",
+                lambda params, **kwargs: requests.append(params.get("url_path", ""))
+            )
+        failed = s3_client.upload_files(
+            test_files, targets=[(MY_BUCKET, '')],
+            product="apache-commons", root=root
+        )
+        self.assertEqual(0, len(failed))
+        self.assertEqual(0, len(requests))
+        journal.close(True)
+        self.assertFalse(os.path.exists(journal_path))
+
+        shutil.rmtree(temp_root)
+
+    def test_upload_files_replication(self):
+        (temp_root, root, all_files) = self.__prepare_files()
+        test_files = list(filter(lambda f: f.startswith(root), all_files))
+        extra_buckets = ["my_extra_bucket1", "my_extra_bucket2"]
+        for extra_bucket in extra_buckets:
+            self.mock_s3.create_bucket(Bucket=extra_bucket)
+        targets = [(MY_BUCKET, '')]
+        targets.extend([(b, MY_PREFIX) for b in extra_buckets])
+        # The missing bucket only fails its own replications
+        targets.append(("my_missing_bucket", ''))
+        failed = self.s3_client.upload_files(
+            test_files, targets=targets,
+            product="apache-commons", root=root
+        )
+        self.assertEqual(sorted(test_files), sorted(failed))
+        bucket = self.mock_s3.Bucket(MY_BUCKET)
+        self.assertEqual(COMMONS_LANG3_ZIP_MVN_ENTRY * 2, len(list(bucket.objects.all())))
+        for extra_bucket in extra_buckets:
+            bucket = self.mock_s3.Bucket(extra_bucket)
+            objs = list(bucket.objects.all())
+            self.assertEqual(COMMONS_LANG3_ZIP_MVN_ENTRY * 2, len(objs))
+            for obj in objs:
+                self.assertTrue(obj.key.startswith(MY_PREFIX))
+            for obj in [o for o in objs if o.key.endswith(PROD_INFO_SUFFIX)]:
+                self.assertEqual("apache-commons", str(obj.get()["Body"].read(), "utf-8"))
+            bucket.objects.all().delete()
+            bucket.delete()
+
+        shutil.rmtree(temp_root)
+
+    def test_delete_files_in_batch(self):
+        (temp_root, root, all_files) = self.__prepare_files()
+        test_files = list(filter(lambda f: f.startswith(root), all_files))
+        bucket = self.mock_s3.Bucket(MY_BUCKET)
+        self.s3_client.upload_files(
+            test_files, targets=[(MY_BUCKET, '')],
+            product="apache-commons", root=root
+        )
+        self.assertEqual(COMMONS_LANG3_ZIP_MVN_ENTRY * 2, len(list(bucket.objects.all())))
+
+        heads = self.__count_requests("HeadObject")
+        deletes = self.__count_requests("DeleteObjects")
+        failed = self.s3_client.delete_files(
+            test_files, target=(MY_BUCKET, ''), product="apache-commons", root=root
+        )
+        self.assertEqual(0, len(failed))
+        self.assertEqual(0, len(heads))
+        # All files with their .prodinfo files are deleted in one request
+        self.assertEqual(1, len(deletes))
+        self.assertEqual(0, len(list(bucket.objects.all())))
+
+        shutil.rmtree(temp_root)
+
+    def test_request_metrics(self):
+        (temp_root, root, all_files) = self.__prepare_files()
+        test_files = list(filter(lambda f: f.startswith(root), all_files))
+        metrics = get_request_metrics()
+
+        def write_counts() -> Dict[str, int]:
+            summary = metrics.summary()
+            metrics.reset()
+            return {
+                o["operation"]: o["count"] for o in summary["operations"]
+                if o["operation"] in ("put_object", "delete_objects")
+            }
+
+        # The dry run counts the requests which would be sent
+        metrics.reset()
+        S3Client(dry_run=True).upload_files(
+            test_files, targets=[(MY_BUCKET, '')], product="apache-commons", root=root
+        )
+        dry_run_counts = write_counts()
+        self.s3_client.upload_files(
+            test_files, targets=[(MY_BUCKET, '')], product="apache-commons", root=root
+        )
+        summary = metrics.summary()
+        self.assertEqual({"put_object": COMMONS_LANG3_ZIP_MVN_ENTRY * 2}, dry_run_counts)
+        self.assertEqual(dry_run_counts, write_counts())
+        put = [o for o in summary["operations"] if o["operation"] == "put_object"][0]
+        self.assertEqual(MY_BUCKET, put["bucket"])
+        self.assertEqual(0, put["skipped"])
+        self.assertTrue(put["bytes_sent"] >= sum(os.path.getsize(f) for f in test_files))
+
+        S3Client(dry_run=True).delete_files(
+            test_files, target=(MY_BUCKET, ''), product="apache-commons", root=root
+        )
+        dry_run_counts = write_counts()
+        self.s3_client.delete_files(
+            test_files, target=(MY_BUCKET, ''), product="apache-commons", root=root
+        )
+        self.assertEqual({"delete_objects": 1}, dry_run_counts)
+        self.assertEqual(dry_run_counts, write_counts())
+
+        shutil.rmtree(temp_root)
+
+    def test_batch_deleter_errors(self):
+        class FakeTransport(object):
+            requests: List[List[str]] = []
+
+            async def call(self, operation, Bucket, Delete):
+                keys = [o["Key"] for o in Delete["Objects"]]
+                self.requests.append(keys)
+                return {"Errors": [
+                    {"Key": k, "Code": "AccessDenied", "Message": "Access Denied"}
+                    for k in keys if k.startswith("denied")
+                ]}
+
+        transport = FakeTransport()
+        loop = asyncio.get_event_loop()
+        deleter = _BatchDeleter(
+            transport.call, MY_BUCKET, AdaptiveLimiter(2), batch_size=2
+        )
+
+        async def add_all():
+            deleter.add("ok/a.jar", "/tmp/ok/a.jar")
+            deleter.add("ok/a.jar.prodinfo", "/tmp/ok/a.jar")
+            deleter.add("denied/b.jar", "/tmp/denied/b.jar")
+            deleter.add("denied/b.jar.prodinfo", "/tmp/denied/b.jar")
+            deleter.add("ok/c.jar", "/tmp/ok/c.jar")
+            return await deleter.close()
+
+        failed = loop.run_until_complete(add_all())
+        self.assertEqual(["/tmp/denied/b.jar"], failed)
+        self.assertEqual(3, len(transport.requests))
+        self.assertEqual(5, sum([len(r) for r in transport.requests]))
+
     def test_exists_in_bucket(self):
         bucket = self.mock_s3.Bucket(MY_BUCKET)
         path = "org/foo/bar/1.0/foo-bar-1.0.pom"
@@ -491,6 +788,125 @@ class S3ClientTest(BaseTest):
 
         shutil.rmtree(temp_root)
 
+    def test_read_file_content_cache(self):
+        key = "org/foo/bar/maven-metadata.xml"
+        bucket = self.mock_s3.Bucket(MY_BUCKET)
+        bucket.put_object(Key=key, Body=b"version 1")
+        gets = self.__count_requests("GetObject")
+        modified = []
+        events = self.s3_client._S3Client__transport.client.meta.events
+        events.register(
+            "after-call.s3.GetObject",
+            lambda http_response, **kwargs: modified.append(http_response.status_code)
+        )
+
+        self.assertEqual("version 1", self.s3_client.read_file_content(MY_BUCKET, key))
+        self.assertEqual("version 1", self.s3_client.read_file_content(MY_BUCKET, key))
+        # The second reading is revalidated without downloading the content
+        self.assertEqual(2, len(gets))
+        self.assertEqual([200, 304], modified)
+        summary = self.s3_client.get_content_cache_summary()
+        self.assertEqual((1, 1, 1), (
+            summary["hits"], summary["misses"], summary["revalidations"]
+        ))
+
+        # Changed by others
+        bucket.put_object(Key=key, Body=b"version 2")
+        self.assertEqual("version 2", self.s3_client.read_file_content(MY_BUCKET, key))
+        summary = self.s3_client.get_content_cache_summary()
+        self.assertEqual((2, 2), (summary["misses"], summary["revalidations"]))
+
+        # Written by charon itself
+        self.s3_client.simple_delete_file(key, (MY_BUCKET, ""))
+        self.assertEqual(0, self.s3_client.get_content_cache_summary()["entries"])
+        self.assertRaises(
+            ClientError, self.s3_client.read_file_content, MY_BUCKET, key
+        )
+
+    def test_listing_cache(self):
+        bucket = self.mock_s3.Bucket(MY_BUCKET)
+        for key in ["org/foo/bar/1.0/bar-1.0.pom", "org/foo/bar/1.0/bar-1.0.jar",
+                    "org/foo/bar/maven-metadata.xml"]:
+            bucket.put_object(Key=key, Body=b"test")
+        self.s3_client = S3Client(listing_cache=True)
+        lists = self.__count_requests("ListObjectsV2")
+        heads = self.__count_requests("HeadObject")
+
+        (files, success) = self.s3_client.get_files(MY_BUCKET, "org/foo/", ".pom")
+        self.assertTrue(success)
+        self.assertEqual(["org/foo/bar/1.0/bar-1.0.pom"], files)
+        (files, _) = self.s3_client.get_files(MY_BUCKET, "org/foo/bar/", ".jar")
+        self.assertEqual(["org/foo/bar/1.0/bar-1.0.jar"], files)
+        self.assertEqual(
+            ["org/foo/bar/1.0/", "org/foo/bar/maven-metadata.xml"],
+            self.s3_client.list_folder_content(MY_BUCKET, "org/foo/bar")
+        )
+        self.assertTrue(
+            self.s3_client.file_exists_in_bucket(MY_BUCKET, "org/foo/bar/1.0/bar-1.0.pom")
+        )
+        self.assertEqual(1, len(lists))
+        self.assertEqual(0, len(heads))
+
+        # Patched by the writes and deletes of the client
+        self.s3_client.simple_upload_file(
+            "org/foo/bar/2.0/bar-2.0.pom", "test", (MY_BUCKET, "")
+        )
+        self.s3_client.simple_delete_file("org/foo/bar/1.0/bar-1.0.pom", (MY_BUCKET, ""))
+        (files, _) = self.s3_client.get_files(MY_BUCKET, "org/foo/", ".pom")
+        self.assertEqual(["org/foo/bar/2.0/bar-2.0.pom"], files)
+        self.assertEqual(
+            ["org/foo/bar/1.0/", "org/foo/bar/2.0/", "org/foo/bar/maven-metadata.xml"],
+            self.s3_client.list_folder_content(MY_BUCKET, "org/foo/bar/")
+        )
+        self.assertFalse(
+            self.s3_client.file_exists_in_bucket(MY_BUCKET, "org/foo/bar/1.0/bar-1.0.pom")
+        )
+        self.assertEqual(1, len(lists))
+
+    def test_sharded_listing(self):
+        bucket = self.mock_s3.Bucket(MY_BUCKET)
+        all_keys = ["org/index.html", "org/jboss/index.html"]
+        for group in ["a", "b", "c", "d"]:
+            for version in range(6):
+                all_keys.append(f"org/jboss/{group}/{version}.0/{group}-{version}.0.pom")
+                all_keys.append(f"org/jboss/{group}/{version}.0/{group}-{version}.0.jar")
+        all_keys.append("org/jboss/e.txt")
+        for key in all_keys:
+            bucket.put_object(Key=key, Body=b"test")
+        all_keys.append("other/1.0/other-1.0.pom")
+        bucket.put_object(Key="other/1.0/other-1.0.pom", Body=b"test")
+        lists = self.__count_requests("ListObjectsV2")
+
+        with mock.patch("charon.storage.LISTING_PAGE_SIZE", 5):
+            (files, success) = self.s3_client.get_files(MY_BUCKET, "org/")
+            self.assertTrue(success)
+            self.assertEqual(sorted(k for k in all_keys if k.startswith("org/")), files)
+            (files, _) = self.s3_client.get_files(MY_BUCKET, suffix=".pom")
+            self.assertEqual(sorted(k for k in all_keys if k.endswith(".pom")), files)
+            jars = list(self.s3_client.iter_files(MY_BUCKET, "org/jboss/", ".jar"))
+            self.assertEqual(sorted(k for k in all_keys if k.endswith(".jar")), sorted(jars))
+            self.assertEqual(
+                ["org/jboss/a/", "org/jboss/b/", "org/jboss/c/", "org/jboss/d/",
+                 "org/jboss/e.txt", "org/jboss/index.html"],
+                self.s3_client.list_folder_content(MY_BUCKET, "org/jboss")
+            )
+        self.assertTrue(len(lists) > 0)
+
+        # Small listings are done with one request
+        del lists[:]
+        (files, _) = self.s3_client.get_files(MY_BUCKET, "org/jboss/a/", ".pom")
+        self.assertEqual(6, len(files))
+        self.assertEqual(1, len(lists))
+
+    def __count_requests(self, operation: str) -> List[str]:
+        requests = []
+        events = self.s3_client._S3Client__transport.client.meta.events
+        events.register(
+            f"before-call.s3.{operation}",
+            lambda params, **kwargs: requests.append(params.get("url_path", ""))
+        )
+        return requests
+
     def __prepare_files(self):
         test_zip = zipfile.ZipFile(
             os.path.join(INPUTS, "commons-lang3.zip")
@@ -0,0 +1,153 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from botocore.exceptions import ClientError
+from charon.storage import S3Client
+from charon.transport import (
+    new_transport, AioS3Transport, AioSession, ExecutorS3Transport, TRANSPORT_ENV
+)
+from tests.base import BaseTest
+from tests.commons import TEST_BUCKET
+from tests.s3_proxy import FaultyS3Test
+from moto import mock_aws
+from unittest import mock
+import asyncio
+import boto3
+import os
+import threading
+import unittest
+
+MY_BUCKET = "my_bucket"
+
+
+@mock_aws
+class TransportTest(BaseTest):
+    def setUp(self):
+        super().setUp()
+        self.mock_s3 = boto3.resource('s3')
+        self.mock_s3.create_bucket(Bucket=MY_BUCKET)
+
+    def test_fallback_to_executor(self):
+        # The aio transport is only used when it is asked for
+        transport = new_transport(con_limit=5)
+        self.assertIsInstance(transport, ExecutorS3Transport)
+        with mock.patch("charon.transport.AioSession", None):
+            transport = new_transport(con_limit=5, kind="auto")
+            self.assertIsInstance(transport, ExecutorS3Transport)
+            transport = new_transport(con_limit=5)
+            self.assertIsInstance(transport, ExecutorS3Transport)
+            transport = new_transport(con_limit=5, kind="unknown")
+            self.assertIsInstance(transport, ExecutorS3Transport)
+        os.environ[TRANSPORT_ENV] = "executor"
+        transport = new_transport(con_limit=5)
+        self.assertIsInstance(transport, ExecutorS3Transport)
+        # Connection pool is sized with the concurrency budget
+        self.assertEqual(5, transport.client.meta.config.max_pool_connections)
+
+    def test_executor_calls(self):
+        transport = new_transport(con_limit=2, kind="executor")
+        transport.call_sync(
+            "put_object", Bucket=MY_BUCKET, Key="a/b.txt", Body=b"test content"
+        )
+        result = transport.call_sync("get_object", Bucket=MY_BUCKET, Key="a/b.txt")
+        self.assertEqual(b"test content", result["Body"])
+
+        async def get_all():
+            return await asyncio.gather(*[
+                transport.call("get_object", Bucket=MY_BUCKET, Key="a/b.txt")
+                for _ in range(5)
+            ])
+        results = asyncio.get_event_loop().run_until_complete(get_all())
+        self.assertEqual([b"test content"] * 5, [r["Body"] for r in results])
+
+        file_path = os.path.join(self.tempdir, "b.txt")
+        transport.download_sync(MY_BUCKET, "a/b.txt", file_path)
+        with open(file_path, "rb") as f:
+            self.assertEqual(b"test content", f.read())
+
+    def test_body_size_limit(self):
+        transport = new_transport(con_limit=2, kind="executor")
+        transport.call_sync("put_object", Bucket=MY_BUCKET, Key="big.bin", Body=b"0" * 100)
+        with mock.patch("charon.transport.MAX_BODY_SIZE", 99):
+            with self.assertRaises(ValueError):
+                transport.call_sync("get_object", Bucket=MY_BUCKET, Key="big.bin")
+            # Big objects are downloaded to files instead
+            file_path = os.path.join(self.tempdir, "big.bin")
+            transport.download_sync(MY_BUCKET, "big.bin", file_path)
+            self.assertEqual(100, os.path.getsize(file_path))
+
+
+@unittest.skipUnless(AioSession, "aiobotocore is not installed")
+class AioTransportTest(FaultyS3Test):
+    def new_aio_transport(self) -> AioS3Transport:
+        transport = new_transport(
+            endpoint_url=self.s3_server.endpoint, con_limit=2, kind="aio"
+        )
+        self.assertIsInstance(transport, AioS3Transport)
+        return transport
+
+    def test_aio_calls(self):
+        transport = self.new_aio_transport()
+        try:
+            transport.call_sync(
+                "put_object", Bucket=TEST_BUCKET, Key="a/b.txt", Body=b"test content"
+            )
+            result = transport.call_sync("get_object", Bucket=TEST_BUCKET, Key="a/b.txt")
+            self.assertEqual(b"test content", result["Body"])
+
+            async def get_all():
+                return await asyncio.gather(*[
+                    transport.call("get_object", Bucket=TEST_BUCKET, Key="a/b.txt")
+                    for _ in range(5)
+                ])
+            results = asyncio.new_event_loop().run_until_complete(get_all())
+            self.assertEqual([b"test content"] * 5, [r["Body"] for r in results])
+
+            file_path = os.path.join(self.tempdir, "b.txt")
+            transport.download_sync(TEST_BUCKET, "a/b.txt", file_path)
+            with open(file_path, "rb") as f:
+                self.assertEqual(b"test content", f.read())
+
+            with mock.patch("charon.transport.MAX_BODY_SIZE", 5):
+                with self.assertRaises(ValueError):
+                    transport.call_sync("get_object", Bucket=TEST_BUCKET, Key="a/b.txt")
+        finally:
+            transport.close()
+
+    def test_aio_errors(self):
+        transport = self.new_aio_transport()
+        try:
+            # The errors are raised as the ClientError of botocore, like the
+            # executor transport
+            with self.assertRaises(ClientError) as e:
+                transport.call_sync("get_object", Bucket=TEST_BUCKET, Key="missing.txt")
+            self.assertEqual("NoSuchKey", e.exception.response["Error"]["Code"])
+            with self.assertRaises(ClientError) as e:
+                transport.call_sync("head_object", Bucket=TEST_BUCKET, Key="missing.txt")
+            self.assertEqual("404", e.exception.response["Error"]["Code"])
+        finally:
+            transport.close()
+
+    def test_aio_close(self):
+        os.environ[TRANSPORT_ENV] = "aio"
+        with S3Client() as client:
+            self.assertTrue(_has_aio_thread())
+            self.assertFalse(client.file_exists_in_bucket(TEST_BUCKET, "missing.txt"))
+        # The event loop thread of the transport is stopped by closing
+        self.assertFalse(_has_aio_thread())
+
+
+def _has_aio_thread() -> bool:
+    return any(t.name == "charon-s3-aio" for t in threading.enumerate())
@@ -13,8 +13,12 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-from charon.utils.files import digest, digest_content, read_sha1, HashType
+from charon.utils.files import (
+    digest, digests, digest_content, integrity, read_sha1, HashType
+)
+import hashlib
 import os
+import tempfile
 import unittest
 
 from tests.constants import INPUTS
@@ -29,6 +33,39 @@ class UtilTest(unittest.TestCase):
             digest(test_file, HashType.SHA256),
         )
 
+    def test_digests(self):
+        test_file = os.path.join(INPUTS, "commons-lang3.zip")
+        hash_types = [HashType.MD5, HashType.SHA1, HashType.SHA256, HashType.SHA512]
+        checksums = digests(test_file, hash_types)
+        self.assertEqual(set(hash_types), set(checksums.keys()))
+        self.assertEqual("bd4fe0a8111df64430b6b419a91e4218ddf44734", checksums[HashType.SHA1])
+        self.assertEqual(
+            "61ff1d38cfeb281b05fcd6b9a2318ed47cd62c7f99b8a9d3e819591c03fe6804",
+            checksums[HashType.SHA256],
+        )
+        for hash_type in hash_types:
+            self.assertEqual(digest(test_file, hash_type), checksums[hash_type])
+
+        # Empty file and file bigger than one chunk
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for size in [0, 3 * 1024 * 1024 + 7]:
+                content = os.urandom(size)
+                test_file = os.path.join(temp_dir, "test.bin")
+                with open(test_file, "wb") as f:
+                    f.write(content)
+                checksums = digests(test_file, [HashType.MD5, HashType.SHA512])
+                self.assertEqual(hashlib.md5(content).hexdigest(), checksums[HashType.MD5])
+                self.assertEqual(
+                    hashlib.sha512(content).hexdigest(), checksums[HashType.SHA512]
+                )
+
+    def test_integrity(self):
+        self.assertEqual(
+            "sha512-zQZtBQ6sG5io17kt7GacUjbf5H8CvF7sLj0bZvbl1iADIt7ZTGarlAzLkPgFAy35q3gX1"
+            "4rO0WF1wohLVTaarQ==",
+            integrity(hashlib.sha512(b"hello" * 1000).hexdigest())
+        )
+
     def test_digest_content(self):
         test_content = "test common content"
         self.assertEqual("8c7b70f25fb88bc6a0372f70f6805132e90e2029", digest_content(test_content))
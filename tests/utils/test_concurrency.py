@@ -0,0 +1,109 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from charon.utils.concurrency import AdaptiveLimiter, backoff_delay
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import time
+import unittest
+
+
+class AdaptiveLimiterTest(unittest.TestCase):
+    def test_additive_increase(self):
+        limiter = AdaptiveLimiter(4, maximum=6)
+        for _ in range(4):
+            limiter.on_success(0.1)
+        self.assertEqual(5, limiter.limit)
+        for _ in range(100):
+            limiter.on_success(0.1)
+        self.assertEqual(6, limiter.limit)
+
+    def test_no_increase_with_bad_latency(self):
+        limiter = AdaptiveLimiter(4, maximum=10)
+        limiter.on_success(0.1)
+        for _ in range(100):
+            limiter.on_success(10)
+        self.assertEqual(4, limiter.limit)
+
+    def test_multiplicative_decrease(self):
+        limiter = AdaptiveLimiter(16, minimum=3)
+        started = time.monotonic()
+        limiter.on_throttle(started)
+        self.assertEqual(8, limiter.limit)
+        # Throttles of the requests started before the decrease
+        # will not decrease the limit again
+        limiter.on_throttle(started)
+        self.assertEqual(8, limiter.limit)
+        for _ in range(3):
+            limiter.on_throttle(time.monotonic())
+        self.assertEqual(3, limiter.limit)
+        summary = limiter.summary()
+        self.assertEqual(16, summary["initial"])
+        self.assertEqual(3, summary["final"])
+        self.assertEqual(3, summary["lowest"])
+        self.assertEqual(16, summary["highest"])
+        self.assertEqual(5, summary["throttled"])
+
+    def test_limit_in_flight(self):
+        limiter = AdaptiveLimiter(3)
+        in_flight = []
+        peak = []
+
+        async def work():
+            async with limiter:
+                in_flight.append(1)
+                peak.append(len(in_flight))
+                await asyncio.sleep(0.01)
+                in_flight.pop()
+
+        async def run_all():
+            await asyncio.gather(*[work() for _ in range(20)])
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(run_all())
+        finally:
+            loop.close()
+        self.assertEqual(3, max(peak))
+        self.assertEqual(20, len(peak))
+
+    def test_shared_by_threads(self):
+        limiter = AdaptiveLimiter(2)
+        done = []
+
+        def run_in_thread():
+            async def work():
+                async with limiter:
+                    await asyncio.sleep(0.01)
+                    done.append(1)
+
+            async def run_all():
+                await asyncio.gather(*[work() for _ in range(5)])
+
+            loop = asyncio.new_event_loop()
+            try:
+                loop.run_until_complete(run_all())
+            finally:
+                loop.close()
+
+        with ThreadPoolExecutor(4) as executor:
+            for f in [executor.submit(run_in_thread) for _ in range(4)]:
+                f.result()
+        self.assertEqual(20, len(done))
+
+    def test_backoff_delay(self):
+        for attempt in range(1, 10):
+            delay = backoff_delay(attempt, 0.1, 1.0)
+            self.assertTrue(0 <= delay <= min(1.0, 0.1 * 2 ** attempt))
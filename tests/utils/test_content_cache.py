@@ -0,0 +1,61 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from charon.utils.content_cache import ContentCache
+import shutil
+import tempfile
+import unittest
+
+
+class ContentCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix="charon-test-")
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    def test_lru(self):
+        cache = ContentCache(max_entries=2, max_bytes=10)
+        cache.put("bucket", "a", '"1"', b"aaa")
+        cache.put("bucket", "b", '"2"', b"bbb")
+        self.assertEqual(('"1"', b"aaa"), cache.get("bucket", "a"))
+        cache.put("bucket", "c", '"3"', b"ccc")
+        # b is the least recently used one
+        self.assertIsNone(cache.get("bucket", "b"))
+        self.assertIsNotNone(cache.get("bucket", "a"))
+
+        cache.put("bucket", "d", '"4"', b"dddddddd")
+        self.assertEqual(1, cache.summary()["entries"])
+        self.assertEqual(8, cache.summary()["bytes"])
+        # Too big to be cached
+        cache.put("bucket", "e", '"5"', b"e" * 11)
+        self.assertIsNone(cache.get("bucket", "e"))
+
+        cache.invalidate("bucket", "d")
+        self.assertEqual(0, cache.summary()["entries"])
+        self.assertEqual(0, cache.summary()["bytes"])
+
+    def test_disk(self):
+        cache = ContentCache(disk_dir=self.tempdir)
+        cache.put("bucket", "a/b.xml", '"1"', b"<xml>\n</xml>")
+        cache.put("bucket", "a/c.xml", '"2"', b"c")
+
+        cache = ContentCache(disk_dir=self.tempdir)
+        self.assertEqual(('"1"', b"<xml>\n</xml>"), cache.get("bucket", "a/b.xml"))
+        self.assertIsNone(cache.get("other", "a/b.xml"))
+        cache.invalidate("bucket", "a/c.xml")
+
+        cache = ContentCache(disk_dir=self.tempdir)
+        self.assertIsNone(cache.get("bucket", "a/c.xml"))
@@ -0,0 +1,146 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from charon.utils.archive import ExtractedZipFiles, ZipSource
+from charon.utils.digest_cache import COMMIT_BATCH_SIZE, DigestCache
+from charon.utils.files import (
+    digest, digests, get_digest_cache, HashType, DIGEST_CACHE_ENV
+)
+from tests.constants import INPUTS
+from zipfile import ZipFile
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+
+class DigestCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix="charon-test-")
+        self.db_path = os.path.join(self.tempdir, "cache", "digest_cache.db")
+        self.file = os.path.join(self.tempdir, "test.txt")
+        with open(self.file, "w", encoding="utf-8") as f:
+            f.write("test content")
+
+    def tearDown(self):
+        os.environ.pop(DIGEST_CACHE_ENV, None)
+        get_digest_cache()
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    def test_get_and_put(self):
+        cache = DigestCache(self.db_path)
+        self.assertEqual({}, cache.get(self.file, "1", ["SHA1"]))
+        cache.put(self.file, "1", {"SHA1": "abc", "MD5": "def"})
+        self.assertEqual({"SHA1": "abc"}, cache.get(self.file, "1", ["SHA1", "SHA256"]))
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(2, cache.misses)
+        # A changed content is not served
+        self.assertEqual({}, cache.get(self.file, "2", ["SHA1"]))
+        cache.close()
+
+        # The cache is persistent
+        cache = DigestCache(self.db_path)
+        self.assertEqual(
+            {"SHA1": "abc", "MD5": "def"}, cache.get(self.file, "1", ["SHA1", "MD5"])
+        )
+        cache.close()
+
+    def test_batched_commits(self):
+        cache = DigestCache(self.db_path)
+        cache.put("a", "1", {"SHA1": "abc"})
+        # The put is not committed yet, so another connection does not see it
+        other = DigestCache(self.db_path)
+        self.assertEqual({}, other.get("a", "1", ["SHA1"]))
+        cache.flush()
+        self.assertEqual({"SHA1": "abc"}, other.get("a", "1", ["SHA1"]))
+        for i in range(COMMIT_BATCH_SIZE):
+            cache.put(str(i), "1", {"SHA1": "abc"})
+        self.assertEqual({"SHA1": "abc"}, other.get("999", "1", ["SHA1"]))
+        other.close()
+        cache.close()
+
+    def test_other_tables_kept(self):
+        os.makedirs(os.path.dirname(self.db_path))
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("CREATE TABLE digests (path TEXT)")
+        conn.execute("INSERT INTO digests VALUES ('a')")
+        conn.commit()
+        conn.close()
+        # The tables of others in the same database are not touched
+        DigestCache(self.db_path).close()
+        conn = sqlite3.connect(self.db_path)
+        self.assertEqual([("a",)], conn.execute("SELECT path FROM digests").fetchall())
+        conn.close()
+
+    def test_changed_file(self):
+        os.environ[DIGEST_CACHE_ENV] = self.db_path
+        cache = get_digest_cache()
+        digest(self.file)
+        with open(self.file, "a", encoding="utf-8") as f:
+            f.write(" changed")
+        self.assertEqual(hashlib.sha1(b"test content changed").hexdigest(), digest(self.file))
+        self.assertEqual((0, 2), (cache.hits, cache.misses))
+
+        stat = os.stat(self.file)
+        os.utime(self.file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+        digest(self.file)
+        self.assertEqual((0, 3), (cache.hits, cache.misses))
+
+    def test_reextracted_zip(self):
+        os.environ[DIGEST_CACHE_ENV] = self.db_path
+        cache = get_digest_cache()
+        zip_path = os.path.join(INPUTS, "commons-client-4.5.6.zip")
+        sha1_file = "commons-client-4.5.6/maven-repository/org/apache/httpcomponents/" \
+            "httpclient/4.5.6/httpclient-4.5.6.pom.sha1"
+        with ZipFile(zip_path) as z:
+            expected = hashlib.sha1(z.read(sha1_file)).hexdigest()
+        for i in range(2):
+            root = os.path.join(self.tempdir, f"extract-{i}")
+            source = ZipSource(zip_path, root)
+            path = os.path.join(root, sha1_file)
+            source.materialize([path], [])
+            files = ExtractedZipFiles(source)
+            self.assertEqual(expected, files.sha1(path))
+            files.close()
+        # The digest of the member is reused in another extraction folder
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+    def test_digests_with_cache(self):
+        os.environ[DIGEST_CACHE_ENV] = self.db_path
+        cache = get_digest_cache()
+        self.assertIsNotNone(cache)
+        self.assertEqual(self.db_path, cache.db_path)
+
+        sha1 = hashlib.sha1(b"test content").hexdigest()
+        self.assertEqual(sha1, digest(self.file))
+        self.assertEqual((0, 1), (cache.hits, cache.misses))
+        self.assertEqual(sha1, digest(self.file))
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+        # Only the missing hash types are calculated and cached
+        checksums = digests(self.file, [HashType.SHA1, HashType.MD5])
+        self.assertEqual(hashlib.md5(b"test content").hexdigest(), checksums[HashType.MD5])
+        self.assertEqual((2, 2), (cache.hits, cache.misses))
+
+        with open(self.file, "w", encoding="utf-8") as f:
+            f.write("changed content!")
+        self.assertEqual(hashlib.sha1(b"changed content!").hexdigest(), digest(self.file))
+
+    def test_cache_disabled(self):
+        self.assertIsNone(get_digest_cache())
+        os.environ[DIGEST_CACHE_ENV] = "false"
+        self.assertIsNone(get_digest_cache())
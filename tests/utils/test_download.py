@@ -0,0 +1,126 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from charon.utils.download import ArchiveDownloader
+from tests.http_server import RangeServer
+import hashlib
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+PART_SIZE = 64 * 1024
+
+
+class ArchiveDownloaderTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix="charon-test-download-")
+        self.server = RangeServer()
+        self.content = random.Random(0).randbytes(5 * PART_SIZE + 100)
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    def test_ranged_download(self):
+        url = self.server.put("/repo.zip", self.content)
+        downloader = ArchiveDownloader(part_size=PART_SIZE)
+        path = downloader.download(url, base_dir=self.tempdir)
+        self.assertEqual(os.path.join(self.tempdir, "repo.zip"), path)
+        with open(path, "rb") as f:
+            self.assertEqual(self.content, f.read())
+        self.assertEqual(6, len(self.server.gets))
+        self.assertTrue(all(r.startswith("bytes=") for r in self.server.gets))
+        self.assertEqual(["repo.zip"], os.listdir(self.tempdir))
+
+    def test_download_without_ranges(self):
+        self.server.accept_ranges = False
+        url = self.server.put("/repo.zip", self.content)
+        path = ArchiveDownloader(part_size=PART_SIZE).download(url, base_dir=self.tempdir)
+        with open(path, "rb") as f:
+            self.assertEqual(self.content, f.read())
+        self.assertEqual([None], self.server.gets)
+
+    def test_resume(self):
+        url = self.server.put("/repo.zip", self.content)
+        self.server.failing_starts = {2 * PART_SIZE}
+        downloader = ArchiveDownloader(part_size=PART_SIZE, connections=1, retries=1)
+        with self.assertRaises(Exception):
+            downloader.download(url, base_dir=self.tempdir)
+        self.assertFalse(os.path.exists(os.path.join(self.tempdir, "repo.zip")))
+
+        # Only the failed part is downloaded again
+        self.server.failing_starts = set()
+        self.server.gets = []
+        path = downloader.download(url, base_dir=self.tempdir)
+        with open(path, "rb") as f:
+            self.assertEqual(self.content, f.read())
+        self.assertEqual([f"bytes={2 * PART_SIZE}-{3 * PART_SIZE - 1}"], self.server.gets)
+        self.assertEqual(["repo.zip"], os.listdir(self.tempdir))
+
+    def test_resume_in_new_run(self):
+        url = self.server.put("/repo.zip", self.content)
+        self.server.failing_starts = {2 * PART_SIZE}
+        partial_dir = os.path.join(self.tempdir, "partial")
+        downloader = ArchiveDownloader(
+            part_size=PART_SIZE, connections=1, retries=1, partial_dir=partial_dir
+        )
+        with self.assertRaises(Exception):
+            downloader.download(url)
+
+        # A new run without a cache or base dir resumes the partial download
+        self.server.failing_starts = set()
+        self.server.gets = []
+        downloader = ArchiveDownloader(part_size=PART_SIZE, partial_dir=partial_dir)
+        path = downloader.download(url)
+        self.assertNotEqual(partial_dir, os.path.dirname(path))
+        with open(path, "rb") as f:
+            self.assertEqual(self.content, f.read())
+        self.assertEqual([f"bytes={2 * PART_SIZE}-{3 * PART_SIZE - 1}"], self.server.gets)
+        self.assertEqual([], os.listdir(partial_dir))
+        shutil.rmtree(os.path.dirname(path))
+
+    def test_checksum(self):
+        url = self.server.put("/repo.zip", self.content)
+        downloader = ArchiveDownloader(part_size=PART_SIZE)
+        sha256 = hashlib.sha256(self.content).hexdigest()
+        downloader.download(url, base_dir=self.tempdir, checksum=f"sha256:{sha256}")
+        with self.assertRaises(ValueError):
+            downloader.download(url, base_dir=self.tempdir, checksum="sha256:1234")
+
+    def test_cache(self):
+        cache_dir = os.path.join(self.tempdir, "cache")
+        url = self.server.put("/repo.zip", self.content)
+        downloader = ArchiveDownloader(cache_dir=cache_dir, part_size=PART_SIZE)
+        path = downloader.download(url)
+        self.assertEqual(cache_dir, os.path.dirname(path))
+
+        # The cached archive is reused while the ETag is unchanged
+        self.server.gets = []
+        self.assertEqual(path, downloader.download(url))
+        self.assertEqual([], self.server.gets)
+
+        self.server.put("/repo.zip", self.content[::-1], etag='"2"')
+        self.assertEqual(path, downloader.download(url))
+        self.assertEqual(6, len(self.server.gets))
+        with open(path, "rb") as f:
+            self.assertEqual(self.content[::-1], f.read())
+
+        # The least recently used archive is evicted
+        downloader.max_bytes = len(self.content) + 1
+        other = downloader.download(self.server.put("/other.zip", self.content))
+        self.assertTrue(os.path.isfile(other))
+        self.assertFalse(os.path.exists(path))
@@ -0,0 +1,104 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from charon.utils.listing_cache import ListingCache
+import unittest
+
+BUCKET = "test-bucket"
+
+
+class ListingCacheTest(unittest.TestCase):
+    def test_served_from_parent_listing(self):
+        cache = ListingCache()
+        self.assertIsNone(cache.get_keys(BUCKET, "org/foo/"))
+        cache.put_keys(BUCKET, "org/", [
+            "org/foo/bar/1.0/bar-1.0.pom", "org/foo/bar/maven-metadata.xml",
+            "org/foo/baz/1.0/baz-1.0.pom", "org/other.txt"
+        ])
+        self.assertEqual(
+            ["org/foo/bar/1.0/bar-1.0.pom", "org/foo/bar/maven-metadata.xml"],
+            cache.get_keys(BUCKET, "org/foo/bar/")
+        )
+        self.assertEqual(
+            ["org/foo/", "org/other.txt"], cache.get_folder(BUCKET, "org/")
+        )
+        self.assertEqual(
+            ["org/foo/bar/1.0/", "org/foo/bar/maven-metadata.xml"],
+            cache.get_folder(BUCKET, "org/foo/bar/")
+        )
+        self.assertIsNone(cache.get_folder(BUCKET, ""))
+        self.assertIsNone(cache.get_keys(BUCKET, "com/"))
+        self.assertTrue(cache.exists(BUCKET, "org/other.txt"))
+        self.assertFalse(cache.exists(BUCKET, "org/none.txt"))
+        self.assertIsNone(cache.exists(BUCKET, "com/none.txt"))
+        self.assertIsNone(cache.get_keys("other-bucket", "org/"))
+
+    def test_patched_by_writes(self):
+        cache = ListingCache()
+        cache.put_keys(BUCKET, "org/", ["org/foo/1.0/foo-1.0.pom"])
+        cache.put_folder(BUCKET, "", ["org/", "index.html"])
+        cache.put_folder(BUCKET, "com/foo/", ["com/foo/index.html"])
+        cache.put_exists(BUCKET, "com/foo/bar.txt", False)
+
+        cache.add(BUCKET, "org/foo/2.0/foo-2.0.pom")
+        cache.add(BUCKET, "com/foo/bar.txt")
+        self.assertEqual(
+            ["org/foo/1.0/foo-1.0.pom", "org/foo/2.0/foo-2.0.pom"],
+            cache.get_keys(BUCKET, "org/foo/")
+        )
+        self.assertEqual(["com/", "org/", "index.html"], cache.get_folder(BUCKET, ""))
+        self.assertEqual(
+            ["com/foo/bar.txt", "com/foo/index.html"], cache.get_folder(BUCKET, "com/foo/")
+        )
+        self.assertTrue(cache.exists(BUCKET, "com/foo/bar.txt"))
+
+        # The parent folder is patched, and the other ancestors are dropped
+        cache.remove(BUCKET, "com/foo/bar.txt")
+        self.assertEqual(["com/foo/index.html"], cache.get_folder(BUCKET, "com/foo/"))
+        self.assertIsNone(cache.get_folder(BUCKET, ""))
+        self.assertFalse(cache.exists(BUCKET, "com/foo/bar.txt"))
+        cache.remove(BUCKET, "org/foo/1.0/foo-1.0.pom")
+        self.assertEqual(["org/foo/2.0/foo-2.0.pom"], cache.get_keys(BUCKET, "org/"))
+
+    def test_relisted_prefix(self):
+        cache = ListingCache()
+        cache.put_keys(BUCKET, "org/foo/", ["org/foo/a", "org/foo/b"])
+        cache.put_keys(BUCKET, "org/", ["org/foo/a", "org/bar"])
+        self.assertEqual(["org/bar", "org/foo/a"], cache.get_keys(BUCKET, "org/"))
+        self.assertEqual(["org/foo/a"], cache.get_keys(BUCKET, "org/foo/"))
+        summary = cache.summary()
+        self.assertEqual((2, 0), (summary["hits"], summary["misses"]))
+
+    def test_many_prefixes(self):
+        cache = ListingCache()
+        # The preflight listings come in one prefix at a time, in any order
+        for i in reversed(range(200)):
+            prefix = f"org/foo/{i:03d}/"
+            cache.put_keys(BUCKET, prefix, [prefix + "a.pom", prefix + "a.jar"])
+        self.assertEqual(
+            ["org/foo/050/a.jar", "org/foo/050/a.pom"], cache.get_keys(BUCKET, "org/foo/050/")
+        )
+        self.assertIsNone(cache.get_keys(BUCKET, "org/foo/"))
+        self.assertIsNone(cache.get_keys(BUCKET, "org/foo/05"))
+        self.assertIsNone(cache.exists(BUCKET, "org/foo/200/a.pom"))
+        self.assertFalse(cache.exists(BUCKET, "org/foo/199/b.pom"))
+
+        # A parent listing replaces the listings under it
+        cache.put_keys(BUCKET, "org/foo/1", ["org/foo/1-other", "org/foo/150/a.pom"])
+        self.assertEqual(
+            ["org/foo/1-other", "org/foo/150/a.pom"], cache.get_keys(BUCKET, "org/foo/1")
+        )
+        self.assertFalse(cache.exists(BUCKET, "org/foo/150/a.jar"))
+        self.assertEqual(2, len(cache.get_keys(BUCKET, "org/foo/099/")))
@@ -0,0 +1,123 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from charon.utils.archive import ZipSource
+from charon.utils.remote_zip import HttpRangeFile
+from tests.constants import INPUTS
+from tests.http_server import RangeServer
+from zipfile import ZipFile
+import io
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+ROOT = "commons-client-4.5.6/maven-repository"
+JAR = "org/apache/httpcomponents/httpclient/4.5.6/httpclient-4.5.6.jar"
+
+
+class HttpRangeFileTest(unittest.TestCase):
+    def setUp(self):
+        self.server = RangeServer()
+        self.content = random.Random(0).randbytes(300 * 1024)
+        self.url = self.server.put("/file.bin", self.content)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_read_and_seek(self):
+        with HttpRangeFile(self.url) as f:
+            self.assertEqual(len(self.content), f.size)
+            self.assertEqual(self.content[:100], f.read(100))
+            # A short forward seek is served by the open response
+            f.seek(1000, io.SEEK_CUR)
+            self.assertEqual(self.content[1100:1200], f.read(100))
+            self.assertEqual(1, len(self.server.gets))
+
+            f.seek(-50, io.SEEK_END)
+            self.assertEqual(self.content[-50:], f.read())
+            self.assertEqual(b"", f.read(10))
+            self.assertEqual(2, len(self.server.gets))
+
+    def test_clone_is_limited_to_end(self):
+        with HttpRangeFile(self.url) as f, f.clone(end=5000) as part:
+            part.seek(1000)
+            self.assertEqual(self.content[1000:3000], part.read(2000))
+            self.assertEqual(["bytes=1000-4999"], self.server.gets)
+
+    def test_retry(self):
+        self.server.failing_starts = {20}
+        with HttpRangeFile(self.url, retries=0) as f:
+            f.seek(20)
+            with self.assertRaises(Exception):
+                f.read(100)
+        self.server.gets = []
+        with HttpRangeFile(self.url, retries=1) as f:
+            f.seek(20)
+            # The broken response is requested again from where it broke
+            self.assertEqual(self.content[20:120], f.read(100))
+            self.assertEqual(["bytes=20-65555", "bytes=30-65565"], self.server.gets)
+
+    def test_no_ranges(self):
+        self.server.accept_ranges = False
+        with self.assertRaises(OSError):
+            HttpRangeFile(self.url)
+
+
+class RemoteZipSourceTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix="charon-test-remote-zip-")
+        self.server = RangeServer()
+        self.zip_path = os.path.join(INPUTS, "commons-client-4.5.6.zip")
+        with open(self.zip_path, "rb") as f:
+            self.url = self.server.put("/repo.zip", f.read())
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    def test_remote_members(self):
+        local = ZipSource(self.zip_path, self.tempdir)
+        remote = ZipSource(self.url, self.tempdir)
+        try:
+            self.assertEqual(sorted(local.members()), sorted(remote.members()))
+            self.assertEqual(list(local.walk(self.tempdir)), list(remote.walk(self.tempdir)))
+            path = os.path.join(self.tempdir, ROOT, JAR)
+            self.assertEqual(local.sha1(path), remote.sha1(path))
+            with ZipFile(self.zip_path) as z:
+                content = z.read(f"{ROOT}/{JAR}")
+            with remote.open(path) as f:
+                self.assertEqual(content, f.read())
+
+            remote.materialize([path], [])
+            with open(path, "rb") as f:
+                self.assertEqual(content, f.read())
+        finally:
+            local.close()
+            remote.close()
+
+    def test_member_is_one_request(self):
+        remote = ZipSource(self.url, self.tempdir)
+        try:
+            remote.members()
+            self.server.gets = []
+            info = remote.members()[f"{ROOT}/{JAR}"]
+            with remote.open(os.path.join(self.tempdir, ROOT, JAR)) as f:
+                f.read()
+            self.assertEqual(1, len(self.server.gets))
+            self.assertTrue(self.server.gets[0].startswith(f"bytes={info.header_offset}-"))
+        finally:
+            remote.close()
@@ -0,0 +1,209 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from charon.pkgs.pkg_utils import _preflight_group_of, run_file_workers
+from charon.storage import preflight_groups
+from charon.utils.scheduler import (
+    BoundedQueue, file_size, get_or_create_event_loop, partition_files, run_scheduled
+)
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+
+class SchedulerTest(unittest.TestCase):
+    def test_bounded(self):
+        in_progress = [0]
+        max_in_progress = [0]
+        pulled = [0]
+        done = []
+
+        def items():
+            for i in range(100):
+                pulled[0] += 1
+                # Items are only pulled when a worker is free
+                self.assertTrue(pulled[0] - len(done) <= 4)
+                yield i
+
+        async def worker(item: int):
+            in_progress[0] += 1
+            max_in_progress[0] = max(max_in_progress[0], in_progress[0])
+            await asyncio.sleep(0.001)
+            in_progress[0] -= 1
+            done.append(item)
+
+        run_scheduled(items(), worker, 4)
+        self.assertEqual(list(range(100)), sorted(done))
+        self.assertEqual(4, max_in_progress[0])
+
+    def test_bounded_queue(self):
+        in_progress = [0]
+        max_in_progress = [0]
+        max_pending = [0]
+        put = [0]
+        started = [0]
+        done = []
+
+        async def worker(item: int):
+            started[0] += 1
+            in_progress[0] += 1
+            max_in_progress[0] = max(max_in_progress[0], in_progress[0])
+            await asyncio.sleep(0.001)
+            in_progress[0] -= 1
+            done.append(item)
+
+        queue = BoundedQueue(worker, 4)
+
+        async def producer(items):
+            for i in items:
+                await queue.put(i)
+                put[0] += 1
+                max_pending[0] = max(max_pending[0], put[0] - started[0])
+
+        async def produce_all():
+            await asyncio.gather(producer(range(0, 100, 2)), producer(range(1, 100, 2)))
+            await queue.join()
+
+        get_or_create_event_loop().run_until_complete(produce_all())
+        self.assertEqual(list(range(100)), sorted(done))
+        self.assertEqual(4, max_in_progress[0])
+        # The producers wait while the queue is full
+        self.assertTrue(max_pending[0] <= 4 + 2)
+
+    def test_bounded_queue_error(self):
+        done = []
+
+        async def worker(item: int):
+            await asyncio.sleep(0.001)
+            if item == 5:
+                raise ValueError("failed")
+            done.append(item)
+
+        queue = BoundedQueue(worker, 2)
+
+        async def produce_all():
+            for i in range(100):
+                await queue.put(i)
+            await queue.join()
+
+        # The rest of the items are dropped without blocking the producer
+        with self.assertRaises(ValueError):
+            get_or_create_event_loop().run_until_complete(produce_all())
+        self.assertTrue(len(done) < 10)
+
+    def test_largest_first(self):
+        tempdir = tempfile.mkdtemp(prefix="charon-test-")
+        files = []
+        for size in [3, 10, 1, 5]:
+            file_path = os.path.join(tempdir, str(size))
+            with open(file_path, "wb") as f:
+                f.write(b"x" * size)
+            files.append(file_path)
+        files.append(os.path.join(tempdir, "missing"))
+        handled = []
+
+        async def worker(file_path: str):
+            handled.append(os.path.basename(file_path))
+
+        run_scheduled(files, worker, 1, order_key=file_size)
+        self.assertEqual(["10", "5", "3", "1", "missing"], handled)
+        shutil.rmtree(tempdir)
+
+    def test_error(self):
+        handled = []
+
+        async def worker(item: int):
+            if item == 3:
+                raise ValueError("failed")
+            await asyncio.sleep(0.001)
+            handled.append(item)
+
+        self.assertRaises(ValueError, run_scheduled, range(100), worker, 2)
+        self.assertTrue(len(handled) < 100)
+
+    def test_loop_in_thread(self):
+        handled = []
+
+        async def worker(item: int):
+            handled.append(item)
+
+        def run():
+            run_scheduled(range(10), worker, 2)
+            get_or_create_event_loop().close()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        self.assertEqual(list(range(10)), sorted(handled))
+
+    def test_partition_files(self):
+        tempdir = tempfile.mkdtemp(prefix="charon-test-")
+        files = []
+        for size in [8, 1, 5, 4, 3, 3]:
+            file_path = os.path.join(tempdir, f"{len(files)}-{size}")
+            with open(file_path, "wb") as f:
+                f.write(b"x" * size)
+            files.append(file_path)
+
+        partitions = partition_files(files, 3)
+        self.assertEqual(3, len(partitions))
+        self.assertEqual(sorted(files), sorted(sum(partitions, [])))
+        sizes = sorted(sum(file_size(f) for f in p) for p in partitions)
+        self.assertEqual([8, 8, 8], sizes)
+
+        # No empty partitions for fewer files than parts
+        self.assertEqual(2, len(partition_files(files[:2], 4)))
+        self.assertEqual([sorted(files, key=file_size, reverse=True)], partition_files(files, 1))
+        shutil.rmtree(tempdir)
+
+    def test_partition_groups(self):
+        sizes = {"a/1": 6, "a/2": 2, "b/1": 5, "c/1": 2, "c/2": 1, "d/1": 4}
+        partitions = partition_files(
+            list(sizes), 2, sizes.get, group_of=lambda p: p.split("/")[0]
+        )
+        # The files of a group are never split, and the groups are balanced
+        self.assertEqual(
+            [["a/1", "a/2", "c/1", "c/2"], ["b/1", "d/1"]],
+            sorted(sorted(p) for p in partitions)
+        )
+        # No more partitions than groups
+        self.assertEqual(1, len(partition_files(["a/1", "a/2"], 2, sizes.get, lambda p: "a")))
+
+    def test_preflight_groups(self):
+        keys = ["org/a/1.0/a.jar", "org/a/1.0/a.pom", "org/a/maven-metadata.xml",
+                "org/a/2.0/a.jar", "org/b/1.0/b.jar", "root.txt"]
+        self.assertEqual(
+            {
+                "org/a/1.0/a.jar": "org/a/", "org/a/1.0/a.pom": "org/a/",
+                "org/a/maven-metadata.xml": "org/a/", "org/a/2.0/a.jar": "org/a/",
+                "org/b/1.0/b.jar": "org/b/1.0/", "root.txt": "root.txt"
+            },
+            preflight_groups(keys)
+        )
+        # The files are grouped by their keys under the root, so the files in
+        # the root folder do not put all the others into their group
+        root = "/tmp/repo"
+        group_of = _preflight_group_of([f"{root}/{k}" for k in keys], root)
+        self.assertEqual("org/b/1.0/", group_of(f"{root}/org/b/1.0/b.jar"))
+        self.assertEqual("root.txt", group_of(f"{root}/root.txt"))
+
+    def test_failed_worker(self):
+        files = [f"/tmp/charon-missing-{i}" for i in range(4)]
+        # All files of a failed worker process are reported as failed
+        failed = run_file_workers("no_such_operation", files, 2, client_args={})
+        self.assertEqual(sorted(files), sorted(failed))
@@ -0,0 +1,64 @@
+"""
+Copyright (C) 2022 Red Hat, Inc. (https://github.com/Commonjava/charon)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+         http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from charon.utils.trace import Tracer
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+
+class TracerTest(unittest.TestCase):
+    def test_spans(self):
+        tracer = Tracer()
+        with tracer.span("scan") as stage:
+            stage.set(files=3)
+        with self.assertRaises(ValueError):
+            with tracer.span("upload", bucket="bucket"):
+                raise ValueError("failed")
+        thread = threading.Thread(
+            target=lambda: tracer.span("index").__enter__().__exit__(None, None, None),
+            name="charon-target_0"
+        )
+        thread.start()
+        thread.join()
+
+        spans = tracer.spans()
+        self.assertEqual(["scan", "upload", "index"], [s.name for s in spans])
+        self.assertEqual({"files": 3}, spans[0].args)
+        self.assertEqual("ValueError", spans[1].args["error"])
+        self.assertTrue(all(s.wall >= 0 and s.peak_rss > 0 for s in spans))
+
+        tempdir = tempfile.mkdtemp(prefix="charon-test-")
+        try:
+            path = os.path.join(tempdir, "trace.json")
+            tracer.write(path)
+            with open(path, encoding="utf-8") as f:
+                trace = json.load(f)
+        finally:
+            shutil.rmtree(tempdir)
+        events = trace["traceEvents"]
+        complete = [e for e in events if e["ph"] == "X"]
+        self.assertEqual(["scan", "upload", "index"], [e["name"] for e in complete])
+        self.assertEqual(3, complete[0]["args"]["files"])
+        self.assertIn("cpu_ms", complete[0]["args"])
+        self.assertIn("peak_rss_mb", complete[0]["args"])
+        threads = {e["args"]["name"] for e in events if e["ph"] == "M"}
+        self.assertIn("charon-target_0", threads)
+
+        tracer.reset()
+        self.assertEqual([], tracer.spans())